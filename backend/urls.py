@@ -19,7 +19,7 @@ from django.contrib import admin
 from django.urls import path
 
 from pages.views import game_search_view, home_view, games_view, game_view, leaderboard_view, tournament_search_view, tournament_view, tournaments_view
-from pages.api import game_counter
+from pages.api import game_counter, games, message_delivery
 
 urlpatterns = [
     path('', lambda req: redirect('/home/')),
@@ -34,10 +34,15 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('logs/', include('log_viewer.urls')),
     path('api/game_counter', game_counter),
+    path('api/games', games),
+    path('api/message_delivery', message_delivery),
 ]
 
-from coordinator.services import GameCoordinatorService
+import grpc
+
+from coordinator.services import AsyncGameCoordinatorService, GameCoordinatorService
 from proto.game import game_pb2_grpc
 
 def grpc_handlers(server):
-    game_pb2_grpc.add_GameCoordinatorControllerServicer_to_server(GameCoordinatorService.as_servicer(), server)
\ No newline at end of file
+    service = AsyncGameCoordinatorService if isinstance(server, grpc.aio.Server) else GameCoordinatorService
+    game_pb2_grpc.add_GameCoordinatorControllerServicer_to_server(service.as_servicer(), server)
\ No newline at end of file
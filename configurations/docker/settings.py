@@ -6,9 +6,18 @@ DEBUG = False
 ALLOWED_HOSTS = [ '0.0.0.0', 'localhost', '127.0.0.1' ]
 
 GRPC_SERVER_ADDRPORT = '0.0.0.0:50051'
-GRPC_MAX_WORKERS = 64 # Note that each player reserves one worker, if this setting is low tournament may not be even able to start
+GRPC_MAX_WORKERS = 64 # Note that in threaded mode each player reserves one worker, if this setting is low tournament may not be even able to start
+# In asyncio mode `Play` streams do not reserve workers, `GRPC_MAX_WORKERS` then limits only concurrent unary calls (e.g. `Rename` or `Create`)
+# Threaded gRPC server is the default, set to `True` to use the optional `grpc.aio` server
+GRPC_USE_ASYNCIO = False
 GRPC_USE_RELOADER = False
 
+GRPC_FRAMEWORK = {
+    'SERVER_INTERCEPTORS': [
+        'coordinator.interceptors.PlayerIdentityInterceptor',
+    ]
+}
+
 GENERATE_TEST_PLAYERS = 4
 GENERATE_BOT_PLAYERS = 16
 
@@ -16,10 +25,27 @@ CARD_GENERATED_IMAGE_SIZE = 32
 CARD_GENERATED_IMAGE_NOISE_LEVEL = 0.15
 CARD_GENERATED_IMAGE_ROTATE_MAX_ANGLE = 15
 
+# Resolved font paths for card images are cached in this file, so server does not need to import matplotlib at startup
+# Set to `None` to resolve fonts on every startup
+CARD_FONTS_CACHE = BASE_DIR / 'card-fonts.json'
+
+# Number of pre-rendered card images kept in memory for each rank, see `CardImagePool`
+# Images are generated in a background thread and every image is sent only once
+CARD_IMAGE_POOL_SIZE = 128
+CARD_IMAGE_POOL_REPORT_INTERVAL = 60 # sec
+
+# Path to the card images atlas index, see `generate_card_atlas` management command and `CardImageAtlas`
+# If set and the atlas exists card images are served from a memory-mapped atlas shared by all server processes on the host
+CARD_IMAGE_ATLAS = None
+CARD_IMAGE_ATLAS_RELOAD_INTERVAL = 10 # sec
+
 COORDINATOR_REVEAL_CARDS = False
 
 COORDINATOR_TOURNAMENT_GRACE_PERIOD = 0 # sec
 
+# Maximum number of duels of a single tournament round played at the same time
+COORDINATOR_TOURNAMENT_PARALLEL_DUELS = 8
+
 # This settings control for how long GRPC service should wait for a coordinator to be ready
 # Normally if coordinator does not send ready event then something wrong is going on on server side
 # We do not expect to hit this timeout setting, so we set it larger than the others
@@ -38,12 +64,64 @@ COORDINATOR_CONNECTION_TIMEOUT = 100  # 100 sec
 # This is a secret password to create tournaments, change on the production server
 COORDINATOR_TOURNAMENTS_SECRET = 'qwerty'
 
-COORDINATOR_REMOVE_CLOSED_COORDINATORS_INTERVAL = 10 # 10 sec
+# Maximum number of unacknowledged messages to a single player, player who does not read its messages is treated as disconnected
+COORDINATOR_PLAYER_MAILBOX_CAPACITY = 32
+
+# Active coordinators are stored in a sharded registry, see `KuhnCoordinatorRegistry`
+COORDINATOR_REGISTRY_SHARDS = 16
+
+# Resolved players are cached by their tokens for gRPC calls, see `PlayerIdentityCache`
+# Cache entries are invalidated on each `Player` save, TTL only matters for updates made outside of this server process
+COORDINATOR_IDENTITY_CACHE_SIZE = 4096
+COORDINATOR_IDENTITY_CACHE_TTL = 60 # sec
 
 KUHN_GAME_INITIAL_BANK = 5
+
+# Game rounds are saved in background in batches of up to `KUHN_WRITER_BATCH_SIZE` events, see `KuhnGameWriter`
+# Each batch is written at most `KUHN_WRITER_FLUSH_INTERVAL` seconds after its first event, games are always flushed when they finish
+KUHN_WRITER_BATCH_SIZE = 256
+KUHN_WRITER_FLUSH_INTERVAL = 0.5 # sec
+KUHN_WRITER_SHUTDOWN_TIMEOUT = 10 # sec
+# A failed batch is retried `KUHN_WRITER_RETRIES` times before the writer falls back to writing it game by game and event by event
+KUHN_WRITER_RETRIES = 3
+KUHN_WRITER_RETRY_DELAY = 0.5 # sec
+
+# Optional append-only round journal for heavy load, see `KuhnRoundJournal`, rounds are written by `KuhnGameWriter` if the folder is `None`
+# Journal is written with one `fsync` per `KUHN_ROUND_JOURNAL_FSYNC_INTERVAL` and is compacted into the database segment by segment
+# A segment is sealed after `KUHN_ROUND_JOURNAL_SEGMENT_SIZE` rounds or `KUHN_ROUND_JOURNAL_SEGMENT_INTERVAL` seconds
+# Segments left after a crash are replayed with `python manage.py recover_round_journal` before server starts
+KUHN_ROUND_JOURNAL_FOLDER = None
+KUHN_ROUND_JOURNAL_FSYNC_INTERVAL = 0.05 # sec
+KUHN_ROUND_JOURNAL_SEGMENT_SIZE = 4096
+KUHN_ROUND_JOURNAL_SEGMENT_INTERVAL = 5 # sec
+
 KUHN_ALLOW_BOTS = True
 KUHN_BOT_FOLDER = './bots'
 
+# By default each bot is started as a separate `python main.py` process (isolated from the server) and connects over gRPC
+# If enabled bots from `KUHN_BOT_FOLDER` are loaded once and play in the server process instead (see `KuhnBotRunner`)
+KUHN_BOTS_IN_PROCESS = False
+
+# Out-of-process bots are forked from a zygote that has imported bot's code already, see `KuhnBotZygote`
+# Each zygote keeps `KUHN_BOT_ZYGOTE_POOL_SIZE` forked children ready, 0 disables zygotes (bots are cold-started with `python main.py`)
+KUHN_BOT_ZYGOTE_POOL_SIZE = 4
+
+# Output of out-of-process bots is streamed into per-coordinator ring buffers and shown in the admin page of a coordinator, see `KuhnBotOutput`
+# Each buffer keeps the last `KUHN_BOT_OUTPUT_LINES` lines truncated to `KUHN_BOT_OUTPUT_LINE_LENGTH` characters, buffers of the last `KUHN_BOT_OUTPUT_COORDINATORS` coordinators are kept
+KUHN_BOT_OUTPUT_LINES = 1000
+KUHN_BOT_OUTPUT_LINE_LENGTH = 1024
+KUHN_BOT_OUTPUT_COORDINATORS = 256
+
+# Rendered pages of games and tournaments are cached in `PAGES_CACHE` (Django's local-memory cache by default), see `pages/page_cache.py`
+# Pages of finished objects never change and are kept for `PAGES_CACHE_FINISHED_TTL`, pages of objects in progress only for `PAGES_CACHE_LIVE_TTL`
+PAGES_CACHE = 'default'
+PAGES_CACHE_FINISHED_TTL = 24 * 60 * 60 # sec
+PAGES_CACHE_LIVE_TTL = 5 # sec
+
+# Game browser shows `PAGES_GAMES_PAGE_SIZE` games per page, JSON API accepts a `limit` up to `PAGES_GAMES_MAX_PAGE_SIZE`
+PAGES_GAMES_PAGE_SIZE = 50
+PAGES_GAMES_MAX_PAGE_SIZE = 200
+
 BACKEND_GITHUB_URL = 'https://github.com/tue-5ARA0-2021-Q3/poker-server-backend'
 CLIENT_GITHUB_URL  = 'https://github.com/tue-5ARA0-2021-Q3/poker-server-client'
 
@@ -85,6 +163,10 @@ LOGGING = {
         'service.coordinator': {
             'handlers': [ 'console', 'file' ],
             'level': 'DEBUG'
+        },
+        'service.cards': {
+            'handlers': [ 'console', 'file' ],
+            'level': 'DEBUG'
         }
     }
 }
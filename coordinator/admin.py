@@ -1,8 +1,9 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
 
-from coordinator.models import Game, GameCoordinator, GameRound, Player, RoomRegistration, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame, WaitingRoom
+from coordinator.kuhn.kuhn_bot_output import KuhnBotOutput
+from coordinator.models import Game, GameCoordinator, GameRound, Player, PlayerStats, RoomRegistration, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame, WaitingRoom
 
 def linkify(field_name):
     """
@@ -30,11 +31,26 @@ class PlayerAdminModelView(admin.ModelAdmin):
     list_filter     = ('token', 'public_token', 'name', 'is_disabled', 'is_test', 'is_bot')
     readonly_fields = ('token', 'public_token', 'is_test', 'is_bot')
 
+@admin.register(PlayerStats)
+class PlayerStatsAdminModelView(admin.ModelAdmin):
+    list_display    = (linkify('player'), 'games_total', 'games_won', 'tournaments_participated', 'tournaments_won')
+    search_fields   = ('player__token', 'player__name')
+    readonly_fields = ('player', 'games_total', 'games_won', 'tournaments_participated', 'tournaments_won')
+
 @admin.register(GameCoordinator)
 class GameCoordinatorAdminModelView(admin.ModelAdmin):
     list_display    = ('id', 'coordinator_type', 'is_started', 'is_finished', 'is_failed', 'is_private', 'created_at', 'game_type', 'error')
     list_filter     = ('coordinator_type', 'is_started', 'is_finished', 'is_failed', 'is_private', 'game_type', ('error', admin.EmptyFieldListFilter))
-    readonly_fields = ('id', 'coordinator_type', 'is_started', 'is_finished', 'is_failed', 'is_private', 'created_at', 'game_type', 'error')
+    readonly_fields = ('id', 'coordinator_type', 'is_started', 'is_finished', 'is_failed', 'is_private', 'created_at', 'game_type', 'error', 'bot_output')
+
+    # Last lines of bots' output, available only for recent coordinators of the process which has run them (see `KuhnBotOutput`)
+    def bot_output(self, obj):
+        output = KuhnBotOutput.default(create = False)
+        buffer = output.get_buffer(obj.id, create = False) if output is not None else None
+        if buffer is None:
+            return '-'
+        lines = format_html_join('\n', '[{}] {}', ((source, line) for _, source, line in buffer.get_lines()))
+        return format_html('<pre>{}{}</pre>', f'({ buffer.get_dropped() } earlier lines dropped)\n' if buffer.get_dropped() != 0 else '', lines)
 
 @admin.register(WaitingRoom)
 class WaitingRoomAdminModelView(admin.ModelAdmin):
@@ -78,9 +94,9 @@ class TournamentRoundModelView(admin.ModelAdmin):
 
 @admin.register(TournamentRoundBracketItem)
 class TournamentRoundBracketItemModelView(admin.ModelAdmin):
-    list_display    = ('id', linkify('round'), 'position', linkify('player1'), linkify('player2'))
+    list_display    = ('id', linkify('round'), 'position', linkify('player1'), linkify('player2'), 'queue_delay')
     search_fields   = ('round__id', 'player1__token', 'player2__token')
-    readonly_fields = ('id', 'round', 'position', 'player1', 'player2')
+    readonly_fields = ('id', 'round', 'position', 'player1', 'player2', 'queue_delay')
 
 @admin.register(TournamentRoundGame)
 class TournamentRoundGameModelView(admin.ModelAdmin):
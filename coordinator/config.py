@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import threading
 import sys
@@ -13,17 +14,49 @@ from django.db.utils import OperationalError
 class CoordinatorConfig(AppConfig):
     name = 'coordinator'
 
+    # `SERVER_INTERCEPTORS` setting lists interceptor classes, in asyncio mode their `aio` counterparts are instantiated instead
+    def create_grpc_interceptors(self, use_asyncio: bool):
+        interceptors = grpc_settings.SERVER_INTERCEPTORS or []
+        return [ (interceptor.aio if use_asyncio else interceptor)() for interceptor in interceptors ]
+
     def start_grpc_server(self):
         try: 
 
-            def __start_grpc_server():
+            def __start_grpc_threaded_server():
                 print(f'Starting GRPC server at { settings.GRPC_SERVER_ADDRPORT }.')
-                server = grpc.server(futures.ThreadPoolExecutor(max_workers = settings.GRPC_MAX_WORKERS), interceptors = grpc_settings.SERVER_INTERCEPTORS)
+                server = grpc.server(futures.ThreadPoolExecutor(max_workers = settings.GRPC_MAX_WORKERS), interceptors = self.create_grpc_interceptors(use_asyncio = False))
                 grpc_settings.ROOT_HANDLERS_HOOK(server)
                 server.add_insecure_port(settings.GRPC_SERVER_ADDRPORT)
                 server.start()
                 server.wait_for_termination()
 
+            # In `grpc.aio` mode streaming `Play` calls do not reserve threads from the pool
+            # The pool (`migration_thread_pool`) is used only for synchronous unary calls, e.g. `Rename` or `Create`
+            async def __serve_grpc_aio_server():
+                print(f'Starting GRPC server (asyncio) at { settings.GRPC_SERVER_ADDRPORT }.')
+                server = grpc.aio.server(
+                    migration_thread_pool = futures.ThreadPoolExecutor(max_workers = settings.GRPC_MAX_WORKERS), 
+                    interceptors          = self.create_grpc_interceptors(use_asyncio = True)
+                )
+                grpc_settings.ROOT_HANDLERS_HOOK(server)
+                server.add_insecure_port(settings.GRPC_SERVER_ADDRPORT)
+                await server.start()
+                await server.wait_for_termination()
+
+            def __start_grpc_server():
+                # Card images pool starts filling in background before first players connect
+                from coordinator.utilities.card_pool import CardImagePool
+                CardImagePool.default()
+                # Zygotes of out-of-process bots warm up their pools before first bots are requested
+                from coordinator.kuhn.kuhn_coordinator import KuhnCoordinator
+                from coordinator.kuhn.kuhn_zygote import KuhnBotZygote
+                if settings.KUHN_ALLOW_BOTS and not settings.KUHN_BOTS_IN_PROCESS and KuhnBotZygote.is_supported():
+                    KuhnBotZygote.prestart(KuhnCoordinator.LobbyBots)
+                if settings.GRPC_USE_ASYNCIO:
+                    asyncio.run(__serve_grpc_aio_server())
+                else:
+                    __start_grpc_threaded_server()
+
             if not settings.GRPC_USE_RELOADER:
                 __start_grpc_server()
             elif settings.GRPC_USE_RELOADER and os.environ.get('RUN_MAIN') == 'true':
@@ -52,6 +85,10 @@ class CoordinatorConfig(AppConfig):
         # This line is important to initialise application's signals 
         import coordinator.signals
 
+        # Pending game rounds are written to the database before server shuts down
+        from coordinator.kuhn.kuhn_writer import KuhnGameWriter
+        KuhnGameWriter.install_shutdown_handler()
+
         # We run gRPC server in background as `daemon` process that should close automatically as soon as server stops
         grpc_thread        = threading.Thread(target = self.start_grpc_server)
         grpc_thread.daemon = True
@@ -0,0 +1,130 @@
+import collections
+import inspect
+import threading
+import time
+
+import grpc
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from coordinator.models import Player
+
+# `PlayerIdentityCache` is a small TTL/LRU cache of `Player` records indexed by their secret tokens
+# Players connect (and reconnect) a lot at the beginning of tournaments, the cache removes most of the database round-trips from the connection path
+# Entries are invalidated on `Player` `post_save` signal (see `coordinator/signals.py`) and expire after `COORDINATOR_IDENTITY_CACHE_TTL` seconds
+# Note that `QuerySet.update` does not send `post_save` signal, such updates should call `PlayerIdentityCache.invalidate` explicitly
+class PlayerIdentityCache(object):
+    entries = collections.OrderedDict()
+    lock    = threading.Lock()
+
+    @staticmethod
+    def get(token) -> Player:
+        key = str(token)
+        now = time.monotonic()
+
+        with PlayerIdentityCache.lock:
+            entry = PlayerIdentityCache.entries.get(key)
+            if entry is not None:
+                player, expires_at = entry
+                if expires_at > now:
+                    PlayerIdentityCache.entries.move_to_end(key)
+                    return player
+                PlayerIdentityCache.entries.pop(key)
+
+        # Raises `Player.DoesNotExist` for unknown tokens, we do not cache negative results
+        player = Player.objects.get(token = key)
+
+        with PlayerIdentityCache.lock:
+            PlayerIdentityCache.entries[key] = (player, now + settings.COORDINATOR_IDENTITY_CACHE_TTL)
+            PlayerIdentityCache.entries.move_to_end(key)
+            while len(PlayerIdentityCache.entries) > settings.COORDINATOR_IDENTITY_CACHE_SIZE:
+                PlayerIdentityCache.entries.popitem(last = False)
+
+        return player
+
+    @staticmethod
+    def invalidate(token):
+        with PlayerIdentityCache.lock:
+            PlayerIdentityCache.entries.pop(str(token), None)
+
+    @staticmethod
+    def clear():
+        with PlayerIdentityCache.lock:
+            PlayerIdentityCache.entries.clear()
+
+
+# gRPC servicer contexts do not allow custom attributes, so we wrap them and delegate everything else to the original context
+class AuthenticatedServicerContext(object):
+
+    def __init__(self, context, player):
+        self._context = context
+        self.player   = player
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+def _extract_token(request, context):
+    # `Play` sends token in metadata, unary calls (e.g. `Rename` or `Create`) send it in the request itself
+    metadata = dict(context.invocation_metadata())
+    if 'token' in metadata:
+        return metadata['token']
+    return getattr(request, 'token', None)
+
+def _resolve_player(token):
+    if not token:
+        return None
+    try:
+        return PlayerIdentityCache.get(token)
+    except Exception:
+        # Unknown or malformed tokens are handled by the handlers themselves, see `GameCoordinatorService.resolve_player`
+        return None
+
+def _wrap_method_handler(handler, wrap_unary, wrap_stream):
+    if handler is None:
+        return None
+    if handler.unary_unary is not None:
+        return grpc.unary_unary_rpc_method_handler(wrap_unary(handler.unary_unary), handler.request_deserializer, handler.response_serializer)
+    if handler.unary_stream is not None:
+        return grpc.unary_stream_rpc_method_handler(wrap_unary(handler.unary_stream), handler.request_deserializer, handler.response_serializer)
+    if handler.stream_unary is not None:
+        return grpc.stream_unary_rpc_method_handler(wrap_stream(handler.stream_unary), handler.request_deserializer, handler.response_serializer)
+    if handler.stream_stream is not None:
+        return grpc.stream_stream_rpc_method_handler(wrap_stream(handler.stream_stream), handler.request_deserializer, handler.response_serializer)
+    return handler
+
+
+def _wrap_sync_behavior(behavior):
+    def _behavior(request, context):
+        # For streaming requests `request` is an iterator and `_extract_token` falls back to metadata
+        return behavior(request, AuthenticatedServicerContext(context, _resolve_player(_extract_token(request, context))))
+    return _behavior
+
+
+# `PlayerIdentityInterceptor` resolves player's token before the call reaches a handler and passes the resolved `Player` in `context.player`
+# Should be registered in `GRPC_FRAMEWORK['SERVER_INTERCEPTORS']` setting, in asyncio mode `PlayerIdentityInterceptor.aio` is used instead
+class PlayerIdentityInterceptor(grpc.ServerInterceptor):
+
+    def intercept_service(self, continuation, handler_call_details):
+        return _wrap_method_handler(continuation(handler_call_details), _wrap_sync_behavior, _wrap_sync_behavior)
+
+
+class AsyncPlayerIdentityInterceptor(grpc.aio.ServerInterceptor):
+
+    @staticmethod
+    def wrap_stream(behavior):
+        # Synchronous handlers are executed by `grpc.aio` in a thread pool, so they can be wrapped as usual
+        if not inspect.isasyncgenfunction(behavior):
+            return _wrap_sync_behavior(behavior)
+
+        async def _behavior(request, context):
+            player = await sync_to_async(_resolve_player, thread_sensitive = False)(_extract_token(request, context))
+            async for response in behavior(request, AuthenticatedServicerContext(context, player)):
+                yield response
+        return _behavior
+
+    async def intercept_service(self, continuation, handler_call_details):
+        return _wrap_method_handler(await continuation(handler_call_details), _wrap_sync_behavior, AsyncPlayerIdentityInterceptor.wrap_stream)
+
+
+PlayerIdentityInterceptor.aio = AsyncPlayerIdentityInterceptor
@@ -0,0 +1,202 @@
+import importlib.util
+import logging
+import math
+import os
+import queue
+import sys
+import threading
+
+from typing import List
+
+from django.conf import settings
+from PIL import Image
+
+from coordinator.kuhn.kuhn_bot_output import KuhnBotOutput
+from coordinator.kuhn.kuhn_constants import CoordinatorActions, KuhnCoordinatorEventTypes, KuhnCoordinatorMessage
+from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayerMessage
+from coordinator.utilities.card_atlas import CardImageAtlas
+from coordinator.utilities.card_pool import CardImagePool
+
+# `KuhnBotAgent` is a bot implementation loaded from `KUHN_BOT_FOLDER` into the server process
+# Each bot folder should contain `agent.py` with a `PokerAgent` class and `client/state.py` with client state classes (see `bots/random`)
+# Bots import their modules as top-level `agent` and `client` packages, so each bot is imported in isolation:
+# its folder is put first in `sys.path` and conflicting modules are removed from `sys.modules` before and after the import
+class KuhnBotAgent(object):
+    _import_lock = threading.Lock()
+
+    IsolatedModules = ('agent', 'client')
+
+    def __init__(self, name: str, agent_class, state_module):
+        self.name         = name
+        self.agent_class  = agent_class
+        self.state_module = state_module
+
+    def create_agent(self):
+        return self.agent_class()
+
+    def create_game_state(self, coordinator_id: str, player_token: str, bank: int):
+        return self.state_module.ClientGameState(coordinator_id, player_token, bank)
+
+    @staticmethod
+    def unload_isolated_modules():
+        for module in [ module for module in sys.modules if module.split('.')[0] in KuhnBotAgent.IsolatedModules ]:
+            del sys.modules[module]
+
+    @staticmethod
+    def load(folder: str) -> 'KuhnBotAgent':
+        with KuhnBotAgent._import_lock:
+            KuhnBotAgent.unload_isolated_modules()
+            sys.path.insert(0, os.path.abspath(folder))
+            try:
+                name   = os.path.basename(os.path.normpath(folder))
+                spec   = importlib.util.spec_from_file_location(f'kuhn_bot_{ name }', os.path.join(folder, 'agent.py'))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                state_module = importlib.import_module('client.state')
+                return KuhnBotAgent(name, module.PokerAgent, state_module)
+            finally:
+                sys.path.remove(os.path.abspath(folder))
+                KuhnBotAgent.unload_isolated_modules()
+
+    @staticmethod
+    def load_all(bots_folder: str) -> List['KuhnBotAgent']:
+        agents = []
+        for folder in sorted(os.listdir(bots_folder)):
+            if os.path.isfile(os.path.join(bots_folder, folder, 'agent.py')):
+                try:
+                    agents.append(KuhnBotAgent.load(os.path.join(bots_folder, folder)))
+                    logging.info(f'[KuhnBotAgent] Kuhn game bot agent loaded from \'{ folder }\'')
+                except Exception as e:
+                    logging.warning(f'[KuhnBotAgent] Could not load Kuhn game bot agent from \'{ folder }\': { e }')
+        return agents
+
+# `KuhnBotRunner` plays a bot agent directly against the coordinator, without a gRPC connection or protobuf messages
+# It follows the same request/response protocol as a remote client (see `bots/random/client/controller.py` and `GameCoordinatorService.Play`):
+# the runner sends at most one action per received message and the coordinator replies with exactly one message per action
+class KuhnBotRunner(object):
+
+    def __init__(self, coordinator, player_token: str, bot: KuhnBotAgent):
+        self.coordinator  = coordinator
+        self.player_token = player_token
+        self.bot          = bot
+        self.logger       = logging.getLogger('kuhn.coordinator')
+
+    @staticmethod
+    def get_card_image(rank: str) -> Image.Image:
+        atlas = CardImageAtlas.default()
+        image = atlas.pop(rank) if atlas is not None and atlas.has(rank) else CardImagePool.default().pop(rank)
+        size  = int(math.sqrt(len(image)))
+        return Image.frombytes('L', (size, size), image)
+
+    def send(self, action):
+        if action != CoordinatorActions.Connect and action != CoordinatorActions.Wait:
+            self.coordinator.post(KuhnGameLobbyPlayerMessage(self.player_token, action))
+
+    def play(self):
+        coordinator = self.coordinator
+        coordinator.waiting_room.register_player(self.player_token)
+
+        if not coordinator.wait_ready():
+            raise Exception('Timeout in coordinator. Coordinator is not ready.')
+
+        if coordinator.is_closed():
+            raise Exception(coordinator.error)
+
+        player_channel = coordinator.waiting_room.get_player_channel(self.player_token)
+        state          = self.bot.create_game_state(str(coordinator.id), self.player_token, settings.KUHN_GAME_INITIAL_BANK)
+        agent          = None
+
+        try:
+            while True:
+                try:
+                    message = player_channel.get(timeout = settings.COORDINATOR_WAITING_TIMEOUT)
+                except queue.Empty:
+                    if coordinator.is_closed() and player_channel.empty():
+                        return
+                    continue
+
+                player_channel.ack()
+
+                action, agent = self.on_message(message, state, agent)
+
+                if message.event == KuhnCoordinatorEventTypes.Close or message.event == KuhnCoordinatorEventTypes.Error:
+                    coordinator.close(error = message.data.get('error', None))
+                    return
+
+                if action == CoordinatorActions.AvailableActions and coordinator.is_closed():
+                    return
+
+                if action is not None:
+                    self.send(action)
+        except Exception as e:
+            # Bot errors are treated in the same way as a lost connection of a remote player
+            self.logger.error(f'Bot { self.bot.name } failed in coordinator { coordinator.id }: { e }')
+            KuhnBotOutput.default().get_buffer(coordinator.id).append(self.bot.name, f'{ type(e).__name__ }: { e }')
+            if agent is not None:
+                agent.on_error(str(e))
+            if coordinator.waiting_room.is_player_registered(self.player_token) and not coordinator.is_closed():
+                coordinator.waiting_room.mark_as_disconnected(self.player_token)
+                coordinator.post(KuhnGameLobbyPlayerMessage(self.player_token, CoordinatorActions.Disconnected))
+
+    # Returns the next action (or `None`) and the current agent, mirrors the client's controller
+    def on_message(self, message: KuhnCoordinatorMessage, state, agent):
+        event   = message.event
+        actions = message.data.get('actions', [])
+
+        if event == KuhnCoordinatorEventTypes.Error:
+            if agent is not None:
+                agent.on_error(message.data['error'])
+            return None, agent
+
+        if event == KuhnCoordinatorEventTypes.Close:
+            return None, agent
+
+        if event == KuhnCoordinatorEventTypes.GameStart:
+            agent = self.bot.create_agent()
+            agent.on_game_start()
+            state.start_new_round()
+            agent.on_new_round_request(state)
+            return CoordinatorActions.NewRound, agent
+
+        if event == KuhnCoordinatorEventTypes.CardDeal:
+            round_state = state.get_last_round_state()
+            round_state.set_turn_order(message.data['turn_order'])
+            round_state.set_card(message.data['card'] if settings.COORDINATOR_REVEAL_CARDS else '?')
+            image = KuhnBotRunner.get_card_image(message.data['card'])
+            round_state.set_card_image(image)
+            agent.on_image(image)
+
+        if len(actions) == 1:
+            return actions[0], agent
+
+        if event == KuhnCoordinatorEventTypes.GameResult:
+            agent.on_game_end(state, message.data['game_result'])
+            return CoordinatorActions.ConfirmEndGame, agent
+
+        if event == KuhnCoordinatorEventTypes.RoundResult:
+            _, cards, *moves = message.data['inf_set'].split('.')
+            round_state = state.get_last_round_state()
+            # In case if there was no showdown, we replace resulting '?' with our hand (if available)
+            if cards == '??':
+                _clist = list(cards)
+                _clist[int(round_state.get_turn_order()) - 1] = round_state.get_card()[0]
+                cards = ''.join(_clist)
+            round_state.set_moves_history(moves)
+            round_state.set_outcome(message.data['evaluation'])
+            round_state.set_cards(cards)
+            state.update_bank(message.data['evaluation'])
+            agent.on_round_end(state, round_state)
+            state.start_new_round()
+            agent.on_new_round_request(state)
+            return CoordinatorActions.NewRound, agent
+
+        if event == KuhnCoordinatorEventTypes.NextAction:
+            round_state = state.get_last_round_state()
+            round_state.set_available_actions(list(actions))
+            if len(message.data['inf_set']) != 0:
+                round_state.add_move_history(message.data['inf_set'].split('.')[-1])
+            next_action = agent.make_action(state, round_state)
+            round_state.add_move_history(f'{ next_action }')
+            return next_action, agent
+
+        return None, agent
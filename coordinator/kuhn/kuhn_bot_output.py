@@ -0,0 +1,170 @@
+import collections
+import logging
+import os
+import selectors
+import tempfile
+import threading
+import time
+
+from typing import List, Optional
+
+from django.conf import settings
+
+# `KuhnBotOutputBuffer` keeps the last `capacity` output lines of all bots of a single coordinator
+# Lines longer than `line_length` are truncated, so memory of a buffer does not depend on how long bots have been running
+class KuhnBotOutputBuffer(object):
+
+    def __init__(self, coordinator_id: str, capacity: int, line_length: int):
+        self.coordinator_id = coordinator_id
+        self.line_length    = line_length
+        self.lines          = collections.deque(maxlen = capacity)
+        self.lock           = threading.Lock()
+        self.dropped        = 0 # Number of lines that have been pushed out of the buffer
+
+    def append(self, source: str, line: str):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped = self.dropped + 1
+            self.lines.append((time.time(), source, line[:self.line_length]))
+
+    def get_lines(self) -> List[tuple]:
+        with self.lock:
+            return list(self.lines)
+
+    def get_dropped(self) -> int:
+        with self.lock:
+            return self.dropped
+
+# `KuhnBotOutput` streams stdout/stderr of out-of-process bots into per-coordinator ring buffers (see `KuhnBotOutputBuffer`)
+# A single reader thread waits on all bot pipes with a selector, so pipes never fill up and bot processes never block on their output
+# Partial lines are kept per pipe and are bounded by `line_length` as well
+# Buffers of the last `max_coordinators` coordinators are kept in memory, they are shown in the admin page of a coordinator
+class KuhnBotOutput(object):
+    _default      = None
+    _default_lock = threading.Lock()
+
+    class Stream(object):
+
+        def __init__(self, fd: int, source: str, buffer: KuhnBotOutputBuffer):
+            self.fd      = fd
+            self.source  = source
+            self.buffer  = buffer
+            self.partial = b''
+
+    def __init__(self, capacity: int, line_length: int, max_coordinators: int):
+        self.capacity         = capacity
+        self.line_length      = line_length
+        self.max_coordinators = max_coordinators
+        self.buffers          = collections.OrderedDict() # Coordinator id -> buffer, least recently created first
+        self.lock             = threading.Lock()
+        self.selector         = selectors.DefaultSelector()
+        self.pending          = collections.deque()       # Streams to be registered by the reader thread
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ, None)
+        self.logger           = logging.getLogger('kuhn.coordinator')
+        self.reader           = threading.Thread(target = self.read, name = 'kuhn-bot-output')
+        self.reader.daemon    = True
+
+    # With `create = False` returns `None` if no bots have been run by this process yet (e.g. in admin), so no reader thread is started
+    @staticmethod
+    def default(create: bool = True) -> Optional['KuhnBotOutput']:
+        with KuhnBotOutput._default_lock:
+            if KuhnBotOutput._default is None and create:
+                KuhnBotOutput._default = KuhnBotOutput(
+                    capacity         = settings.KUHN_BOT_OUTPUT_LINES,
+                    line_length      = settings.KUHN_BOT_OUTPUT_LINE_LENGTH,
+                    max_coordinators = settings.KUHN_BOT_OUTPUT_COORDINATORS
+                )
+                KuhnBotOutput._default.start()
+            return KuhnBotOutput._default
+
+    def start(self):
+        self.reader.start()
+
+    # Pipes and FIFOs are not supported by selectors on Windows, bots' output is discarded there
+    @staticmethod
+    def is_supported() -> bool:
+        return os.name != 'nt'
+
+    def get_buffer(self, coordinator_id: str, create: bool = True) -> KuhnBotOutputBuffer:
+        with self.lock:
+            if not create:
+                return self.buffers.get(str(coordinator_id), None)
+            return self.get_buffer_locked(coordinator_id)
+
+    # Pipe `fd` is owned by the reader from now on and it is closed once the writing side has been closed
+    def attach(self, coordinator_id: str, source: str, fd: int):
+        os.set_blocking(fd, False)
+        with self.lock:
+            self.pending.append(KuhnBotOutput.Stream(fd, source, self.get_buffer_locked(coordinator_id)))
+        os.write(self.wakeup_write, b'\0')
+
+    # Returns the writing end of a new pipe for a subprocess, the caller closes it once the subprocess has been started
+    def open_pipe(self, coordinator_id: str, source: str) -> int:
+        read_fd, write_fd = os.pipe()
+        self.attach(coordinator_id, source, read_fd)
+        return write_fd
+
+    # Returns a path of a new FIFO for a process which is not started by us (e.g. a zygote child), see `close_fifo`
+    # Reading end is opened in a non-blocking mode, so the reader does not wait for a writer to appear
+    def open_fifo(self, coordinator_id: str, source: str) -> str:
+        path = os.path.join(tempfile.mkdtemp(prefix = 'kuhn-bot-'), 'output')
+        os.mkfifo(path, 0o600)
+        self.attach(coordinator_id, source, os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+        return path
+
+    # Must be called once the writing process has exited
+    # If the process has never opened the FIFO (e.g. it crashed before) the reader would wait for a writer forever,
+    # so we open and close the writing end ourselves, which makes the reader see the end of the stream
+    def close_fifo(self, path: str):
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass # Reading end has already been closed
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+
+    # `get_buffer` without taking `self.lock`
+    def get_buffer_locked(self, coordinator_id: str) -> KuhnBotOutputBuffer:
+        buffer = self.buffers.get(str(coordinator_id), None)
+        if buffer is None:
+            buffer = KuhnBotOutputBuffer(str(coordinator_id), self.capacity, self.line_length)
+            self.buffers[str(coordinator_id)] = buffer
+            while len(self.buffers) > self.max_coordinators:
+                self.buffers.popitem(last = False)
+        return buffer
+
+    def read(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    os.read(self.wakeup_read, 4096)
+                    with self.lock:
+                        streams, self.pending = list(self.pending), collections.deque()
+                    for stream in streams:
+                        self.selector.register(stream.fd, selectors.EVENT_READ, stream)
+                else:
+                    self.read_stream(key.data)
+
+    def read_stream(self, stream: 'KuhnBotOutput.Stream'):
+        try:
+            chunk = os.read(stream.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b''
+
+        if len(chunk) == 0:
+            if len(stream.partial) != 0:
+                stream.buffer.append(stream.source, stream.partial.decode(errors = 'replace'))
+            self.selector.unregister(stream.fd)
+            os.close(stream.fd)
+            return
+
+        *lines, stream.partial = (stream.partial + chunk).split(b'\n')
+        for line in lines:
+            stream.buffer.append(stream.source, line.decode(errors = 'replace'))
+        # A line without a line break is flushed in pieces, so a single partial line cannot grow without limits
+        if len(stream.partial) >= self.line_length:
+            stream.buffer.append(stream.source, stream.partial.decode(errors = 'replace'))
+            stream.partial = b''
@@ -1,5 +1,6 @@
 import queue
 import threading
+from concurrent import futures
 import logging
 import os
 import logging
@@ -11,15 +12,27 @@ from enum import Enum
 from typing import List
 
 from django.conf import settings
+from django.db import close_old_connections
+from coordinator.kuhn.kuhn_bot import KuhnBotAgent, KuhnBotRunner
+from coordinator.kuhn.kuhn_bot_output import KuhnBotOutput
 from coordinator.kuhn.kuhn_constants import KUHN_TYPE_TO_STR, CoordinatorActions, KuhnCoordinatorMessage, KuhnCoordinatorEventTypes
 from coordinator.kuhn.kuhn_game import KuhnGame
-from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayer
+from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayer, KuhnGameLobbyPlayerMessage
 from coordinator.kuhn.kuhn_waiting_room import KuhnWaitingRoom
+from coordinator.kuhn.kuhn_zygote import KuhnBotZygote
+from coordinator.utilities.aio import AwaitableEvent
 
-from coordinator.models import Game, GameCoordinator, GameCoordinatorTypes, Player, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
+from coordinator.models import GameCoordinator, GameCoordinatorTypes, Player, PlayerStats, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
+
+# Lifecycle states of a coordinator, `Waiting` -> `Playing` -> `Closed`
+class KuhnCoordinatorStates(str, Enum):
+    Waiting = 'WAITING'
+    Playing = 'PLAYING'
+    Closed  = 'CLOSED'
 
 class KuhnCoordinator(object):
-    LobbyBots = []
+    LobbyBots   = []
+    LobbyAgents = []
 
     # Here we check is bots are enabled in server settings
     # Routine picks up `BOT_FOLDER` setting variable, iterates over subfolders,
@@ -31,6 +44,10 @@ class KuhnCoordinator(object):
                 logging.info(f'[KuhnCoordinator] Kuhn game bot found in \'{ folder }\'')
                 LobbyBots.append(bot_exec)
 
+    # In-process bot agents are loaded only once, see `KuhnBotAgent` and `KUHN_BOTS_IN_PROCESS` setting
+    if settings.KUHN_ALLOW_BOTS and settings.KUHN_BOTS_IN_PROCESS:
+        LobbyAgents = KuhnBotAgent.load_all(settings.KUHN_BOT_FOLDER)
+
     class CoordinatorWaitingRoomCreationFailed(Exception):
         pass
 
@@ -55,12 +72,13 @@ class KuhnCoordinator(object):
         self.coordinator_type = coordinator_type
         self.game_type        = game_type
         self.is_private       = is_private
-        self.channel          = queue.Queue()
+        self.duel_channels    = {}            # Player token -> channel of player's current duel, guarded by `self.lock`
         self.registered       = threading.Event()
-        self.ready            = threading.Event()
+        self.ready            = AwaitableEvent()
         self.botsready        = threading.Event()
         self.closed           = threading.Event()
         self.error            = None
+        self.state_listeners  = [] # Called with (coordinator, previous state, new state) under coordinator's lock
         self.logger           = logging.getLogger('kuhn.coordinator')
 
         try:
@@ -96,16 +114,33 @@ class KuhnCoordinator(object):
     def wait_ready(self) -> bool:
         return self.ready.wait(timeout = settings.COORDINATOR_READY_TIMEOUT)
 
+    async def wait_ready_async(self) -> bool:
+        return await self.ready.wait_async(timeout = settings.COORDINATOR_READY_TIMEOUT)
+
     def mark_as_ready(self):
         with self.lock:
             if not self.is_ready():
                 self.logger.info(f'Game cordinator { self.id } has been marked as ready.')
                 self.ready.set()
+                self.notify_state_changed(KuhnCoordinatorStates.Waiting, KuhnCoordinatorStates.Playing)
 
     def is_closed(self) -> bool:
         with self.lock:
             return self.closed.is_set()
 
+    def get_state(self) -> KuhnCoordinatorStates:
+        with self.lock:
+            if self.is_closed():
+                return KuhnCoordinatorStates.Closed
+            elif self.is_ready():
+                return KuhnCoordinatorStates.Playing
+            return KuhnCoordinatorStates.Waiting
+
+    def notify_state_changed(self, previous: KuhnCoordinatorStates, state: KuhnCoordinatorStates):
+        with self.lock:
+            for listener in list(self.state_listeners):
+                listener(self, previous, state)
+
     def close(self, error = None):
         with self.lock:
             if not self.is_closed():
@@ -118,6 +153,32 @@ class KuhnCoordinator(object):
                 self.waiting_room.close(error = error) # Here we do not forget to close corresponding waiting room
                 GameCoordinator.objects.filter(id = self.id).update(is_finished = True, is_failed = is_failed, error = error)
                 self.closed.set()
+                self.notify_state_changed(KuhnCoordinatorStates.Playing, KuhnCoordinatorStates.Closed)
+
+    # Routes a player's message to the channel of player's current duel, tournament duels of a round are played concurrently
+    # A player who does not play a duel at the moment (e.g. has finished a duel and waits for the next one) is answered with `Wait` right away,
+    # so the answer never arrives after `GameStart` of the player's next duel
+    def post(self, message: KuhnGameLobbyPlayerMessage):
+        with self.lock:
+            channel = self.duel_channels.get(message.player_token, None)
+        if channel is not None:
+            channel.put(message)
+        else:
+            self.answer_wait(message)
+
+    def answer_wait(self, message: KuhnGameLobbyPlayerMessage):
+        self.logger.warning(f'Message { message } has been received while player does not play a duel')
+        if self.waiting_room.is_registered(message.player_token) and not self.waiting_room.is_disconnected(message.player_token):
+            maybe_waiting_player_channel = self.waiting_room.get_player_channel(message.player_token)
+            maybe_waiting_player_channel.post(KuhnCoordinatorMessage(KuhnCoordinatorEventTypes.InvalidAction, actions = [ CoordinatorActions.Wait ]))
+
+    # Answers remaining messages in a duel's `channel` with `Wait`, these are late messages of players who have finished the duel
+    def drain(self, channel: queue.Queue):
+        while not channel.empty():
+            try:
+                self.answer_wait(channel.get_nowait())
+            except queue.Empty:
+                pass
 
     def are_bots_ready(self):
         with self.lock:
@@ -149,16 +210,43 @@ class KuhnCoordinator(object):
             if len(bot_players) == 0:
                 self.close(f'Coordinator { self.id } attempts to add bot players, but there are not registered bot players in the database.')
 
-            if len(KuhnCoordinator.LobbyBots) == 0:
+            if len(KuhnCoordinator.LobbyAgents if settings.KUHN_BOTS_IN_PROCESS else KuhnCoordinator.LobbyBots) == 0:
                 self.close(f'Coordinator { self.id } attempts to add bot players, but there are not registered bot implementations.')
 
             def __spawn_bot(bot_token):
                 try: 
+                    # In-process bots play directly against this coordinator in the current thread
+                    if settings.KUHN_BOTS_IN_PROCESS:
+                        bot = random.choice(KuhnCoordinator.LobbyAgents)
+                        self.logger.info(f'Running { bot.name } bot in-process for coordinator { self.id }.')
+                        KuhnBotRunner(self, bot_token, bot).play()
+                        self.logger.info(f'Bot in coordinator { self.id } exited sucessfully.')
+                        return
                     bot_exec = str(random.choice(KuhnCoordinator.LobbyBots))
+                    bot_argv = [ '--play', str(self.id), '--token', bot_token, '--cards', KUHN_TYPE_TO_STR[self.game_type] ]
+                    bot_name = os.path.basename(os.path.dirname(bot_exec))
                     self.logger.info(f'Executing { bot_exec } bot for coordinator { self.id }.')
-                    # Sort of fix for strange issue on windows we found with Bart
-                    is_shell = True if os.name == 'nt' else False # Probably there is a more clever and proper fix for that
-                    subprocess.run([ 'python', bot_exec, '--play', str(self.id), '--token', bot_token, '--cards', KUHN_TYPE_TO_STR[self.game_type] ], check = True, shell = is_shell, capture_output = True)
+                    # Bot process is forked from a warm zygote if possible, otherwise we cold-start a new interpreter
+                    # Bot's output is streamed into a bounded per-coordinator buffer (see `KuhnBotOutput`) instead of being kept in memory as a whole
+                    if KuhnBotZygote.is_supported():
+                        output = KuhnBotOutput.default().open_fifo(self.id, bot_name)
+                        try:
+                            returncode = KuhnBotZygote.get(bot_exec).spawn(bot_argv, output = output)
+                        finally:
+                            KuhnBotOutput.default().close_fifo(output)
+                    elif KuhnBotOutput.is_supported():
+                        output  = KuhnBotOutput.default().open_pipe(self.id, bot_name)
+                        try:
+                            process = subprocess.Popen([ 'python', bot_exec ] + bot_argv, stdout = output, stderr = output)
+                        finally:
+                            os.close(output)
+                        returncode = process.wait()
+                    else:
+                        # Sort of fix for strange issue on windows we found with Bart
+                        is_shell = True if os.name == 'nt' else False # Probably there is a more clever and proper fix for that
+                        returncode = subprocess.run([ 'python', bot_exec ] + bot_argv, shell = is_shell, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL).returncode
+                    if returncode != 0:
+                        raise Exception(f'Bot { bot_exec } exited with code { returncode }')
                     self.logger.info(f'Bot in coordinator { self.id } exited sucessfully.')
                 except Exception as e:
                     self.close(error = str(e))
@@ -258,9 +346,20 @@ class KuhnCoordinator(object):
 
         player1 = KuhnGameLobbyPlayer(player_tokens[0], KuhnGame.InitialBank, self.waiting_room.get_player_channel(player_tokens[0]))
         player2 = KuhnGameLobbyPlayer(player_tokens[1], KuhnGame.InitialBank, self.waiting_room.get_player_channel(player_tokens[1]))
-        game    = KuhnGame(self, player1, player2, self.game_type, self.channel)
 
-        winner, unlucky = game.play()
+        # Each duel has its own channel, so duels of the same coordinator do not steal each other's messages
+        channel = queue.Queue()
+        with self.lock:
+            for token in player_tokens:
+                self.duel_channels[token] = channel
+        game = KuhnGame(self, player1, player2, self.game_type, channel)
+
+        try:
+            winner, unlucky = game.play()
+        finally:
+            with self.lock:
+                for token in player_tokens:
+                    self.duel_channels.pop(token, None)
 
         return game, winner, unlucky
 
@@ -281,76 +380,95 @@ class KuhnCoordinator(object):
             
             return bracket
 
+    # Plays a single match of a tournament, fills its `TournamentRoundBracketItem` and creates a `TournamentRoundGame` database record, returns the winner
+    # `ready_at` is the moment both players of the match have become known, time until the match has actually started is stored as its queueing delay
+    def play_tournament_duel(self, duel: List[Player], dbbracket: TournamentRoundBracketItem, round: int, ready_at: float) -> KuhnGameLobbyPlayer:
+        try:
+            queue_delay = time.perf_counter() - ready_at
+            TournamentRoundBracketItem.objects.filter(id = dbbracket.id).update(player1 = duel[0], player2 = duel[1], queue_delay = queue_delay)
+
+            self.logger.info(f'Starting duel { dbbracket.position } of round { round } within the tournament for coordinator { self.id } after { queue_delay:.3f} sec in queue')
+            game, winner, unlucky = self.play_duel(duel)
+            self.logger.info(f'Ending duel { dbbracket.position } of round { round } within the tournament for coordinator { self.id }')
+
+            time.sleep(settings.COORDINATOR_TOURNAMENT_GRACE_PERIOD)
+
+            self.drain(game.channel)
+
+            if winner == None or game.error != None:
+                self.logger.warning(f'Unfinished game in the tournament with coordinator { self.id }. Choosing random winner.')
+                disconnected_player = game.check_any_disconnected()
+                if disconnected_player != None:
+                    winner = game.get_player_opponent(disconnected_player)
+                else:
+                    random_winner_token = random.choice(duel).token
+                    winner = KuhnGameLobbyPlayer(random_winner_token, None, None)
+
+            TournamentRoundGame.objects.create(bracket_item_id = dbbracket.id, game_id = game.id)
+
+            return winner
+        finally:
+            # Duels run in executor's threads, which are not managed by Django
+            close_old_connections()
+
+    # Tournament is played as a bracket dependency graph instead of round by round:
+    # the first round is drawn randomly and the match at `position` of the next round is played between winners of matches `2 * position - 1` and `2 * position`,
+    # so a match starts as soon as both of its feeder matches have finished and a slow game only delays its own subtree
     def play_tournament(self, players: List[Player]):
 
         # First we create tournament bracket based on number of players
         dbtournament = Tournament.objects.get(coordinator__id = self.id)
 
-        remaining_players = players.copy()
+        bracket = self.make_bracket(players)
 
-        round = 1
+        # Whole bracket skeleton is created in advance with two bulk inserts, players of later rounds are filled in once their matches start
+        # Primary keys are generated on our side, so created records can be referenced right away without fetching them back
+        num_rounds = len(players).bit_length() - 1
+        dbrounds   = [ TournamentRound(tournament = dbtournament, index = index) for index in range(1, num_rounds + 1) ]
+        dbbrackets = {} # (round index, position) -> `TournamentRoundBracketItem`
+        for dbround in dbrounds:
+            for position in range(1, (len(players) >> dbround.index) + 1):
+                players_pair = bracket[position - 1] if dbround.index == 1 else [ None, None ]
+                dbbrackets[(dbround.index, position)] = TournamentRoundBracketItem(position = position, round = dbround, player1 = players_pair[0], player2 = players_pair[1])
+        TournamentRound.objects.bulk_create(dbrounds)
+        TournamentRoundBracketItem.objects.bulk_create(dbbrackets.values())
 
-        while len(remaining_players) != 1:
-            
-            # We create new database record for each round
-            dbround = TournamentRound(tournament = dbtournament, index = round)
-            dbround.save()
-
-            self.logger.info(f'Starting round { round } of the tournament for coordinator { self.id }')
-
-            # We create brackets until there is only one remaining player
-            bracket = self.make_bracket(remaining_players)
-            winners = []
-
-            # We create database records for all upcoming rounds in advance and save db references for later usage
-            dbbrackets = []
-            for (index, item) in enumerate(bracket):
-                dbitem = TournamentRoundBracketItem(position = index + 1, round = dbround, player1 = item[0], player2 = item[1])
-                dbitem.save()
-                dbbrackets.append(dbitem)
-            
-            self.logger.info(f'Bracket has been created for round { round } of the tournament for coordinator { self.id }')
+        players_by_token = { str(player.token): player for player in players }
+        winners          = {} # (round index, position) -> winner's `Player`
+        champion         = None
 
-            # For each item in bracket we play a standard duel game and create a `TournamentRoundGame` database record at the end
-            for duel, dbbracket in zip(bracket, dbbrackets):
-                self.logger.info(f'Starting a single duel within the tournament for coordinator { self.id }')
-                game, winner, unlucky = self.play_duel(duel)
-                self.logger.info(f'Ending a single duel within the tournament for coordinator { self.id }')
+        with futures.ThreadPoolExecutor(max_workers = settings.COORDINATOR_TOURNAMENT_PARALLEL_DUELS, thread_name_prefix = f'kuhn-duel-{ self.id }') as executor:
+            running = {} # future -> (round index, position)
 
-                time.sleep(settings.COORDINATOR_TOURNAMENT_GRACE_PERIOD)
+            def schedule(round: int, position: int, duel: List[Player]):
+                running[executor.submit(self.play_tournament_duel, duel, dbbrackets[(round, position)], round, time.perf_counter())] = (round, position)
 
-                while not self.channel.empty():
-                    try:
-                        message = self.channel.get(timeout = settings.COORDINATOR_WAITING_TIMEOUT)
-                        self.logger.warning(f'Remaining message { message } after duel has ended')
-                        if self.waiting_room.is_registered(message.player_token) and not self.waiting_room.is_disconnected(message.player_token):
-                            maybe_waiting_player_channel = self.waiting_room.get_player_channel(message.player_token)
-                            maybe_waiting_player_channel.put(KuhnCoordinatorMessage(KuhnCoordinatorEventTypes.InvalidAction, actions = [ CoordinatorActions.Wait ]))
-                            maybe_waiting_player_channel.join()
-                    except Exception:
-                        pass
-
-                if winner == None or game.error != None:
-                    self.logger.warning('Unfinished game in the tournament with coordinator { self.id }. Choosing random winner.')
-                    disconnected_player = game.check_any_disconnected()
-                    if disconnected_player != None:
-                        winner = game.get_player_opponent(disconnected_player)
-                    else:
-                        random_winner_token = random.choice(duel).token
-                        winner = KuhnGameLobbyPlayer(random_winner_token, None, None)
+            for (index, duel) in enumerate(bracket):
+                schedule(1, index + 1, duel)
 
-                dbgame = TournamentRoundGame(bracket_item = dbbracket, game = Game.objects.get(id = game.id))
-                dbgame.save()
+            self.logger.info(f'Bracket has been created for the tournament for coordinator { self.id }')
 
-                winners.append(winner)
+            while len(running) != 0:
+                done, _ = futures.wait(running.keys(), return_when = futures.FIRST_COMPLETED)
+                for future in done:
+                    round, position = running.pop(future)
+                    winner = players_by_token[str(future.result().player_token)]
+                    winners[(round, position)] = winner
 
-            remaining_players = list(Player.objects.filter(token__in = list(map(lambda d: d.player_token, winners))))
+                    if round == num_rounds:
+                        champion = winner
+                        continue
 
-            round = round + 1
+                    # Next match is ready once the winner of the sibling match is known as well
+                    sibling = position + 1 if position % 2 == 1 else position - 1
+                    if (round, sibling) in winners:
+                        first, second = sorted([ position, sibling ])
+                        schedule(round + 1, (position + 1) // 2, [ winners[(round, first)], winners[(round, second)] ])
 
-        Tournament.objects.filter(id = dbtournament.id).update(place1 = Player.objects.get(token = remaining_players[0].token))
+        Tournament.objects.filter(id = dbtournament.id).update(place1 = champion)
+        PlayerStats.record_tournament([ player.token for player in players ], champion.token)
 
-        self.logger.info(f'We have a winner for a tournament: { self.id } - { remaining_players[0].token }')
+        self.logger.info(f'We have a winner for a tournament: { self.id } - { champion.token }')
 
         return 
 
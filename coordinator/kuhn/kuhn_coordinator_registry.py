@@ -0,0 +1,90 @@
+import collections
+import threading
+
+# `KuhnCoordinatorRegistry` keeps active coordinators of the server indexed by their ids
+# Coordinators are spread over several shards, each shard is a plain dict with its own lock
+#   - lookups by id do not take any lock, a single `dict.get` is atomic in CPython and shards are never replaced
+#   - `add` and `remove` lock only one shard, so concurrent connections to different coordinators rarely contend
+# Registry also maintains the number of coordinators for each (coordinator type, state) pair,
+# counters are updated on registration/removal and on coordinator's state changes (see `KuhnCoordinator.state_listeners`),
+# so `count` never scans the registry
+class KuhnCoordinatorRegistry(object):
+
+    def __init__(self, num_shards: int = 16):
+        if num_shards <= 0:
+            raise ValueError('Number of shards should be positive')
+        self.shards      = [ {} for _ in range(num_shards) ]
+        self.locks       = [ threading.Lock() for _ in range(num_shards) ]
+        self.counts      = collections.Counter()
+        self.counts_lock = threading.Lock()
+
+    def get_shard_index(self, coordinator_id: str) -> int:
+        return hash(coordinator_id) % len(self.shards)
+
+    def get(self, coordinator_id: str):
+        coordinator_id = str(coordinator_id)
+        return self.shards[self.get_shard_index(coordinator_id)].get(coordinator_id)
+
+    def __contains__(self, coordinator_id) -> bool:
+        return self.get(coordinator_id) is not None
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def __repr__(self) -> str:
+        return f'KuhnCoordinatorRegistry({ self.ids() })'
+
+    def ids(self):
+        return [ coordinator.id for coordinator in self.values() ]
+
+    # Returns a consistent (per shard) snapshot of registered coordinators
+    def values(self):
+        values = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                values.extend(shard.values())
+        return values
+
+    def add(self, coordinator) -> bool:
+        index = self.get_shard_index(coordinator.id)
+        # Coordinator's lock guarantees that its state does not change between the moment we read it and the moment we subscribe to its changes
+        with coordinator.lock:
+            with self.locks[index]:
+                if coordinator.id in self.shards[index]:
+                    return False
+                self.shards[index][coordinator.id] = coordinator
+            coordinator.state_listeners.append(self.on_state_changed)
+            self.update_counts(coordinator.coordinator_type, None, coordinator.get_state())
+        return True
+
+    def remove(self, coordinator) -> bool:
+        index = self.get_shard_index(coordinator.id)
+        with coordinator.lock:
+            with self.locks[index]:
+                if self.shards[index].get(coordinator.id) is not coordinator:
+                    return False
+                self.shards[index].pop(coordinator.id)
+            coordinator.state_listeners.remove(self.on_state_changed)
+            self.update_counts(coordinator.coordinator_type, coordinator.get_state(), None)
+        return True
+
+    def on_state_changed(self, coordinator, previous, state):
+        self.update_counts(coordinator.coordinator_type, previous, state)
+
+    def update_counts(self, coordinator_type, previous, state):
+        with self.counts_lock:
+            if previous is not None:
+                self.counts[(coordinator_type, previous)] -= 1
+            if state is not None:
+                self.counts[(coordinator_type, state)] += 1
+
+    # Both arguments are optional, e.g. `count(state = KuhnCoordinatorStates.Waiting)` returns the number of all waiting coordinators
+    def count(self, coordinator_type = None, state = None) -> int:
+        with self.counts_lock:
+            return sum(
+                value for (key_type, key_state), value in self.counts.items() if (coordinator_type is None or key_type == coordinator_type) and (state is None or key_state == state)
+            )
+
+    def get_counts(self) -> dict:
+        with self.counts_lock:
+            return { key: value for key, value in self.counts.items() if value != 0 }
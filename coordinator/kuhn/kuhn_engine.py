@@ -0,0 +1,175 @@
+import random
+
+import numpy as np
+
+from coordinator.kuhn.kuhn_constants import BET, CALL, CARDS_DEALINGS, CHECK, FOLD, RESULTS_MAP
+
+# `KuhnEngine` is a compact integer-encoded representation of Kuhn poker rules, intended for high-volume simulation and evaluation
+#   - actions are small ints (see `ACTIONS`), a set of legal actions is a bitmask
+#   - a history of actions is a small int as well, transitions are stored in `NEXT_HISTORY` table
+#   - a dealing is an index into `CARDS_DEALINGS[game_type]`
+#   - terminal payoffs are precomputed in an array indexed by (dealing, history)
+# String actions, cards and info sets (see `kuhn_poker.py`) are produced only at the protocol boundary with `encode_*` and `*_inf_set` methods
+
+ACTIONS = (BET, CHECK, CALL, FOLD)
+
+ACTION_BET, ACTION_CHECK, ACTION_CALL, ACTION_FOLD = range(len(ACTIONS))
+
+ACTION_CODES = { action: code for code, action in enumerate(ACTIONS) }
+
+def actions_mask(actions) -> int:
+    mask = 0
+    for action in actions:
+        mask = mask | (1 << action)
+    return mask
+
+# Same rules as in `KuhnPlayerMoveGameState`, histories are tuples of action codes here
+def _next_actions(history):
+    if len(history) == 0:
+        return (ACTION_BET, ACTION_CHECK)
+    elif len(history) == 1 and history[-1] == ACTION_BET:
+        return (ACTION_FOLD, ACTION_CALL)
+    elif len(history) == 1 and history[-1] == ACTION_CHECK:
+        return (ACTION_BET, ACTION_CHECK)
+    elif len(history) == 2 and history == (ACTION_CHECK, ACTION_BET):
+        return (ACTION_CALL, ACTION_FOLD)
+    return ()
+
+def _enumerate_histories():
+    histories, index = [ () ], 0
+    while index < len(histories):
+        for action in _next_actions(histories[index]):
+            histories.append(histories[index] + (action, ))
+        index = index + 1
+    return tuple(histories)
+
+# All possible histories in breadth-first order, `HISTORY_ROOT` is an empty history
+HISTORIES      = _enumerate_histories()
+HISTORY_ROOT   = 0
+HISTORY_CODES  = { history: code for code, history in enumerate(HISTORIES) }
+NUM_HISTORIES  = len(HISTORIES)
+
+# Legal actions of each history as a bitmask and as a tuple (in the same order as in `kuhn_poker.py`)
+LEGAL_ACTIONS      = tuple(actions_mask(_next_actions(history)) for history in HISTORIES)
+LEGAL_ACTIONS_LIST = tuple(_next_actions(history) for history in HISTORIES)
+
+# `NEXT_HISTORY[history, action]` is a history after `action` or -1 if `action` is not legal
+NEXT_HISTORY = np.full((NUM_HISTORIES, len(ACTIONS)), -1, dtype = np.int8)
+for _code, _history in enumerate(HISTORIES):
+    for _action in _next_actions(_history):
+        NEXT_HISTORY[_code, _action] = HISTORY_CODES[_history + (_action, )]
+NEXT_HISTORY.setflags(write = False)
+
+# Scalar methods of `KuhnEngine` use plain tuples, indexing a numpy array with Python ints is much slower than indexing a tuple
+NEXT_HISTORY_TABLE = tuple(tuple(int(code) for code in row) for row in NEXT_HISTORY)
+
+IS_TERMINAL = np.array([ LEGAL_ACTIONS[code] == 0 for code in range(NUM_HISTORIES) ], dtype = bool)
+IS_TERMINAL.setflags(write = False)
+IS_TERMINAL_TABLE = tuple(bool(value) for value in IS_TERMINAL)
+
+# Player to move in each history, 0 is the first player in the turn order and 1 is the second one
+TO_MOVE = np.array([ len(history) % 2 for history in HISTORIES ], dtype = np.int8)
+TO_MOVE.setflags(write = False)
+
+# Cards are revealed only in case if last action was CALL or both actions were CHECK
+IS_SHOWDOWN = np.array([ (len(history) != 0 and history[-1] == ACTION_CALL) or history == (ACTION_CHECK, ACTION_CHECK) for history in HISTORIES ], dtype = bool)
+IS_SHOWDOWN.setflags(write = False)
+
+HISTORY_STRINGS = tuple('.'.join(ACTIONS[action] for action in history) for history in HISTORIES)
+
+# Payoff of the first player for a terminal history, same as `KuhnPlayerMoveGameState.evaluation`
+def _payoff(cards: str, history) -> int:
+    if IS_SHOWDOWN[HISTORY_CODES[history]]:
+        return RESULTS_MAP[cards] * (2 if history[-1] == ACTION_CALL else 1)
+    if history[-1] == ACTION_FOLD:
+        # Player who folds loses the ante
+        return -1 if (len(history) - 1) % 2 == 0 else 1
+    return 0
+
+class KuhnEngine(object):
+
+    def __init__(self, game_type: int):
+        self.game_type     = game_type
+        self.dealings      = tuple(CARDS_DEALINGS[game_type])
+        self.num_dealings  = len(self.dealings)
+        self.dealing_codes = { cards: code for code, cards in enumerate(self.dealings) }
+        # Payoffs are zero for non-terminal histories
+        self.payoffs = np.array([
+            [ _payoff(cards, history) if IS_TERMINAL[code] else 0 for code, history in enumerate(HISTORIES) ] for cards in self.dealings
+        ], dtype = np.int8)
+        self.payoffs.setflags(write = False)
+        self.payoffs_table = tuple(tuple(int(value) for value in row) for row in self.payoffs)
+        # Legal actions table padded to a fixed width, every non-terminal history in Kuhn poker has exactly two legal actions
+        self.legal_pairs = np.array([ actions if len(actions) == 2 else (-1, -1) for actions in LEGAL_ACTIONS_LIST ], dtype = np.int8)
+        self.legal_pairs.setflags(write = False)
+
+    @staticmethod
+    def get(game_type: int) -> 'KuhnEngine':
+        return KUHN_ENGINES[game_type]
+
+    def deal(self, generator = None) -> int:
+        generator = generator if generator is not None else random
+        return generator.randrange(self.num_dealings)
+
+    def legal_actions(self, history: int) -> int:
+        return LEGAL_ACTIONS[history]
+
+    def is_legal(self, history: int, action: int) -> bool:
+        return (LEGAL_ACTIONS[history] >> action) & 1 == 1
+
+    def play(self, history: int, action: int) -> int:
+        if not self.is_legal(history, action):
+            raise ValueError(f'Action { action } is not legal in history { history }')
+        return NEXT_HISTORY_TABLE[history][action]
+
+    def is_terminal(self, history: int) -> bool:
+        return IS_TERMINAL_TABLE[history]
+
+    def payoff(self, dealing: int, history: int) -> int:
+        if not IS_TERMINAL_TABLE[history]:
+            raise RuntimeError('trying to evaluate non-terminal history')
+        return self.payoffs_table[dealing][history]
+
+    # Vectorized counterparts, `dealings` and `histories` are integer arrays of the same shape
+    def evaluate(self, dealings: np.ndarray, histories: np.ndarray) -> np.ndarray:
+        return self.payoffs[dealings, histories]
+
+    # Plays `num_rounds` rounds where both players choose uniformly random legal actions, returns (dealings, terminal histories)
+    def simulate(self, num_rounds: int, generator = None):
+        generator = generator if generator is not None else np.random.default_rng()
+        dealings  = generator.integers(self.num_dealings, size = num_rounds)
+        histories = np.full(num_rounds, HISTORY_ROOT, dtype = np.int8)
+        active    = ~IS_TERMINAL[histories]
+        while active.any():
+            choices = generator.integers(2, size = int(np.count_nonzero(active)))
+            actions = self.legal_pairs[histories[active], choices]
+            histories[active] = NEXT_HISTORY[histories[active], actions]
+            active = ~IS_TERMINAL[histories]
+        return dealings, histories
+
+    # Protocol boundary, conversions from and to string representations
+    def encode_dealing(self, cards: str) -> int:
+        return self.dealing_codes[cards]
+
+    def encode_action(self, action: str) -> int:
+        return ACTION_CODES[action]
+
+    def encode_history(self, actions) -> int:
+        return HISTORY_CODES[tuple(ACTION_CODES[action] for action in actions)]
+
+    def decode_actions(self, mask: int):
+        return [ ACTIONS[action] for action in range(len(ACTIONS)) if (mask >> action) & 1 == 1 ]
+
+    def inf_set(self, dealing: int, history: int) -> str:
+        return f'.{ self.dealings[dealing] }.{ HISTORY_STRINGS[history] }'
+
+    def public_inf_set(self, history: int) -> str:
+        return HISTORY_STRINGS[history]
+
+    def showdown_inf_set(self, dealing: int, history: int) -> str:
+        return f'.{ self.dealings[dealing] if IS_SHOWDOWN[history] else "??" }.{ HISTORY_STRINGS[history] }'
+
+
+KUHN_ENGINES = {
+    game_type: KuhnEngine(game_type) for game_type in CARDS_DEALINGS.keys()
+}
@@ -8,14 +8,16 @@ import traceback
 from typing import List
 from django.conf import settings
 
-from coordinator.kuhn.kuhn_poker import KuhnRootChanceGameState
+from coordinator.kuhn.kuhn_poker import KuhnRootChanceGameState, get_kuhn_game_tree
 from coordinator.kuhn.kuhn_constants import CARDS_DEALINGS, POSSIBLE_CARDS, CoordinatorActions, KuhnCoordinatorMessage, KuhnCoordinatorEventTypes
 from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayer
-from coordinator.models import Game, GameRound
+from coordinator.kuhn.kuhn_writer import KuhnGameWriter
+from coordinator.models import Game, GameRound, PlayerStats
 
 class KuhnGame(object):
     InitialBank     = settings.KUHN_GAME_INITIAL_BANK
     MessagesTimeout = settings.COORDINATOR_WAITING_TIMEOUT
+    JournalWarned   = False
 
     def __init__(self, coordinator, player1: KuhnGameLobbyPlayer, player2: KuhnGameLobbyPlayer, game_type: int, channel: queue.Queue):
 
@@ -37,13 +39,27 @@ class KuhnGame(object):
         self.error         = None
         self.finished      = threading.Event()
         self.channel       = channel
+        self.writer        = KuhnGame.get_writer()
         self.logger        = logging.getLogger('kuhn.game')
 
+    # Rounds are persisted either through the round journal (if enabled) or directly to the database, both writers have the same interface
+    # Journal is imported only if it is enabled, it is not supported on Windows and games use `KuhnGameWriter` there
+    @staticmethod
+    def get_writer():
+        if settings.KUHN_ROUND_JOURNAL_FOLDER is not None:
+            from coordinator.kuhn.kuhn_journal import KuhnRoundJournal
+            if KuhnRoundJournal.is_supported():
+                return KuhnRoundJournal.default()
+            if not KuhnGame.JournalWarned:
+                KuhnGame.JournalWarned = True
+                logging.getLogger('kuhn.game').warning('Round journal is not supported on this platform, rounds are written with `KuhnGameWriter`')
+        return KuhnGameWriter.default()
+
     def play(self):
         try:
             self.logger.debug(f'Kuhn game { self.id } initiated `play` procedure.')
 
-            Game.objects.filter(id = self.id).update(is_started = True)
+            self.writer.update_game(self.id, is_started = True)
 
             disconnected_before_game = self.check_any_disconnected()
 
@@ -73,8 +89,7 @@ class KuhnGame(object):
                             self.logger.warning(f'Received a message from unregistered player { message.player_token }: { message.action }')
                             if self.coordinator.waiting_room.is_registered(message.player_token) and not self.coordinator.waiting_room.is_disconnected(message.player_token):
                                 maybe_waiting_player_channel = self.coordinator.waiting_room.get_player_channel(message.player_token)
-                                maybe_waiting_player_channel.put(KuhnCoordinatorMessage(KuhnCoordinatorEventTypes.InvalidAction, actions = [ CoordinatorActions.Wait ]))
-                                maybe_waiting_player_channel.join()
+                                maybe_waiting_player_channel.post(KuhnCoordinatorMessage(KuhnCoordinatorEventTypes.InvalidAction, actions = [ CoordinatorActions.Wait ]))
                             continue
 
                         self.logger.info(f'Received message from player { message.player_token }: { message.action }')
@@ -111,14 +126,18 @@ class KuhnGame(object):
                         elif message.action == CoordinatorActions.AvailableActions:
                             player  = self.get_player(message.player_token)
                             inf_set = current_round.stage.public_inf_set()
-                            actions = current_round.stage.actions() if player.player_token == current_round.player_token_turn else [ CoordinatorActions.Wait ]
+                            # If the opponent has already acted in this round the player has been sent their actions with a `NextAction` event
+                            # A late request (e.g. right after card deal) must not duplicate them, otherwise the player would act twice
+                            is_turn = player.player_token == current_round.player_token_turn and len(inf_set) == 0
+                            actions = current_round.stage.actions() if is_turn else [ CoordinatorActions.Wait ]
                             player.send_message(KuhnCoordinatorMessage(KuhnCoordinatorEventTypes.NextAction, inf_set = inf_set, actions = actions))
                         # Wait is an utility message
                         elif message.action == CoordinatorActions.Wait:
                             continue
                         # If message action is not 'START' we check that the message came from a player and assume it is their next action
                         # We also check if action is valid here and if not we force finishing of the game
-                        elif message.player_token == current_round.player_token_turn and message.action in current_round.stage.actions():
+                        # Actions that arrive after the game has been finished (e.g. a reply to an earlier `NextAction` event) are ignored
+                        elif message.player_token == current_round.player_token_turn and message.action in current_round.stage.actions() and not self.is_finished():
                             # We register current player's action in an inner stage object
                             current_round.stage.play(message.action)
                             if current_round.stage.is_terminal():
@@ -185,12 +204,20 @@ class KuhnGame(object):
                 if is_failed:
                     self.logger.warning(f'Kuhn game { self.id } finished with an error: { error }')
                 self.error = error
-                Game.objects.filter(id = self.id).update(
+                self.writer.update_game(
+                    self.id,
                     is_finished = True, 
                     is_failed   = is_failed, 
-                    winner      = self.get_winner_token(),
+                    winner_id   = self.get_winner_token(),
                     error       = error
                 )
+                # Game results must be in the database once game is finished (e.g. tournaments read them right away)
+                if not self.writer.flush(game_id = self.id):
+                    self.logger.error(f'Kuhn game { self.id } results could not be fully saved, some rounds or the game status may be lost')
+                try:
+                    PlayerStats.record_game([ self.player1.player_token, self.player2.player_token ], self.get_winner_token())
+                except Exception as e:
+                    self.logger.error(f'Kuhn game { self.id } could not update player stats: { e }')
                 self.finished.set()
 
     def get_players(self) -> List[KuhnGameLobbyPlayer]:
@@ -240,6 +267,9 @@ class KuhnGame(object):
     def get_card_dealings(self):
         return CARDS_DEALINGS[self.game_type]
 
+    def get_game_tree(self) -> KuhnRootChanceGameState:
+        return get_kuhn_game_tree(self.game_type)
+
     def get_last_round(self):
         return self.rounds[-1] if len(self.rounds) >= 1 else None
 
@@ -287,7 +317,8 @@ class KuhnGame(object):
                     index         = self.get_rounds_count() + 1, 
                     first_player  = _first_player.player_token, 
                     second_player = self.get_player_opponent(_first_player.player_token).player_token,
-                    card_dealings = self.get_card_dealings()
+                    game_tree     = self.get_game_tree(),
+                    writer        = self.writer
                 )
                 self.rounds.append(_round)
                 self.logger.info(f'A new round has been created. First player is { _first_player.player_token }')
@@ -364,18 +395,18 @@ class KuhnGame(object):
 
 
 # `KuhnGameLobbyStage` is a game logic wrapper, see also `kuhn_game.py`
+# Stage is a cursor into a shared game tree (see `get_kuhn_game_tree`), it never copies or modifies the tree itself
 class KuhnGameLobbyStage(object):
+    __slots__ = [ '_stage' ]
 
-    def __init__(self, card_dealings):
-        self._root  = KuhnRootChanceGameState(card_dealings)
-        self._stage = self._root.play(random.choice(card_dealings))
-        self._cards = self._stage.cards
+    def __init__(self, game_tree: KuhnRootChanceGameState):
+        self._stage = game_tree.sample_one()
 
     def cards(self):
-        return self._cards
+        return self._stage.cards
 
     def card(self, index):
-        return self._cards[index]
+        return self._stage.cards[index]
 
     def actions(self):
         return self._stage.actions
@@ -387,13 +418,7 @@ class KuhnGameLobbyStage(object):
         return self._stage.is_terminal()
 
     def inf_set(self):
-        _inf_set = self._stage.inf_set()
-        _, cards, *moves = _inf_set.split('.')
-        # We return showdown only in case if last action was CALL or both actions was 'CHECK'
-        _cards = '??'
-        if (moves[-1] == 'CALL') or (moves == ['CHECK', 'CHECK']):
-            _cards = cards
-        return f'{_}.{_cards}.{".".join(moves)}'  # self._stage.inf_set()
+        return self._stage.showdown_inf_set()
 
     def secret_inf_set(self):
         return self._stage.inf_set()
@@ -408,9 +433,9 @@ class KuhnGameLobbyStage(object):
 # `KuhnGameRound` is a single round logic wrapper, see also `kuhn_game.py` and `KuhnGameLobbyStage`
 class KuhnGameRound(object):
 
-    def __init__(self, game_id, index, first_player, second_player, card_dealings):
+    def __init__(self, game_id, index, first_player, second_player, game_tree: KuhnRootChanceGameState, writer: KuhnGameWriter):
 
-        stage = KuhnGameLobbyStage(card_dealings)
+        stage = KuhnGameLobbyStage(game_tree)
 
         dbround = GameRound(
             game_id   = game_id,
@@ -419,10 +444,12 @@ class KuhnGameRound(object):
             index     = index,
             cards     = stage.cards()
         )
-        dbround.save()
+        # Round's id is generated on the client side, so the round is saved in background by the game writer
+        writer.create_round(dbround)
 
         self.id                = str(dbround.id)
         self.game_id           = game_id
+        self.writer            = writer
         self.stage             = stage
         self.started           = {}
         self.evaluation        = 0
@@ -431,7 +458,7 @@ class KuhnGameRound(object):
         self.player_token_turn = self.first_player
 
     def evaluate(self, evaluation):
-        GameRound.objects.filter(id = self.id).update(evaluation = evaluation, inf_set = self.stage.secret_inf_set())
+        self.writer.update_round(self.game_id, self.id, evaluation = evaluation, inf_set = self.stage.secret_inf_set())
         self.evaluation   = evaluation
         self.is_evaluated = True
 
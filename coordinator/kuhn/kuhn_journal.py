@@ -0,0 +1,285 @@
+import atexit
+import collections
+import glob
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from coordinator.kuhn.kuhn_constants import CARD4
+from coordinator.kuhn.kuhn_engine import KuhnEngine
+from coordinator.kuhn.kuhn_writer import KuhnGameWriter
+from coordinator.models import GameRound
+
+# Journal locks its segments with `flock`, which is not available on Windows (see `KuhnRoundJournal.is_supported`)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# `KuhnRoundJournal` is an optional alternative to `KuhnGameWriter` for rounds persistence (see `KUHN_ROUND_JOURNAL_FOLDER` setting)
+# Each finished round is appended to a journal file as a fixed-size binary record (see `KuhnRoundJournal.Record`):
+#   - round id, game id, first and second player tokens as raw UUIDs
+#   - round index, dealing and history codes (see `kuhn_engine.py`) and evaluation
+#   - CRC32 of the record, a torn record at the end of the file (e.g. after a crash) is detected and ignored
+# Records are buffered in memory and written with a single `fsync` every `fsync_interval` seconds (or on `flush`)
+# Journal is split into segments, a sealed segment is compacted into `GameRound` table by a background thread and is removed afterwards
+# Segments that were not compacted (e.g. server crashed) are replayed with `python manage.py recover_round_journal`
+# Game status updates are rare and are not journaled, they are passed to `KuhnGameWriter`
+# Game must never be finished in the database without its rounds, so when a game finishes its journaled rounds are passed to `KuhnGameWriter` too,
+# right before the status update, compaction of the same rounds later is a no-op (rounds are inserted with conflicts ignored)
+# Each journal process holds an exclusive lock on its `<node>.lock` file, so recovery never replays segments of a running server
+class KuhnRoundJournal(object):
+    _default      = None
+    _default_lock = threading.Lock()
+
+    Magic        = b'KUHNRJ01'
+    Record       = struct.Struct('<16s16s16s16sIBBbxI')
+    Extension    = '.journal'
+    NoHistory    = 255
+    NoEvaluation = -128
+
+    # History codes are the same for all game types and CARD4 dealings include all CARD3 dealings
+    Codec = KuhnEngine.get(CARD4)
+
+    def __init__(self, folder: str, fsync_interval: float, segment_size: int, segment_interval: float, game_writer: KuhnGameWriter):
+        self.folder           = folder
+        self.fsync_interval   = fsync_interval
+        self.segment_size     = segment_size
+        self.segment_interval = segment_interval
+        self.game_writer      = game_writer
+        self.node             = f'{ socket.gethostname() }-{ os.getpid() }'
+        self.lock             = threading.Condition()
+        self.buffer           = bytearray() # Encoded records which are not written yet, guarded by `self.lock`
+        self.pending          = {}          # Created but not yet evaluated rounds, guarded by `self.lock`
+        self.games            = {}          # Journaled rounds of running games by game id, guarded by `self.lock`
+        self.node_lock        = None
+        self.appended         = 0
+        self.synced           = 0
+        self.sync_requested   = False
+        self.segment          = None
+        self.segment_path     = None
+        self.segment_index    = 0
+        self.segment_records  = 0
+        self.segment_opened   = 0.0
+        self.sealed           = queue.Queue()
+        self.logger           = logging.getLogger('kuhn.game')
+        self.syncer           = threading.Thread(target = self.sync, name = 'kuhn-round-journal-sync')
+        self.syncer.daemon    = True
+        self.compactor        = threading.Thread(target = self.compact, name = 'kuhn-round-journal-compact')
+        self.compactor.daemon = True
+
+    # Games fall back to `KuhnGameWriter` if the journal is not supported
+    @staticmethod
+    def is_supported() -> bool:
+        return fcntl is not None
+
+    @staticmethod
+    def default() -> 'KuhnRoundJournal':
+        with KuhnRoundJournal._default_lock:
+            if KuhnRoundJournal._default is None:
+                KuhnRoundJournal._default = KuhnRoundJournal(
+                    folder           = settings.KUHN_ROUND_JOURNAL_FOLDER,
+                    fsync_interval   = settings.KUHN_ROUND_JOURNAL_FSYNC_INTERVAL,
+                    segment_size     = settings.KUHN_ROUND_JOURNAL_SEGMENT_SIZE,
+                    segment_interval = settings.KUHN_ROUND_JOURNAL_SEGMENT_INTERVAL,
+                    game_writer      = KuhnGameWriter.default()
+                )
+                KuhnRoundJournal._default.start()
+                atexit.register(KuhnRoundJournal._default.flush)
+            return KuhnRoundJournal._default
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok = True)
+        # Lock is released by the operating system when the process exits (or crashes)
+        self.node_lock = open(KuhnRoundJournal.node_lock_path(self.folder, self.node), 'w')
+        fcntl.flock(self.node_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.syncer.start()
+        self.compactor.start()
+
+    # Same interface as `KuhnGameWriter`, round is journaled only after it has been evaluated (or its game has finished)
+    def create_round(self, dbround: GameRound):
+        with self.lock:
+            self.pending[str(dbround.id)] = dbround
+
+    def update_round(self, game_id, round_id, **fields):
+        with self.lock:
+            dbround = self.pending.pop(str(round_id), None)
+            if dbround is None:
+                self.logger.warning(f'Round { round_id } has not been created or has already been journaled, update { fields } is ignored')
+                return
+            for field, value in fields.items():
+                setattr(dbround, field, value)
+            self.append(dbround)
+
+    def update_game(self, game_id, **fields):
+        if fields.get('is_finished', False):
+            with self.lock:
+                # Last round of a game is usually never played, but we keep it as it would be kept by `KuhnGameWriter`
+                for round_id in [ round_id for round_id, dbround in self.pending.items() if str(dbround.game_id) == str(game_id) ]:
+                    self.append(self.pending.pop(round_id))
+                rounds = self.games.pop(str(game_id), [])
+            # Game writer writes events in order, so rounds are in the database before (or together with) the finished game
+            for dbround in rounds:
+                self.game_writer.create_round(dbround)
+        self.game_writer.update_game(game_id, **fields)
+
+    # Waits until all previously journaled rounds are on disk and previous game updates (with rounds of finished games) are in the database
+    def flush(self, timeout: float = None, game_id = None) -> bool:
+        with self.lock:
+            target              = self.appended
+            self.sync_requested = True
+            self.lock.notify_all()
+            synced = self.lock.wait_for(lambda: self.synced >= target, timeout = timeout)
+        return self.game_writer.flush(timeout = timeout, game_id = game_id) and synced
+
+    # `append` is always called with `self.lock` being held
+    def append(self, dbround: GameRound):
+        self.buffer.extend(KuhnRoundJournal.encode(dbround))
+        self.games.setdefault(str(dbround.game_id), []).append(dbround)
+        self.appended = self.appended + 1
+
+    def sync(self):
+        while True:
+            with self.lock:
+                self.lock.wait_for(lambda: self.sync_requested, timeout = self.fsync_interval)
+                data, self.buffer   = self.buffer, bytearray()
+                target              = self.appended
+                self.sync_requested = False
+            try:
+                if len(data) != 0:
+                    self.write_segment(data)
+                if self.segment is not None and (self.segment_records >= self.segment_size or time.monotonic() - self.segment_opened >= self.segment_interval):
+                    self.seal_segment()
+            except Exception as e:
+                self.logger.error(f'Failed to write { len(data) // KuhnRoundJournal.Record.size } rounds to the round journal: { e }')
+            finally:
+                with self.lock:
+                    self.synced = target
+                    self.lock.notify_all()
+
+    def write_segment(self, data: bytes):
+        if self.segment is None:
+            self.segment_index  = self.segment_index + 1
+            self.segment_path   = os.path.join(self.folder, f'{ self.node }-{ self.segment_index:08d}{ KuhnRoundJournal.Extension }')
+            self.segment        = open(self.segment_path, 'ab')
+            self.segment_opened = time.monotonic()
+            self.segment.write(KuhnRoundJournal.Magic)
+        self.segment.write(data)
+        self.segment.flush()
+        os.fsync(self.segment.fileno())
+        self.segment_records = self.segment_records + len(data) // KuhnRoundJournal.Record.size
+
+    def seal_segment(self):
+        self.segment.close()
+        self.sealed.put(self.segment_path)
+        self.segment, self.segment_path, self.segment_records = None, None, 0
+
+    def compact(self):
+        while True:
+            path = self.sealed.get()
+            try:
+                rounds = KuhnRoundJournal.replay(path)
+                os.remove(path)
+                self.logger.debug(f'Round journal segment { path } with { len(rounds) } rounds has been compacted')
+            except Exception as e:
+                # Segment is kept on disk, it can be replayed later with `recover_round_journal` command
+                self.logger.error(f'Failed to compact round journal segment { path }: { e }')
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def encode(dbround: GameRound) -> bytes:
+        codec   = KuhnRoundJournal.Codec
+        history = KuhnRoundJournal.NoHistory
+        if dbround.inf_set is not None:
+            history = codec.encode_history([ action for action in dbround.inf_set.split('.')[2:] if action != '' ])
+        record = KuhnRoundJournal.Record.pack(
+            uuid.UUID(str(dbround.id)).bytes,
+            uuid.UUID(str(dbround.game_id)).bytes,
+            uuid.UUID(str(dbround.first_id)).bytes,
+            uuid.UUID(str(dbround.second_id)).bytes,
+            dbround.index,
+            codec.encode_dealing(dbround.cards),
+            history,
+            dbround.evaluation if dbround.evaluation is not None else KuhnRoundJournal.NoEvaluation,
+            0
+        )
+        return record[:-4] + struct.pack('<I', zlib.crc32(record[:-4]))
+
+    @staticmethod
+    def decode(record: bytes) -> GameRound:
+        codec = KuhnRoundJournal.Codec
+        round_id, game_id, first_id, second_id, index, dealing, history, evaluation, _ = KuhnRoundJournal.Record.unpack(record)
+        return GameRound(
+            id         = uuid.UUID(bytes = round_id),
+            game_id    = uuid.UUID(bytes = game_id),
+            first_id   = uuid.UUID(bytes = first_id),
+            second_id  = uuid.UUID(bytes = second_id),
+            index      = index,
+            cards      = codec.dealings[dealing],
+            inf_set    = codec.inf_set(dealing, history) if history != KuhnRoundJournal.NoHistory else None,
+            evaluation = evaluation if evaluation != KuhnRoundJournal.NoEvaluation else None
+        )
+
+    # Reads all valid records of a journal segment, later records of the same round override earlier ones
+    @staticmethod
+    def read(path: str) -> List[GameRound]:
+        with open(path, 'rb') as file:
+            data = file.read()
+        if not data.startswith(KuhnRoundJournal.Magic):
+            raise ValueError(f'{ path } is not a round journal segment')
+        size, rounds = KuhnRoundJournal.Record.size, collections.OrderedDict()
+        for offset in range(len(KuhnRoundJournal.Magic), len(data) - size + 1, size):
+            record = data[offset:offset + size]
+            if zlib.crc32(record[:-4]) != struct.unpack('<I', record[-4:])[0]:
+                logging.getLogger('kuhn.game').warning(f'Round journal segment { path } has a corrupted record at offset { offset }, the rest of the segment is ignored')
+                break
+            dbround = KuhnRoundJournal.decode(record)
+            rounds[dbround.id] = dbround
+        return list(rounds.values())
+
+    # Writes rounds of a journal segment into `GameRound` table and returns them, replaying the same segment twice is safe
+    # A round is journaled only once it is final, so rounds which are already in the database (e.g. written on game finish) are skipped
+    @staticmethod
+    def replay(path: str, batch_size: int = 500) -> List[GameRound]:
+        rounds = KuhnRoundJournal.read(path)
+        GameRound.objects.bulk_create(rounds, batch_size = batch_size, ignore_conflicts = True)
+        return rounds
+
+    @staticmethod
+    def segments(folder: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(folder, f'*{ KuhnRoundJournal.Extension }')), key = os.path.getmtime)
+
+    # Segments are named `<node>-<index>.journal`, where node is `<hostname>-<pid>` of the process which has written them
+    @staticmethod
+    def segment_node(path: str) -> str:
+        return os.path.basename(path)[:-len(KuhnRoundJournal.Extension)].rsplit('-', 1)[0]
+
+    @staticmethod
+    def node_lock_path(folder: str, node: str) -> str:
+        return os.path.join(folder, f'{ node }.lock')
+
+    # Node is alive if its process still holds the lock file, the check works for other hosts too if the folder is shared
+    @staticmethod
+    def is_node_alive(folder: str, node: str) -> bool:
+        path = KuhnRoundJournal.node_lock_path(folder, node)
+        if not os.path.exists(path):
+            return False
+        with open(path, 'a') as lock:
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+            return False
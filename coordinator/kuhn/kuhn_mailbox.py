@@ -0,0 +1,79 @@
+import collections
+import logging
+import queue
+import threading
+import time
+
+from coordinator.utilities.aio import AwaitableQueue
+
+# `KuhnPlayerMailbox` is a bounded channel of messages from a game coordinator to a single player
+# Producers (game, coordinator and waiting room threads) never wait for a consumer:
+#   - `post` puts a message without blocking and returns immediately
+#   - player's gRPC handler acknowledges each message with `ack` after it has been sent to the client
+# If a player does not read its messages and the mailbox overflows we call `on_overflow` (waiting room marks such player as disconnected),
+# so a single slow client cannot stall its opponent or the whole game thread
+# Time between `post` and `ack` is a delivery latency of a message, it is tracked for each mailbox and for the whole server (see `/api/message_delivery`)
+class KuhnPlayerMailbox(AwaitableQueue):
+    totals      = { 'delivered': 0, 'latency': 0.0, 'latency_max': 0.0, 'overflows': 0 }
+    totals_lock = threading.Lock()
+    logger      = logging.getLogger('kuhn.game')
+
+    def __init__(self, player_token: str, capacity: int, on_overflow = None):
+        super().__init__(maxsize = capacity)
+        self.player_token = player_token
+        self.on_overflow  = on_overflow
+        self.posted_at    = collections.deque() # Posting times of not yet acknowledged messages, guarded by `self.mutex`
+        self.delivered    = 0
+        self.latency      = 0.0 # Total delivery latency of all acknowledged messages, see `stats()`
+        self.latency_max  = 0.0
+        self.overflowed   = False
+
+    # `_put` is always called with `self.mutex` being held
+    def _put(self, item):
+        self.posted_at.append(time.perf_counter())
+        super()._put(item)
+
+    def post(self, message) -> bool:
+        try:
+            self.put_nowait(message)
+            return True
+        except queue.Full:
+            with self.mutex:
+                is_first_overflow = not self.overflowed
+                self.overflowed   = True
+            with KuhnPlayerMailbox.totals_lock:
+                KuhnPlayerMailbox.totals['overflows'] += 1
+            KuhnPlayerMailbox.logger.warning(f'Mailbox of the player { self.player_token } is full, message { message } has been dropped')
+            if is_first_overflow and self.on_overflow is not None:
+                self.on_overflow(self)
+            return False
+
+    def ack(self):
+        with self.mutex:
+            latency = time.perf_counter() - self.posted_at.popleft()
+            self.delivered   = self.delivered + 1
+            self.latency     = self.latency + latency
+            self.latency_max = max(self.latency_max, latency)
+        # `task_done` acquires `self.mutex` itself
+        self.task_done()
+        with KuhnPlayerMailbox.totals_lock:
+            KuhnPlayerMailbox.totals['delivered']  += 1
+            KuhnPlayerMailbox.totals['latency']    += latency
+            KuhnPlayerMailbox.totals['latency_max'] = max(KuhnPlayerMailbox.totals['latency_max'], latency)
+
+    def stats(self) -> dict:
+        with self.mutex:
+            return {
+                'delivered': self.delivered,
+                'pending': len(self.posted_at),
+                'latency_avg': self.latency / self.delivered if self.delivered != 0 else 0.0,
+                'latency_max': self.latency_max,
+                'overflowed': self.overflowed
+            }
+
+    @staticmethod
+    def get_totals() -> dict:
+        with KuhnPlayerMailbox.totals_lock:
+            totals = dict(KuhnPlayerMailbox.totals)
+        totals['latency_avg'] = totals['latency'] / totals['delivered'] if totals['delivered'] != 0 else 0.0
+        return totals
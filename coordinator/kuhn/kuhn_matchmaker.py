@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+from coordinator.utilities.aio import AwaitableEvent
+
+# `KuhnMatchmakingTicket` represents a single player waiting for an opponent in a random game
+class KuhnMatchmakingTicket(object):
+
+    def __init__(self, game_type: int, player_token: str):
+        self.game_type    = game_type
+        self.player_token = player_token
+        self.created_at   = time.perf_counter()
+        self.matched_at   = None
+        self.matched      = AwaitableEvent()
+        self.claimed      = False # Set once an opponent has picked this ticket from the queue
+        self.cancelled    = False
+        self.coordinator  = None
+        self.error        = None
+
+    def resolve(self, coordinator, error = None):
+        self.coordinator = coordinator
+        self.error       = error
+        self.matched_at  = time.perf_counter()
+        self.matched.set()
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.coordinator
+
+
+# `KuhnMatchmaker` pairs players for random games in memory, without touching the database
+# Each game type has its own FIFO queue of waiting players, pairing is O(1) and happens atomically under the matchmaker's lock
+# Second player in a pair creates a coordinator (this is the only place where database is involved) and hands it over to the first player
+class KuhnMatchmaker(object):
+
+    class MatchmakingTimeout(Exception):
+        pass
+
+    class MatchmakingCancelled(Exception):
+        pass
+
+    class PlayerDoubleMatchmaking(Exception):
+        pass
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.queues = collections.defaultdict(collections.deque)
+
+    def get_num_waiting_players(self, game_type: int) -> int:
+        with self.lock:
+            return sum(1 for ticket in self.queues[game_type] if not ticket.cancelled)
+
+    def enqueue(self, game_type: int, player_token: str):
+        with self.lock:
+            queue = self.queues[game_type]
+            while len(queue) != 0:
+                opponent = queue.popleft()
+                # Cancelled tickets are removed lazily
+                if opponent.cancelled:
+                    continue
+                if opponent.player_token == player_token:
+                    queue.appendleft(opponent)
+                    raise KuhnMatchmaker.PlayerDoubleMatchmaking('Player with the same id is already waiting for a random game')
+                opponent.claimed = True
+                ticket = KuhnMatchmakingTicket(game_type, player_token)
+                ticket.claimed = True
+                return ticket, opponent
+            ticket = KuhnMatchmakingTicket(game_type, player_token)
+            queue.append(ticket)
+            return ticket, None
+
+    def cancel(self, ticket: KuhnMatchmakingTicket) -> bool:
+        # Returns `False` if ticket has been already claimed by an opponent, in this case match will be resolved shortly
+        with self.lock:
+            if ticket.claimed:
+                return False
+            ticket.cancelled = True
+            return True
+
+    def form_match(self, ticket: KuhnMatchmakingTicket, opponent: KuhnMatchmakingTicket, create_coordinator):
+        try:
+            coordinator = create_coordinator()
+        except Exception as e:
+            opponent.resolve(None, error = e)
+            ticket.resolve(None, error = e)
+            raise
+        opponent.resolve(coordinator)
+        ticket.resolve(coordinator)
+        return coordinator
+
+    # `create_coordinator` is called only when a pair is formed, `is_active` is polled while waiting to detect disconnected players
+    def match(self, game_type: int, player_token: str, create_coordinator, timeout: float, is_active = None, poll_interval: float = 1.0):
+        ticket, opponent = self.enqueue(game_type, player_token)
+
+        if opponent is not None:
+            return self.form_match(ticket, opponent, create_coordinator)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            # Once the deadline has passed we may still wait for a claimed ticket to be resolved
+            if ticket.matched.wait(timeout = min(poll_interval, remaining) if remaining > 0 else poll_interval):
+                break
+            is_expired      = time.monotonic() >= deadline
+            is_disconnected = is_active is not None and not is_active()
+            if (is_expired or is_disconnected) and self.cancel(ticket):
+                if is_disconnected:
+                    raise KuhnMatchmaker.MatchmakingCancelled('Player disconnected while waiting for an opponent.')
+                raise KuhnMatchmaker.MatchmakingTimeout('Could not find an opponent for a random game.')
+
+        return ticket.result()
+
+    # Same as `match`, but waits for an opponent without blocking the event loop
+    # Client's disconnect cancels the awaiting task, in this case the ticket is cancelled as well
+    async def match_async(self, game_type: int, player_token: str, create_coordinator, timeout: float):
+        ticket, opponent = self.enqueue(game_type, player_token)
+
+        if opponent is not None:
+            return await sync_to_async(self.form_match, thread_sensitive = False)(ticket, opponent, create_coordinator)
+
+        try:
+            if not await ticket.matched.wait_async(timeout = timeout):
+                if self.cancel(ticket):
+                    raise KuhnMatchmaker.MatchmakingTimeout('Could not find an opponent for a random game.')
+                await ticket.matched.wait_async()
+        except asyncio.CancelledError:
+            self.cancel(ticket)
+            raise
+
+        return ticket.result()
@@ -18,7 +18,7 @@ class KuhnGameLobbyPlayerMessage(object):
 # `KuhnGameLobbyPlayer` is a simple wrapper around a player
 # `player_token` speaks for itself
 # `bank` current bank of the player
-# `channel` is a primary communication channel between lobby and the player
+# `channel` is a primary communication channel between lobby and the player, see `KuhnPlayerMailbox`
 class KuhnGameLobbyPlayer(object):
     logger = logging.getLogger('kuhn.game')
 
@@ -29,6 +29,6 @@ class KuhnGameLobbyPlayer(object):
 
     def send_message(self, message):
         KuhnGameLobbyPlayer.logger.debug(f'Sending message { message } to the player { self.player_token }')
-        self.channel.put(message)
-        self.channel.join()
+        # Message is acknowledged by player's gRPC handler later on, game does not wait for it
+        self.channel.post(message)
             
\ No newline at end of file
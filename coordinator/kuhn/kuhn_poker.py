@@ -1,4 +1,4 @@
-from coordinator.kuhn.kuhn_constants import CHECK, BET, CALL, FOLD, A, CHANCE, RESULTS_MAP
+from coordinator.kuhn.kuhn_constants import CARDS_DEALINGS, CHECK, BET, CALL, FOLD, A, CHANCE, RESULTS_MAP
 import random
 
 
@@ -23,12 +23,13 @@ class GameStateBase:
 class KuhnRootChanceGameState(GameStateBase):
 
     def __init__(self, actions):
-        super().__init__(parent = None, to_move = CHANCE, actions = actions)
+        super().__init__(parent = None, to_move = CHANCE, actions = tuple(actions))
         self.children = {
             cards: KuhnPlayerMoveGameState(
-                self, A, [], cards, [BET, CHECK]
+                self, A, (), cards, [BET, CHECK]
             ) for cards in self.actions
         }
+        self._children_list = tuple(self.children.values())
         self._chance_prob = 1. / len(self.children)
 
     # noinspection PyMethodMayBeStatic
@@ -42,13 +43,13 @@ class KuhnRootChanceGameState(GameStateBase):
         return self._chance_prob
 
     def sample_one(self):
-        return random.choice(list(self.children.values()))
+        return random.choice(self._children_list)
 
 
 class KuhnPlayerMoveGameState(GameStateBase):
 
     def __init__(self, parent, to_move, actions_history, cards, actions):
-        super().__init__(parent = parent, to_move = to_move, actions = actions)
+        super().__init__(parent = parent, to_move = to_move, actions = tuple(actions))
 
         self.actions_history = actions_history
         self.cards = cards
@@ -56,14 +57,20 @@ class KuhnPlayerMoveGameState(GameStateBase):
             a: KuhnPlayerMoveGameState(
                 self,
                 -to_move,
-                self.actions_history + [a],
+                self.actions_history + (a, ),
                 cards,
                 self.__get_actions_in_next_round(a)
             ) for a in self.actions
         }
 
         # public_card = self.cards[0] if self.to_move == A else self.cards[1]
+        # Nodes are shared between all rounds (see `get_kuhn_game_tree`), so everything a round may ask for is computed once here
         self._information_set = ".{0}.{1}".format(self.cards, ".".join(self.actions_history))
+        self._public_information_set = self._information_set[4:]
+        # Cards are revealed only in case if last action was CALL or both actions were CHECK
+        is_showdown = (len(self.actions_history) != 0 and self.actions_history[-1] == CALL) or (self.actions_history == (CHECK, CHECK))
+        self._showdown_information_set = ".{0}.{1}".format(self.cards if is_showdown else '??', ".".join(self.actions_history))
+        self._evaluation = self.__evaluate() if self.is_terminal() else None
 
     def __get_actions_in_next_round(self, a):
         if len(self.actions_history) == 0 and a == BET:
@@ -79,15 +86,20 @@ class KuhnPlayerMoveGameState(GameStateBase):
         return self._information_set
 
     def public_inf_set(self):
-        return self._information_set[4:]
+        return self._public_information_set
+
+    def showdown_inf_set(self):
+        return self._showdown_information_set
 
     def is_terminal(self):
-        return self.actions == []
+        return len(self.actions) == 0
 
     def evaluation(self):
         if not self.is_terminal():
             raise RuntimeError("trying to evaluate non-terminal node")
+        return self._evaluation
 
+    def __evaluate(self):
         if self.actions_history[-1] == CHECK and self.actions_history[-2] == CHECK:
             return RESULTS_MAP[self.cards] * 1  # only ante is won/lost
 
@@ -96,3 +108,13 @@ class KuhnPlayerMoveGameState(GameStateBase):
 
         if self.actions_history[-2] == BET and self.actions_history[-1] == FOLD:
             return self.to_move * 1
+
+
+# Kuhn game tree depends only on the game type, so it is built once per game type and is shared between all games and rounds
+# Trees must be treated as read-only, a round keeps only a reference to its current node (see `KuhnGameLobbyStage`)
+KUHN_GAME_TREES = {
+    game_type: KuhnRootChanceGameState(card_dealings) for game_type, card_dealings in CARDS_DEALINGS.items()
+}
+
+def get_kuhn_game_tree(game_type: int) -> KuhnRootChanceGameState:
+    return KUHN_GAME_TREES[game_type]
@@ -9,6 +9,7 @@ from django.db import transaction
 from django.db.models import F
 
 from coordinator.models import GameCoordinator, Player, RoomRegistration, WaitingRoom
+from coordinator.kuhn.kuhn_mailbox import KuhnPlayerMailbox
 
 # `KuhnWaitingRoom` is a simple abstraction around a set of registered players
 # In a normal game mode waiting room capacity is set to 2
@@ -52,7 +53,7 @@ class KuhnWaitingRoom(object):
         with self.lock: 
             return list(self.player_channels.keys())
 
-    def get_player_channel(self, player_token: str) -> queue.Queue:
+    def get_player_channel(self, player_token: str) -> KuhnPlayerMailbox:
         with self.lock:
             return self.player_channels[player_token]
 
@@ -71,8 +72,7 @@ class KuhnWaitingRoom(object):
         with self.lock:
             for player_token, player_channel in self.player_channels.items():
                 if not self.is_disconnected(player_token):
-                    player_channel.put(message)
-                    # player_channel.join()
+                    player_channel.post(message)
 
     def wait_ready(self) -> bool:
         return self.ready.wait(timeout = self.timeout)
@@ -103,6 +103,8 @@ class KuhnWaitingRoom(object):
                 WaitingRoom.objects.filter(id = self.id).update(closed = True, error = None if error is None else str(error))
                 self.closed = True
                 self.ready.set()
+                for player_token, player_channel in self.player_channels.items():
+                    self.logger.info(f'Message delivery stats for player { player_token } in waiting room { self.id }: { player_channel.stats() }')
 
     def is_disconnected(self, player_token: str) -> bool:
         with self.lock:
@@ -131,9 +133,10 @@ class KuhnWaitingRoom(object):
                 raise KuhnWaitingRoom.PlayerDoubleRegistration('Player with the same id has been already registered in this waiting room')
 
             # For each new registration we keep a record in the server's database for logging purposes
+            # Player has been resolved by gRPC service already, we do not need to fetch neither player nor room records again
             registration = RoomRegistration(
-                room = WaitingRoom.objects.get(id = self.id), 
-                player = Player.objects.get(token = player_token)
+                room_id   = self.id, 
+                player_id = player_token
             )
 
             with transaction.atomic():
@@ -141,7 +144,13 @@ class KuhnWaitingRoom(object):
                 registration.save()
 
             # For each player we create a separate channel for messages between game coordinator and player
-            self.player_channels[player_token] = queue.Queue()
+            # Channels are awaitable so `grpc.aio` handlers can wait on them without blocking the event loop
+            # Player who does not read its messages overflows its channel and is treated as disconnected
+            self.player_channels[player_token] = KuhnPlayerMailbox(
+                player_token = player_token, 
+                capacity     = settings.COORDINATOR_PLAYER_MAILBOX_CAPACITY, 
+                on_overflow  = lambda mailbox: self.mark_as_disconnected(mailbox.player_token)
+            )
             self.disconnected[player_token] = False
 
             self.logger.info(f'Player { player_token } has been registered in the waiting room { self.id }')
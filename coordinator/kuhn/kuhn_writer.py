@@ -0,0 +1,194 @@
+import atexit
+import collections
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from coordinator.models import Game, GameRound
+
+# `KuhnGameWriter` persists game rounds (and game status updates) in background, so the game thread does not wait for the database between moves
+# Game thread only enqueues events, a single writer thread drains the queue and writes events in batches:
+#   - new rounds are inserted with `bulk_create`
+#   - round updates are merged into not yet inserted rounds or written with `bulk_update`
+#   - game updates are merged per game and written with one `update` per game
+# A batch is written as soon as it has `batch_size` events or `flush_interval` seconds after its first event, whichever comes first
+# A failed batch is retried `retries` times, after that it is written game by game and event by event, so a bad event loses only itself
+# and results of other games in the same batch are still written
+# `flush` blocks until all previously enqueued events have been written, games call it on finish, the default writer also flushes on shutdown
+# `flush` returns `False` if some events (of the given game or, without a game, of any game) could not be written
+class KuhnGameWriter(object):
+    _default      = None
+    _default_lock = threading.Lock()
+
+    class FlushRequest(object):
+
+        def __init__(self, game_id):
+            self.game_id = game_id
+            self.done    = threading.Event()
+            self.ok      = False
+
+    def __init__(self, batch_size: int, flush_interval: float, retries: int, retry_delay: float):
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.retries        = retries
+        self.retry_delay    = retry_delay
+        self.events         = queue.Queue()
+        self.failed_games   = set() # Games with events that could not be written, used only by the writer thread
+        self.failed_events  = 0
+        self.logger         = logging.getLogger('kuhn.game')
+        self.writer         = threading.Thread(target = self.write, name = 'kuhn-game-writer')
+        self.writer.daemon  = True
+
+    @staticmethod
+    def default() -> 'KuhnGameWriter':
+        with KuhnGameWriter._default_lock:
+            if KuhnGameWriter._default is None:
+                KuhnGameWriter._default = KuhnGameWriter(
+                    batch_size     = settings.KUHN_WRITER_BATCH_SIZE,
+                    flush_interval = settings.KUHN_WRITER_FLUSH_INTERVAL,
+                    retries        = settings.KUHN_WRITER_RETRIES,
+                    retry_delay    = settings.KUHN_WRITER_RETRY_DELAY
+                )
+                KuhnGameWriter._default.start()
+                # Writer thread is a daemon thread, we do not want to lose pending events on server shutdown
+                atexit.register(KuhnGameWriter._default.flush)
+            return KuhnGameWriter._default
+
+    # Server is usually stopped with SIGTERM (e.g. `docker stop`), in this case `atexit` handlers are not called
+    # We flush the default writer (if it has been created) and terminate the process as usual afterwards
+    # Signal handlers can be installed only from the main thread
+    @staticmethod
+    def install_shutdown_handler():
+        if threading.current_thread() is not threading.main_thread() or signal.getsignal(signal.SIGTERM) != signal.SIG_DFL:
+            return
+
+        def __on_sigterm(signum, frame):
+            # Round journal flushes the game writer as well
+            from coordinator.kuhn.kuhn_journal import KuhnRoundJournal
+            if KuhnRoundJournal._default is not None:
+                KuhnRoundJournal._default.flush(timeout = settings.KUHN_WRITER_SHUTDOWN_TIMEOUT)
+            elif KuhnGameWriter._default is not None:
+                KuhnGameWriter._default.flush(timeout = settings.KUHN_WRITER_SHUTDOWN_TIMEOUT)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, __on_sigterm)
+
+    def start(self):
+        self.writer.start()
+
+    # Each event is `(kind, game id, key, data)`, game id is used to isolate failed events and to report them in `flush`
+    def create_round(self, dbround: GameRound):
+        self.events.put(('create_round', str(dbround.game_id), str(dbround.id), dbround))
+
+    def update_round(self, game_id, round_id, **fields):
+        self.events.put(('update_round', str(game_id), str(round_id), fields))
+
+    def update_game(self, game_id, **fields):
+        self.events.put(('update_game', str(game_id), str(game_id), fields))
+
+    # Returns `True` only if all previously enqueued events (of `game_id` if it is specified) have been written in time
+    def flush(self, timeout: float = None, game_id = None) -> bool:
+        request = KuhnGameWriter.FlushRequest(str(game_id) if game_id is not None else None)
+        self.events.put(request)
+        return request.done.wait(timeout = timeout) and request.ok
+
+    def write(self):
+        while True:
+            batch    = [ self.events.get() ]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1], KuhnGameWriter.FlushRequest):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.events.get(timeout = remaining))
+                except queue.Empty:
+                    break
+            events   = [ event for event in batch if not isinstance(event, KuhnGameWriter.FlushRequest) ]
+            requests = [ event for event in batch if isinstance(event, KuhnGameWriter.FlushRequest) ]
+            try:
+                if len(events) != 0:
+                    self.write_events(events)
+            finally:
+                close_old_connections()
+                for request in requests:
+                    if request.game_id is None:
+                        request.ok = self.failed_events == 0
+                    else:
+                        # Game does not write anything after its final flush, so it is not tracked anymore
+                        request.ok = request.game_id not in self.failed_games
+                        self.failed_games.discard(request.game_id)
+                    request.done.set()
+
+    # Retries a failed batch first (e.g. the database is restarting), then isolates failed events by writing them game by game and one by one
+    def write_events(self, events):
+        if self.try_write_batch(events, retries = self.retries):
+            return
+
+        self.logger.warning(f'Failed to write a batch of { len(events) } game events, writing them game by game')
+        events_by_game = collections.OrderedDict()
+        for event in events:
+            events_by_game.setdefault(event[1], []).append(event)
+
+        for game_id, game_events in events_by_game.items():
+            if self.try_write_batch(game_events, retries = 0):
+                continue
+            for event in game_events:
+                if not self.try_write_batch([ event ], retries = 0):
+                    kind, _, key, data = event
+                    self.logger.error(f'Game event { kind } of { key } (game { game_id }) could not be written and is lost: { data }')
+                    self.failed_games.add(game_id)
+                    self.failed_events = self.failed_events + 1
+
+    def try_write_batch(self, events, retries: int) -> bool:
+        for attempt in range(retries + 1):
+            try:
+                self.write_batch(events)
+                return True
+            except Exception as e:
+                self.logger.error(f'Failed to write { len(events) } game events (attempt { attempt + 1 } of { retries + 1 }): { e }')
+                # Broken database connection is replaced with a new one on the next attempt
+                close_old_connections()
+                if attempt != retries:
+                    time.sleep(self.retry_delay)
+        return False
+
+    def write_batch(self, events):
+        rounds_to_create = collections.OrderedDict()
+        rounds_to_update = collections.OrderedDict()
+        games_to_update  = collections.OrderedDict()
+
+        for kind, _, key, data in events:
+            if kind == 'create_round':
+                rounds_to_create[key] = data
+            elif kind == 'update_round' and key in rounds_to_create:
+                # Round has not been inserted yet, so we insert it with updated fields right away
+                for field, value in data.items():
+                    setattr(rounds_to_create[key], field, value)
+            elif kind == 'update_round':
+                rounds_to_update.setdefault(key, {}).update(data)
+            elif kind == 'update_game':
+                games_to_update.setdefault(key, {}).update(data)
+
+        # `bulk_update` updates the same set of fields for all objects, so we group round updates by their fields
+        round_updates_by_fields = collections.defaultdict(list)
+        for round_id, fields in rounds_to_update.items():
+            round_updates_by_fields[tuple(sorted(fields.keys()))].append(GameRound(id = round_id, **fields))
+
+        with transaction.atomic():
+            if len(rounds_to_create) != 0:
+                # Rounds of journaled games may have been compacted into the database already (see `KuhnRoundJournal.update_game`)
+                GameRound.objects.bulk_create(list(rounds_to_create.values()), batch_size = self.batch_size, ignore_conflicts = True)
+            for fields, rounds in round_updates_by_fields.items():
+                GameRound.objects.bulk_update(rounds, list(fields), batch_size = self.batch_size)
+            for game_id, fields in games_to_update.items():
+                Game.objects.filter(id = game_id).update(**fields)
+
+        self.logger.debug(f'Game writer has written { len(rounds_to_create) } new rounds, { len(rounds_to_update) } round updates and { len(games_to_update) } game updates')
@@ -0,0 +1,105 @@
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+
+from typing import List
+
+from django.conf import settings
+
+# `KuhnBotZygote` starts out-of-process bots without a cold interpreter startup
+# A zygote process (see `coordinator/utilities/zygote.py`) imports bot's `main.py` once and keeps a warm pool of forked children,
+# each `spawn` hands command line arguments to a ready child and waits for it to exit, exactly like `subprocess.run` of `python main.py` did
+# There is one zygote per bot executable, zygotes require `os.fork` and are not available on Windows
+class KuhnBotZygote(object):
+    _zygotes      = {}
+    _zygotes_lock = threading.Lock()
+
+    ZygoteScript = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utilities', 'zygote.py')
+
+    class Request(object):
+
+        def __init__(self):
+            self.started    = threading.Event()
+            self.finished   = threading.Event()
+            self.pid        = None
+            self.returncode = None
+
+    def __init__(self, bot_exec: str, pool_size: int):
+        self.bot_exec  = bot_exec
+        self.pool_size = pool_size
+        self.lock      = threading.Lock()
+        self.requests  = {} # Request id -> `KuhnBotZygote.Request`, guarded by `self.lock`
+        self.counter   = itertools.count()
+        self.logger    = logging.getLogger('kuhn.coordinator')
+        self.process   = subprocess.Popen(
+            [ sys.executable, KuhnBotZygote.ZygoteScript, bot_exec, str(pool_size) ],
+            stdin  = subprocess.PIPE,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.DEVNULL
+        )
+        self.reader        = threading.Thread(target = self.read, name = f'kuhn-bot-zygote-{ self.process.pid }')
+        self.reader.daemon = True
+        self.reader.start()
+        self.logger.info(f'Bot zygote { self.process.pid } for { bot_exec } has been started with a warm pool of { pool_size } children')
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(os, 'fork') and settings.KUHN_BOT_ZYGOTE_POOL_SIZE > 0
+
+    @staticmethod
+    def get(bot_exec: str) -> 'KuhnBotZygote':
+        with KuhnBotZygote._zygotes_lock:
+            zygote = KuhnBotZygote._zygotes.get(bot_exec, None)
+            # Zygote is restarted if it has died for some reason
+            if zygote is None or not zygote.is_alive():
+                zygote = KuhnBotZygote(bot_exec, settings.KUHN_BOT_ZYGOTE_POOL_SIZE)
+                KuhnBotZygote._zygotes[bot_exec] = zygote
+            return zygote
+
+    # Starts zygotes of all given bots in advance, so the first bot does not wait for zygote's own startup
+    @staticmethod
+    def prestart(bot_execs: List[str]):
+        for bot_exec in bot_execs:
+            KuhnBotZygote.get(bot_exec)
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def read(self):
+        for line in self.process.stdout:
+            message = json.loads(line)
+            with self.lock:
+                request = self.requests.get(message['id'], None)
+                if request is not None and 'returncode' in message:
+                    del self.requests[message['id']]
+            if request is None:
+                continue
+            if 'pid' in message:
+                request.pid = message['pid']
+                request.started.set()
+            if 'returncode' in message:
+                request.returncode = message['returncode']
+                request.finished.set()
+        # Zygote has exited, nobody is going to report results of the remaining requests
+        with self.lock:
+            requests, self.requests = list(self.requests.values()), {}
+        for request in requests:
+            request.started.set()
+            request.finished.set()
+
+    # Runs bot's `main.py` with `argv` in a forked child and returns its exit code
+    # Child's stdout and stderr are written into a FIFO at `output` (if any), see `KuhnBotOutput`
+    def spawn(self, argv: List[str], output: str = None) -> int:
+        request_id, request = next(self.counter), KuhnBotZygote.Request()
+        with self.lock:
+            self.requests[request_id] = request
+            self.process.stdin.write((json.dumps({ 'id': request_id, 'argv': argv, 'output': output }) + '\n').encode())
+            self.process.stdin.flush()
+        request.finished.wait()
+        if request.returncode is None:
+            raise Exception(f'Bot zygote for { self.bot_exec } has exited unexpectedly')
+        return request.returncode
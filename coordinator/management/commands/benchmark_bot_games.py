@@ -0,0 +1,66 @@
+import statistics
+import threading
+import time
+
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from coordinator.kuhn.kuhn_bot import KuhnBotAgent, KuhnBotRunner
+from coordinator.kuhn.kuhn_constants import CARD3
+from coordinator.kuhn.kuhn_coordinator import KuhnCoordinator
+from coordinator.kuhn.kuhn_zygote import KuhnBotZygote
+from coordinator.models import GameCoordinatorTypes, Player
+from coordinator.services import GameCoordinatorService
+
+class Command(BaseCommand):
+    help = "Plays a series of duels against server bots and measures bot time-to-connect and games/sec for in-process and subprocess bots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type = int, default = 20, help = 'Number of duels to play in each mode')
+        parser.add_argument('--subprocess', action = 'store_true', help = 'Also measure out-of-process bots (zygote and cold start), requires gRPC server of this process to be reachable by bots')
+
+    def play(self, num_games: int, player: Player, bot: KuhnBotAgent):
+        connect, start = [], time.perf_counter()
+        for _ in range(num_games):
+            created     = time.perf_counter()
+            coordinator = GameCoordinatorService.add_coordinator(KuhnCoordinator(
+                coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_BOT,
+                game_type        = CARD3,
+                capacity         = 2,
+                timeout          = settings.COORDINATOR_CONNECTION_TIMEOUT,
+                is_private       = True
+            ))
+            # Our player plays in-process as well, so only bot's startup differs between the modes
+            runner = threading.Thread(target = KuhnBotRunner(coordinator, str(player.token), bot).play)
+            runner.start()
+            coordinator.wait_ready()
+            connect.append(time.perf_counter() - created)
+            runner.join()
+            if coordinator.error is not None:
+                raise CommandError(f'Duel { coordinator.id } failed: { coordinator.error }')
+        elapsed = time.perf_counter() - start
+        return num_games / elapsed, statistics.mean(connect)
+
+    def handle(self, *args, **options):
+        num_games = options['games']
+        player    = Player.objects.filter(is_test = True, is_disabled = False).first()
+        bots      = KuhnBotAgent.load_all(settings.KUHN_BOT_FOLDER)
+
+        if player is None or len(bots) == 0:
+            raise CommandError('Benchmark requires at least one test player (see `GENERATE_TEST_PLAYERS`) and one bot in `KUHN_BOT_FOLDER`')
+
+        modes = [ ('In-process', { 'KUHN_BOTS_IN_PROCESS': True }) ]
+        if options['subprocess']:
+            modes.append(('Zygote', { 'KUHN_BOTS_IN_PROCESS': False }))
+            modes.append(('Cold start', { 'KUHN_BOTS_IN_PROCESS': False, 'KUHN_BOT_ZYGOTE_POOL_SIZE': 0 }))
+
+        for name, overrides in modes:
+            with override_settings(**overrides), mock.patch.object(KuhnCoordinator, 'LobbyAgents', bots):
+                # Zygotes are started by the server in advance, their own startup is not a part of time-to-connect
+                if not settings.KUHN_BOTS_IN_PROCESS and KuhnBotZygote.is_supported():
+                    KuhnBotZygote.prestart(KuhnCoordinator.LobbyBots)
+                rate, connect = self.play(num_games, player, bots[0])
+            self.stdout.write(f'{ name } bots: { rate:.2f} games/s, { connect * 1000:.1f} ms mean time-to-connect')
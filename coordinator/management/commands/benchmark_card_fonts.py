@@ -0,0 +1,56 @@
+import subprocess
+import sys
+import tempfile
+import time
+import os
+
+from PIL import ImageFont
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from coordinator.utilities.card import Card
+from coordinator.utilities.fonts import get_font
+
+# Startup time is measured in a fresh interpreter, otherwise matplotlib would have been already imported
+STARTUP_SNIPPET = '''
+import sys, time
+start = time.perf_counter()
+from coordinator.utilities.fonts import resolve_font_paths
+resolve_font_paths(cache_path = sys.argv[1], use_cache = sys.argv[2] == "1")
+print(time.perf_counter() - start)
+'''
+
+class Command(BaseCommand):
+    help = "Measures font resolution time at startup (with and without fonts cache) and per-image time of `Card.get_image`"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type = int, default = 1000, help = 'Number of images to generate')
+
+    def startup_time(self, cache_path, use_cache) -> float:
+        output = subprocess.run([ sys.executable, '-c', STARTUP_SNIPPET, cache_path, '1' if use_cache else '0' ], cwd = str(settings.BASE_DIR), check = True, capture_output = True, text = True)
+        return float(output.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        count = options['count']
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, 'card-fonts.json')
+            self.stdout.write(f'Startup, fonts resolved with matplotlib: { self.startup_time(cache_path, use_cache = False) * 1000:.1f} ms')
+            self.stdout.write(f'Startup, fonts loaded from cache: { self.startup_time(cache_path, use_cache = True) * 1000:.1f} ms')
+
+        size = Card.IMG_SIZE - 6
+
+        start = time.perf_counter()
+        for i in range(count):
+            ImageFont.truetype(Card.FONTS[i % len(Card.FONTS)], size = size)
+        self.stdout.write(f'Font loading, `ImageFont.truetype` on each call: { (time.perf_counter() - start) / count * 1e6:.1f} us/font')
+
+        start = time.perf_counter()
+        for i in range(count):
+            get_font(Card.FONTS[i % len(Card.FONTS)], size)
+        self.stdout.write(f'Font loading, cached `get_font`: { (time.perf_counter() - start) / count * 1e6:.1f} us/font')
+
+        start = time.perf_counter()
+        for i in range(count):
+            Card('K').get_image()
+        self.stdout.write(f'Card.get_image with cached fonts: { (time.perf_counter() - start) / count * 1e6:.1f} us/image')
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from coordinator.kuhn.kuhn_constants import POSSIBLE_CARDS, CARD4
+from coordinator.utilities.card import Card
+
+class Command(BaseCommand):
+    help = "Measures card image generation throughput (images/sec) of `Card.get_image` and `Card.get_image_bytes`"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type = int, default = 2000, help = 'Number of images to generate with each generator')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        ranks = POSSIBLE_CARDS[CARD4]
+
+        generators = [
+            ('PIL (get_image)', lambda rank: Card(rank).get_image().tobytes('raw')),
+            ('NumPy (get_image_bytes)', lambda rank: Card(rank).get_image_bytes()),
+        ]
+
+        # Warm up, e.g. glyph cache of `get_image_bytes`
+        for _, generator in generators:
+            for rank in ranks:
+                generator(rank)
+
+        for name, generator in generators:
+            images = []
+            start  = time.perf_counter()
+            for i in range(count):
+                images.append(generator(ranks[i % len(ranks)]))
+            elapsed = time.perf_counter() - start
+
+            # Simple statistics of generated images to check that both generators produce similar outputs
+            pixels = np.frombuffer(b''.join(images), dtype = np.uint8)
+            self.stdout.write(
+                f'{ name }: { count / elapsed:.1f} images/sec, '
+                f'mean intensity = { pixels.mean():.2f}, std = { pixels.std():.2f}, '
+                f'dark pixels = { np.count_nonzero(pixels < 128) / pixels.size:.4f}'
+            )
@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from coordinator.kuhn.kuhn_coordinator import KuhnCoordinatorStates
+from coordinator.kuhn.kuhn_coordinator_registry import KuhnCoordinatorRegistry
+from coordinator.models import GameCoordinatorTypes
+
+# Coordinators are not created in this benchmark, stub objects implement only what the registry needs
+class RegistryStubCoordinator(object):
+
+    def __init__(self, coordinator_type):
+        self.id               = str(uuid.uuid4())
+        self.lock             = threading.RLock()
+        self.coordinator_type = coordinator_type
+        self.state_listeners  = []
+
+    def get_state(self):
+        return KuhnCoordinatorStates.Waiting
+
+# Previous implementation: one dict guarded by one lock, lookups were performed under the same lock as a database query
+class LockedDictRegistry(object):
+
+    def __init__(self):
+        self.coordinators = {}
+        self.lock         = threading.RLock()
+
+    def get(self, coordinator_id, query_delay):
+        with self.lock:
+            time.sleep(query_delay)
+            return self.coordinators.get(coordinator_id)
+
+    def add(self, coordinator):
+        with self.lock:
+            self.coordinators[coordinator.id] = coordinator
+
+    def remove(self, coordinator):
+        with self.lock:
+            self.coordinators.pop(coordinator.id, None)
+
+class ShardedRegistry(object):
+
+    def __init__(self, num_shards):
+        self.registry = KuhnCoordinatorRegistry(num_shards = num_shards)
+
+    def get(self, coordinator_id, query_delay):
+        coordinator = self.registry.get(coordinator_id)
+        # Database is queried only if the coordinator has not been found, in the benchmark all coordinators exist
+        if coordinator is None:
+            time.sleep(query_delay)
+        return coordinator
+
+    def add(self, coordinator):
+        self.registry.add(coordinator)
+
+    def remove(self, coordinator):
+        self.registry.remove(coordinator)
+
+class Command(BaseCommand):
+    help = "Simulates hundreds of concurrent connect attempts by coordinator id while other threads add and remove coordinators, reports lookup latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type = int, default = 500, help = 'Number of concurrent connecting threads')
+        parser.add_argument('--lookups', type = int, default = 20, help = 'Number of lookups per connecting thread')
+        parser.add_argument('--writers', type = int, default = 16, help = 'Number of threads adding and removing coordinators')
+        parser.add_argument('--coordinators', type = int, default = 1000, help = 'Number of initially registered coordinators')
+        parser.add_argument('--query-delay', type = float, default = 0.0002, help = 'Simulated database query time (in seconds) of a lookup')
+        parser.add_argument('--shards', type = int, default = 16, help = 'Number of shards in the sharded registry')
+
+    def run(self, registry, options):
+        coordinators = [ RegistryStubCoordinator(GameCoordinatorTypes.DUEL_PLAYER_PLAYER) for _ in range(options['coordinators']) ]
+        for coordinator in coordinators:
+            registry.add(coordinator)
+
+        ids       = [ coordinator.id for coordinator in coordinators ]
+        latencies = []
+        stopped   = threading.Event()
+        barrier   = threading.Barrier(options['connections'] + options['writers'])
+
+        def connect(seed):
+            generator = np.random.default_rng(seed)
+            local     = []
+            barrier.wait()
+            for index in generator.integers(len(ids), size = options['lookups']):
+                start = time.perf_counter()
+                registry.get(ids[index], options['query_delay'])
+                local.append(time.perf_counter() - start)
+            latencies.extend(local)
+
+        def write():
+            barrier.wait()
+            while not stopped.is_set():
+                coordinator = RegistryStubCoordinator(GameCoordinatorTypes.DUEL_PLAYER_PLAYER)
+                registry.add(coordinator)
+                time.sleep(0.001)
+                registry.remove(coordinator)
+
+        readers = [ threading.Thread(target = connect, args = (seed, )) for seed in range(options['connections']) ]
+        writers = [ threading.Thread(target = write) for _ in range(options['writers']) ]
+
+        start = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stopped.set()
+        for thread in writers:
+            thread.join()
+
+        return np.array(latencies) * 1000, elapsed
+
+    def handle(self, *args, **options):
+        for name, registry in [ ('Single lock dict', LockedDictRegistry()), (f'Sharded registry ({ options["shards"] } shards)', ShardedRegistry(options['shards'])) ]:
+            latencies, elapsed = self.run(registry, options)
+            self.stdout.write(
+                f'{ name }: { len(latencies) } lookups in { elapsed * 1000:.0f} ms, latency p50 { np.percentile(latencies, 50):.3f} ms, p99 { np.percentile(latencies, 99):.3f} ms, max { latencies.max():.3f} ms'
+            )
+
+        registry = KuhnCoordinatorRegistry(num_shards = options['shards'])
+        for _ in range(options['coordinators']):
+            registry.add(RegistryStubCoordinator(GameCoordinatorTypes.DUEL_PLAYER_PLAYER))
+        start = time.perf_counter()
+        for _ in range(10000):
+            registry.count(GameCoordinatorTypes.DUEL_PLAYER_PLAYER, KuhnCoordinatorStates.Waiting)
+        self.stdout.write(f'Registry.count with { len(registry) } coordinators: { (time.perf_counter() - start) / 10000 * 1e6:.2f} us/call')
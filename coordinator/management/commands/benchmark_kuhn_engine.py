@@ -0,0 +1,72 @@
+import random
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coordinator.kuhn.kuhn_constants import CARD3, CARD4
+from coordinator.kuhn.kuhn_engine import HISTORY_ROOT, LEGAL_ACTIONS_LIST, KuhnEngine
+from coordinator.kuhn.kuhn_poker import get_kuhn_game_tree
+
+class Command(BaseCommand):
+    help = "Checks that `KuhnEngine` agrees with the game tree from `kuhn_poker.py` and compares their random play simulation throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type = int, default = 1000000, help = 'Number of simulated rounds')
+        parser.add_argument('--game-type', type = int, default = CARD3, choices = [ CARD3, CARD4 ], help = 'Game type')
+
+    def verify(self, engine: KuhnEngine, game_type: int) -> int:
+        checked = 0
+        nodes   = [ (engine.encode_dealing(cards), HISTORY_ROOT, node) for cards, node in get_kuhn_game_tree(game_type).children.items() ]
+        while len(nodes) != 0:
+            dealing, history, node = nodes.pop()
+            if engine.decode_actions(engine.legal_actions(history)) != sorted(node.actions, key = engine.encode_action):
+                raise CommandError(f'Legal actions mismatch at { node.inf_set() }')
+            if engine.inf_set(dealing, history) != node.inf_set() or engine.public_inf_set(history) != node.public_inf_set() or engine.showdown_inf_set(dealing, history) != node.showdown_inf_set():
+                raise CommandError(f'Info set mismatch at { node.inf_set() }')
+            if engine.is_terminal(history) != node.is_terminal():
+                raise CommandError(f'Terminal state mismatch at { node.inf_set() }')
+            if node.is_terminal() and engine.payoff(dealing, history) != node.evaluation():
+                raise CommandError(f'Payoff mismatch at { node.inf_set() }: { engine.payoff(dealing, history) } != { node.evaluation() }')
+            for action, child in node.children.items():
+                nodes.append((dealing, engine.play(history, engine.encode_action(action)), child))
+            checked = checked + 1
+        return checked
+
+    def handle(self, *args, **options):
+        num_rounds = options['rounds']
+        game_type  = options['game_type']
+        engine     = KuhnEngine.get(game_type)
+        tree       = get_kuhn_game_tree(game_type)
+
+        self.stdout.write(f'Engine agrees with the game tree in all { self.verify(engine, game_type) } states')
+
+        num_tree_rounds = max(1, num_rounds // 20)
+        chooser = random.Random(42)
+        total   = 0
+        start   = time.perf_counter()
+        for _ in range(num_tree_rounds):
+            node = tree.sample_one()
+            while not node.is_terminal():
+                node = node.play(chooser.choice(node.actions))
+            total = total + node.evaluation()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Game tree, one round at a time: { num_tree_rounds / elapsed:.0f} rounds/s (mean payoff { total / num_tree_rounds:+.4f})')
+
+        total = 0
+        start = time.perf_counter()
+        for _ in range(num_tree_rounds):
+            dealing, history = engine.deal(chooser), HISTORY_ROOT
+            while not engine.is_terminal(history):
+                history = engine.play(history, LEGAL_ACTIONS_LIST[history][chooser.randrange(2)])
+            total = total + engine.payoff(dealing, history)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Engine, one round at a time: { num_tree_rounds / elapsed:.0f} rounds/s (mean payoff { total / num_tree_rounds:+.4f})')
+
+        generator = np.random.default_rng(42)
+        start     = time.perf_counter()
+        dealings, histories = engine.simulate(num_rounds, generator)
+        payoffs = engine.evaluate(dealings, histories)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Engine, vectorized: { num_rounds / elapsed:.0f} rounds/s (mean payoff { payoffs.mean():+.4f})')
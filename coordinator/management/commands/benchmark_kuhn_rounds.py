@@ -0,0 +1,118 @@
+import logging
+import random
+import time
+import tracemalloc
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from coordinator.kuhn.kuhn_constants import CARD3, CARD4
+from coordinator.kuhn.kuhn_game import KuhnGame
+from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayer
+from coordinator.kuhn.kuhn_poker import KuhnRootChanceGameState
+from coordinator.kuhn.kuhn_writer import KuhnGameWriter
+from coordinator.models import Game, GameRound
+
+# Database is stubbed out in this benchmark, games and rounds are neither saved nor updated
+class StubQuerySet(object):
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def update(self, *args, **kwargs):
+        return 0
+
+class StubWriter(object):
+
+    def create_round(self, dbround):
+        pass
+
+    def update_round(self, game_id, round_id, **fields):
+        pass
+
+    def update_game(self, game_id, **fields):
+        pass
+
+    def flush(self, timeout = None, game_id = None):
+        return True
+
+class StubWaitingRoom(object):
+
+    def is_disconnected(self, player_token):
+        return False
+
+class StubCoordinator(object):
+
+    def __init__(self):
+        self.id           = 'benchmark'
+        self.waiting_room = StubWaitingRoom()
+
+class Command(BaseCommand):
+    help = "Measures rounds/sec of `KuhnGame` (round creation, actions and evaluation) with the database stubbed out"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type = int, default = 100000, help = 'Number of rounds to play')
+        parser.add_argument('--game-type', type = int, default = CARD3, choices = [ CARD3, CARD4 ], help = 'Game type')
+
+    def play(self, num_rounds, game_type):
+        player1 = KuhnGameLobbyPlayer('player1', KuhnGame.InitialBank, None)
+        player2 = KuhnGameLobbyPlayer('player2', KuhnGame.InitialBank, None)
+        game    = KuhnGame(StubCoordinator(), player1, player2, game_type, None)
+        chooser = random.Random(42)
+
+        for _ in range(num_rounds):
+            current_round = game.create_new_round()
+            current_round.stage.public_inf_set()
+            while not current_round.stage.is_terminal():
+                current_round.stage.play(chooser.choice(current_round.stage.actions()))
+                current_round.stage.public_inf_set()
+            game.evaluate_round()
+            current_round.stage.inf_set()
+            # Game never ends in this benchmark
+            if not game.check_players_bank():
+                player1.bank, player2.bank = KuhnGame.InitialBank, KuhnGame.InitialBank
+
+        return game
+
+    def measure(self, num_rounds, game_type):
+        start = time.perf_counter()
+        self.play(num_rounds, game_type)
+        elapsed = time.perf_counter() - start
+
+        # Memory is measured separately, tracing slows down the game considerably
+        tracemalloc.start()
+        game = self.play(num_rounds, game_type)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del game
+
+        return num_rounds / elapsed, memory / num_rounds
+
+    def handle(self, *args, **options):
+        num_rounds = options['rounds']
+        game_type  = options['game_type']
+
+        stubs = [
+            mock.patch.object(Game, 'save', lambda self, *args, **kwargs: None),
+            mock.patch.object(GameRound, 'save', lambda self, *args, **kwargs: None),
+            mock.patch.object(Game, 'objects', StubQuerySet()),
+            mock.patch.object(GameRound, 'objects', StubQuerySet()),
+            mock.patch.object(KuhnGameWriter, 'default', lambda: StubWriter()),
+        ]
+
+        # Game logs every round, we measure the game logic and not the logging
+        logging.getLogger('kuhn.game').disabled = True
+
+        for stub in stubs:
+            stub.start()
+        try:
+            # Previous behaviour: a full game tree is built for every round and is kept alive by the round
+            with mock.patch.object(KuhnGame, 'get_game_tree', lambda game: KuhnRootChanceGameState(game.get_card_dealings())):
+                rate, memory = self.measure(num_rounds // 10, game_type)
+                self.stdout.write(f'Game tree per round: { rate:.0f} rounds/s, { memory / 1024:.2f} KiB retained per round')
+
+            rate, memory = self.measure(num_rounds, game_type)
+            self.stdout.write(f'Shared game tree: { rate:.0f} rounds/s, { memory / 1024:.2f} KiB retained per round')
+        finally:
+            for stub in stubs:
+                stub.stop()
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coordinator.kuhn.kuhn_matchmaker import KuhnMatchmaker
+
+# Coordinators are not created in this benchmark, a stub object is used instead, so the database is not involved at all
+class MatchmakingStubCoordinator(object):
+
+    def __init__(self):
+        self.players = []
+        self.lock    = threading.Lock()
+
+    def register(self, player_token):
+        with self.lock:
+            self.players.append(player_token)
+
+class Command(BaseCommand):
+    help = "Connects N simultaneous players to random games and checks that exactly N/2 games are formed, reports pairing latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type = int, default = 1000, help = 'Number of simultaneously connecting players (should be even)')
+        parser.add_argument('--game-type', type = int, default = 3, help = 'Game type')
+        parser.add_argument('--timeout', type = float, default = 30.0, help = 'Matchmaking timeout in seconds')
+
+    def handle(self, *args, **options):
+        num_players = options['players']
+        game_type   = options['game_type']
+
+        if num_players % 2 != 0:
+            raise CommandError('Number of players should be even')
+
+        matchmaker   = KuhnMatchmaker()
+        coordinators = []
+        latencies    = [ None ] * num_players
+        errors       = []
+        barrier      = threading.Barrier(num_players)
+
+        def create_coordinator():
+            coordinator = MatchmakingStubCoordinator()
+            coordinators.append(coordinator)
+            return coordinator
+
+        def connect(index):
+            token = f'player-{ index }'
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                coordinator = matchmaker.match(game_type, token, create_coordinator, timeout = options['timeout'])
+                latencies[index] = time.perf_counter() - start
+                coordinator.register(token)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target = connect, args = (index, )) for index in range(num_players) ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if len(errors) != 0:
+            raise CommandError(f'{ len(errors) } players failed to find an opponent, first error: { errors[0] }')
+
+        num_games       = len(coordinators)
+        num_full_games  = sum(1 for coordinator in coordinators if len(coordinator.players) == 2)
+        num_unique      = len(set(player for coordinator in coordinators for player in coordinator.players))
+        latencies       = np.array(latencies) * 1000
+
+        self.stdout.write(f'Players: { num_players }, games formed: { num_games }, games with exactly two players: { num_full_games }, unique players matched: { num_unique }')
+        self.stdout.write(f'Pairing latency: p50 { np.percentile(latencies, 50):.2f} ms, p99 { np.percentile(latencies, 99):.2f} ms, max { latencies.max():.2f} ms')
+        self.stdout.write(f'Total time: { elapsed * 1000:.1f} ms, players left in the queue: { matchmaker.get_num_waiting_players(game_type) }')
+
+        if num_games != num_players // 2 or num_full_games != num_games or num_unique != num_players:
+            raise CommandError('Matchmaking produced unexpected pairs')
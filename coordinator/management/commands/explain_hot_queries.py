@@ -0,0 +1,75 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from coordinator.models import Game, GameCoordinator, GameRound, GameTypes, Player, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
+from pages.game_browser import encode_cursor, make_games_queryset, parse_game_filters
+
+class Command(BaseCommand):
+    help = "Prints EXPLAIN plans of the hot queries of the coordinator and pages and reports full table scans (SQLite and PostgreSQL)"
+
+    # SQLite reports `SCAN <table>` without an index for a full scan, PostgreSQL reports `Seq Scan on <table>`
+    # Note that PostgreSQL prefers sequential scans of small tables even when an index exists, run it against a database of a realistic size
+    FullScanPatterns = [ re.compile(r'\bSCAN (TABLE )?\w+(?!.*\bINDEX\b)'), re.compile(r'\bSeq Scan on\b') ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action = 'store_true', help = 'Run queries with `EXPLAIN ANALYZE` (PostgreSQL only)')
+        parser.add_argument('--fail-on-scan', action = 'store_true', help = 'Exit with an error if any query does an unexpected full table scan')
+
+    # Returns (name, queryset, whether a full scan is expected by design) for every hot query, parameters are taken from existing rows if possible
+    def get_queries(self):
+        player      = Player.objects.first()
+        game        = Game.objects.order_by('-created_at', '-id').first()
+        tournament  = Tournament.objects.first()
+        token       = player.token if player is not None else uuid.uuid4()
+        game_id     = game.id if game is not None else uuid.uuid4()
+        cursor      = encode_cursor(game if game is not None else Game(id = uuid.uuid4(), created_at = timezone.now()))
+        browser     = lambda **params: make_games_queryset(parse_game_filters({ 'cursor': cursor, **params }))
+
+        return [
+            ('Player by token (identity interceptor)',        Player.objects.filter(token = token), False),
+            ('Player by public token (game browser)',         Player.objects.filter(public_token = uuid.uuid4()), False),
+            ('Bot players (bot games)',                       Player.objects.filter(is_bot = True), False),
+            ('Test players (server start)',                   Player.objects.filter(is_test = True), False),
+            ('Coordinator by id and game type',               GameCoordinator.objects.filter(id = uuid.uuid4(), game_type = GameTypes.KUHN_CARD3), False),
+            ('Game by coordinator (game page)',               Game.objects.filter(created_by__id = uuid.uuid4()), False),
+            ('Game rounds in order (game page)',              GameRound.objects.filter(game__id = game_id).select_related('first', 'second').order_by('index'), False),
+            ('Games page after cursor',                       browser()[:50], False),
+            ('Games of a player as player 1 after cursor',    browser().filter(player1_id = token)[:50], False),
+            ('Games of a player as player 2 after cursor',    browser().filter(player2_id = token)[:50], False),
+            ('Games of a game type after cursor',             browser(game_type = str(GameTypes.KUHN_CARD3.value))[:50], False),
+            ('Failed games after cursor',                     browser(status = 'failed')[:50], False),
+            ('Running games after cursor',                    browser(status = 'playing')[:50], False),
+            ('Latest tournaments (tournaments page)',         Tournament.objects.filter(coordinator__isnull = False).order_by('-created_at')[:50], False),
+            ('Tournament by coordinator',                     Tournament.objects.filter(coordinator__id = uuid.uuid4()), False),
+            ('Tournament rounds in order (tournament page)',  TournamentRound.objects.filter(tournament__id = tournament.id if tournament is not None else uuid.uuid4()).order_by('index'), False),
+            ('Bracket items of rounds (tournament page)',     TournamentRoundBracketItem.objects.filter(round__id__in = [ uuid.uuid4() ]).order_by('round', 'position'), False),
+            ('Games of bracket items (tournament page)',      TournamentRoundGame.objects.filter(bracket_item__id__in = [ uuid.uuid4() ]).select_related('game__player1', 'game__player2', 'game__winner'), False),
+            ('Leaderboard (lists all players)',               Player.objects.select_related('stats').order_by('-stats__tournaments_won'), True),
+        ]
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('`--analyze` is supported only on PostgreSQL')
+
+        unexpected = []
+        for name, queryset, scan_expected in self.get_queries():
+            plan  = queryset.explain(analyze = True) if options['analyze'] else queryset.explain()
+            scans = [ line for line in plan.splitlines() if any(pattern.search(line) for pattern in Command.FullScanPatterns) ]
+
+            status = 'OK'
+            if len(scans) != 0:
+                status = 'FULL SCAN (expected)' if scan_expected else 'FULL SCAN'
+                if not scan_expected:
+                    unexpected.append(name)
+
+            self.stdout.write(f'-- { name }: { status }')
+            self.stdout.write(plan)
+            self.stdout.write('')
+
+        self.stdout.write(f'{ len(unexpected) } queries with unexpected full table scans on { connection.vendor }' + (f': { ", ".join(unexpected) }' if len(unexpected) != 0 else ''))
+        if options['fail_on_scan'] and len(unexpected) != 0:
+            raise CommandError('Some hot queries do full table scans')
@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from coordinator.kuhn.kuhn_constants import KUHN_TYPE_TO_STR, POSSIBLE_CARDS
+from coordinator.utilities.card import Card
+
+class Command(BaseCommand):
+    help = "Pre-generates an atlas of noisy card images, see `CardImageAtlas`. Safe to run while server is running."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', help = 'Path to the atlas index file, defaults to `CARD_IMAGE_ATLAS` setting', default = None)
+        parser.add_argument('--count', type = int, default = 10000, help = 'Number of images per rank')
+        parser.add_argument('--keep', type = int, default = 2, help = 'Number of most recent atlas files to keep on disk')
+
+    def handle(self, *args, **options):
+        index_path = options['index'] or settings.CARD_IMAGE_ATLAS
+        count      = options['count']
+
+        if index_path is None:
+            raise CommandError('Atlas index path is not specified. Use `--index` argument or `CARD_IMAGE_ATLAS` setting.')
+
+        if count <= 0:
+            raise CommandError('Number of images per rank must be positive.')
+
+        # Images depend only on the card rank, so game types share sections of the same ranks
+        ranks  = sorted(set(rank for cards in POSSIBLE_CARDS.values() for rank in cards))
+        stride = Card.IMG_SIZE * Card.IMG_SIZE
+
+        directory  = os.path.dirname(os.path.abspath(index_path))
+        basename   = os.path.splitext(os.path.basename(index_path))[0]
+        atlas_name = f'{ basename }.{ time.time_ns() }.bin'
+
+        index = {
+            'atlas': atlas_name,
+            'image_size': Card.IMG_SIZE,
+            'stride': stride,
+            'ranks': {},
+            'game_types': { KUHN_TYPE_TO_STR[game_type]: cards for game_type, cards in POSSIBLE_CARDS.items() }
+        }
+
+        start = time.perf_counter()
+
+        os.makedirs(directory, exist_ok = True)
+        with open(os.path.join(directory, atlas_name), 'wb') as atlas_file:
+            for (section, rank) in enumerate(ranks):
+                index['ranks'][rank] = [ section * count, count ]
+                for _ in range(count):
+                    image = Card(rank).get_image_bytes()
+                    if len(image) != stride:
+                        raise CommandError(f'Unexpected image size: { len(image) } bytes, expected { stride } bytes.')
+                    atlas_file.write(image)
+            atlas_file.flush()
+            os.fsync(atlas_file.fileno())
+
+        # Index is replaced atomically, running servers pick up the new atlas on their next index check
+        temporary_index_path = f'{ index_path }.tmp'
+        with open(temporary_index_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary_index_path, index_path)
+
+        self.stdout.write(f'Generated { count * len(ranks) } images in { time.perf_counter() - start:.1f} sec: { os.path.join(directory, atlas_name) }')
+
+        # Old atlas files are still mapped by running servers until they reload the index
+        # On POSIX systems removing them is safe, on Windows mapped files cannot be removed and will be cleaned up on the next run
+        previous = sorted(glob.glob(os.path.join(directory, f'{ basename }.*.bin')), key = os.path.getmtime)
+        for path in previous[:-max(options['keep'], 1)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from coordinator.models import Game, PlayerStats, RoomRegistration, Tournament
+
+class Command(BaseCommand):
+    help = "Rebuilds materialized player statistics (`PlayerStats`) of the leaderboard from finished games and tournaments, run it while no games are being played"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type = int, default = 1000, help = 'Number of rows per bulk insert')
+
+    def handle(self, *args, **options):
+        stats = {} # Player token -> `PlayerStats`
+
+        def count(queryset, field: str, counter: str):
+            for row in queryset.values(field).annotate(count = Count('id')):
+                player_stats = stats.setdefault(row[field], PlayerStats(player_id = row[field]))
+                setattr(player_stats, counter, getattr(player_stats, counter) + row['count'])
+
+        # Each counter is a single grouped query, so the number of queries does not depend on the number of players or games
+        games = Game.objects.filter(is_finished = True)
+        count(games, 'player1', 'games_total')
+        count(games, 'player2', 'games_total')
+        count(games.filter(winner__isnull = False), 'winner', 'games_won')
+        count(RoomRegistration.objects.filter(room__coordinator__tournament__place1__isnull = False), 'player', 'tournaments_participated')
+        count(Tournament.objects.filter(place1__isnull = False), 'place1', 'tournaments_won')
+
+        with transaction.atomic():
+            PlayerStats.objects.all().delete()
+            PlayerStats.objects.bulk_create(stats.values(), batch_size = options['batch_size'])
+
+        self.stdout.write(f'Rebuilt statistics of { len(stats) } players')
@@ -0,0 +1,68 @@
+import glob
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from coordinator.kuhn.kuhn_journal import KuhnRoundJournal
+from coordinator.models import Game, GameRound, PlayerStats
+
+class Command(BaseCommand):
+    help = "Replays round journal segments that were not compacted into the database (e.g. after a crash) and finalizes their games, run it before server starts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder', default = settings.KUHN_ROUND_JOURNAL_FOLDER, help = 'Round journal folder, `KUHN_ROUND_JOURNAL_FOLDER` by default')
+        parser.add_argument('--keep', action = 'store_true', help = 'Keep segments after they have been replayed')
+
+    # Game status is not journaled, so games of recovered rounds which are not finished in the database are finished here
+    # Winner is the player whose opponent has run out of bank (see `KuhnGame.evaluate_round`), games without one were interrupted by the crash and are failed
+    def finalize_games(self, game_ids) -> int:
+        finalized = 0
+        for game in Game.objects.filter(id__in = game_ids, is_finished = False):
+            banks = { game.player1_id: settings.KUHN_GAME_INITIAL_BANK, game.player2_id: settings.KUHN_GAME_INITIAL_BANK }
+            for dbround in GameRound.objects.filter(game = game, evaluation__isnull = False).order_by('index'):
+                banks[dbround.first_id]  = banks[dbround.first_id] + dbround.evaluation
+                banks[dbround.second_id] = banks[dbround.second_id] - dbround.evaluation
+
+            losers = [ token for token, bank in banks.items() if bank <= 0 ]
+            winner = next(token for token in banks if token != losers[0]) if len(losers) == 1 else None
+            error  = None if winner is not None else 'Game has been interrupted by a server crash'
+
+            with transaction.atomic():
+                Game.objects.filter(id = game.id).update(is_finished = True, is_failed = winner is None, winner_id = winner, error = error)
+                PlayerStats.record_game([ game.player1_id, game.player2_id ], winner)
+            finalized = finalized + 1
+        return finalized
+
+    def handle(self, *args, **options):
+        folder = options['folder']
+        if folder is None:
+            raise CommandError('Round journal is disabled, specify `--folder` explicitly')
+        if not KuhnRoundJournal.is_supported():
+            raise CommandError('Round journal is not supported on this platform')
+
+        total, replayed, game_ids = 0, 0, set()
+        for segment in KuhnRoundJournal.segments(folder):
+            # Segments of a running server (including its active segment) are compacted by the server itself
+            node = KuhnRoundJournal.segment_node(segment)
+            if KuhnRoundJournal.is_node_alive(folder, node):
+                self.stdout.write(f'Skipped { segment }, it belongs to a running server { node }')
+                continue
+            rounds   = KuhnRoundJournal.replay(segment)
+            total    = total + len(rounds)
+            replayed = replayed + 1
+            game_ids.update(dbround.game_id for dbround in rounds)
+            if not options['keep']:
+                os.remove(segment)
+            self.stdout.write(f'Replayed { len(rounds) } rounds from { segment }')
+
+        finalized = self.finalize_games(game_ids)
+
+        # Lock files of stopped servers are not needed anymore
+        if not options['keep']:
+            for path in glob.glob(KuhnRoundJournal.node_lock_path(folder, '*')):
+                if not KuhnRoundJournal.is_node_alive(folder, os.path.basename(path)[:-len('.lock')]):
+                    os.remove(path)
+
+        self.stdout.write(f'Replayed { total } rounds from { replayed } round journal segments, finalized { finalized } unfinished games')
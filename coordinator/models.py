@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from enum import IntEnum
@@ -79,6 +79,15 @@ class Player(models.Model):
     is_test      = models.BooleanField(null = False, default = False)
     is_bot       = models.BooleanField(null = False, default = False)
 
+    # Bot and test players are looked up on every bot game and server start, partial indexes contain only those few rows
+    # Public tokens are used to filter games of a player in the game browser
+    class Meta:
+        indexes = [
+            models.Index(fields = [ 'public_token' ], name = 'player_public_token_idx'),
+            models.Index(fields = [ 'token' ], condition = models.Q(is_bot = True), name = 'player_bot_idx'),
+            models.Index(fields = [ 'token' ], condition = models.Q(is_test = True), name = 'player_test_idx'),
+        ]
+
 
 class PlayerTypes(IntEnum):
     PLAYER_BOT = 1
@@ -156,6 +165,19 @@ class Game(models.Model):
     winner      = models.ForeignKey(Player, on_delete = models.CASCADE, null = True, related_name = 'games_winner')
     game_type   = models.IntegerField(choices = GameTypes.choices(), null = False)
 
+    # Composite indexes for keyset pagination of the game browser over `(created_at, id)`, newest first (see `pages/game_browser.py`)
+    # Each filter of the browser has its own index with the filter column as a prefix, so a page is a single index range scan
+    # Failed and running games are a small part of all games, so their status filters use partial indexes which contain only those rows
+    class Meta:
+        indexes = [
+            models.Index(fields = [ '-created_at', '-id' ], name = 'game_created_idx'),
+            models.Index(fields = [ 'player1', '-created_at', '-id' ], name = 'game_player1_created_idx'),
+            models.Index(fields = [ 'player2', '-created_at', '-id' ], name = 'game_player2_created_idx'),
+            models.Index(fields = [ 'game_type', '-created_at', '-id' ], name = 'game_type_created_idx'),
+            models.Index(fields = [ '-created_at', '-id' ], condition = models.Q(is_failed = True), name = 'game_failed_created_idx'),
+            models.Index(fields = [ '-created_at', '-id' ], condition = models.Q(is_finished = False), name = 'game_playing_created_idx'),
+        ]
+
 class GameRound(models.Model):
     id          = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
     game        = models.ForeignKey(Game, on_delete = models.CASCADE, null = False)
@@ -166,6 +188,12 @@ class GameRound(models.Model):
     inf_set     = models.CharField(max_length = 128, null = True)
     evaluation  = models.IntegerField(null = True)
 
+    # Rounds of a game are always read in `index` order
+    class Meta:
+        indexes = [
+            models.Index(fields = [ 'game', 'index' ], name = 'gameround_game_index_idx'),
+        ]
+
     def actions(self):
         return zip(self.inf_set.split('.')[2:], itertools.cycle([ self.first, self.second ])) if self.inf_set is not None else None
 
@@ -182,19 +210,67 @@ class Tournament(models.Model):
     allow_bots  = models.BooleanField(null = False, default = True)
     is_started  = models.BooleanField(null = False, default = False)
 
+    # Tournaments page lists the latest tournaments which have a coordinator
+    class Meta:
+        indexes = [
+            models.Index(fields = [ '-created_at' ], condition = models.Q(coordinator__isnull = False), name = 'tournament_created_idx'),
+        ]
+
 class TournamentRound(models.Model):
     id         = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
     tournament = models.ForeignKey(Tournament, on_delete = models.CASCADE, null = False)
     index      = models.IntegerField(validators = [ MinValueValidator(1) ], null = False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields = [ 'tournament', 'index' ], name = 'tround_tournament_index_idx'),
+        ]
+
 class TournamentRoundBracketItem(models.Model):
-    id         = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
-    position   = models.IntegerField(validators = [ MinValueValidator(1) ], null = False)
-    round      = models.ForeignKey(TournamentRound, on_delete = models.CASCADE, null = False)
-    player1    = models.ForeignKey(Player, on_delete = models.CASCADE, null = True, related_name = 'players_player1')
-    player2    = models.ForeignKey(Player, on_delete = models.CASCADE, null = True, related_name = 'players_player2')
+    id          = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
+    position    = models.IntegerField(validators = [ MinValueValidator(1) ], null = False)
+    round       = models.ForeignKey(TournamentRound, on_delete = models.CASCADE, null = False)
+    player1     = models.ForeignKey(Player, on_delete = models.CASCADE, null = True, related_name = 'players_player1')
+    player2     = models.ForeignKey(Player, on_delete = models.CASCADE, null = True, related_name = 'players_player2')
+    queue_delay = models.FloatField(null = True) # Seconds between both players of the match being known and the match start
+
+    class Meta:
+        indexes = [
+            models.Index(fields = [ 'round', 'position' ], name = 'tbracket_round_position_idx'),
+        ]
 
 class TournamentRoundGame(models.Model):
     id           = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False)
     bracket_item = models.ForeignKey(TournamentRoundBracketItem, on_delete = models.CASCADE, null = False)
-    game         = models.ForeignKey(Game, on_delete = models.CASCADE, null = False)
\ No newline at end of file
+    game         = models.ForeignKey(Game, on_delete = models.CASCADE, null = False)
+
+# PlayerStats is a materialized leaderboard row of a single player, players without finished games or tournaments have no row
+# Coordinators update it incrementally once a game or a tournament has finished (see `record_game` and `record_tournament`)
+# and it can be rebuilt from games and tournaments in bulk with `python manage.py rebuild_player_stats`
+# Only finished games count and a tournament counts once it has a winner
+class PlayerStats(models.Model):
+    player                   = models.OneToOneField(Player, on_delete = models.CASCADE, primary_key = True, related_name = 'stats')
+    games_total              = models.IntegerField(null = False, default = 0)
+    games_won                = models.IntegerField(null = False, default = 0)
+    tournaments_participated = models.IntegerField(null = False, default = 0)
+    tournaments_won          = models.IntegerField(null = False, default = 0, db_index = True)
+
+    def games_lost(self):
+        return self.games_total - self.games_won
+
+    # Counters are incremented in the database with `F` expressions, so concurrent games of the same player do not overwrite each other
+    @staticmethod
+    def record(player_tokens, winner_token, total: str, won: str):
+        with transaction.atomic():
+            PlayerStats.objects.bulk_create([ PlayerStats(player_id = token) for token in player_tokens ], ignore_conflicts = True)
+            PlayerStats.objects.filter(player_id__in = player_tokens).update(**{ total: models.F(total) + 1 })
+            if winner_token is not None:
+                PlayerStats.objects.filter(player_id = winner_token).update(**{ won: models.F(won) + 1 })
+
+    @staticmethod
+    def record_game(player_tokens, winner_token):
+        PlayerStats.record(player_tokens, winner_token, 'games_total', 'games_won')
+
+    @staticmethod
+    def record_tournament(player_tokens, winner_token):
+        PlayerStats.record(player_tokens, winner_token, 'tournaments_participated', 'tournaments_won')
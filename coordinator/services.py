@@ -5,36 +5,32 @@ import traceback
 import threading
 import logging
 from coordinator.kuhn.kuhn_constants import resolve_kuhn_type, CoordinatorActions
-from coordinator.kuhn.kuhn_coordinator import KuhnCoordinator, KuhnCoordinatorEventTypes, KuhnCoordinatorMessage
+from coordinator.kuhn.kuhn_coordinator import KuhnCoordinator, KuhnCoordinatorEventTypes, KuhnCoordinatorMessage, KuhnCoordinatorStates
+from coordinator.kuhn.kuhn_coordinator_registry import KuhnCoordinatorRegistry
+from coordinator.kuhn.kuhn_matchmaker import KuhnMatchmaker
 
 from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayerMessage
 
 from django_grpc_framework.services import Service
+from asgiref.sync import sync_to_async
+from coordinator.interceptors import PlayerIdentityCache
 from coordinator.kuhn.kuhn_waiting_room import KuhnWaitingRoom
 from coordinator.models import GameCoordinator, GameCoordinatorTypes, Player, Tournament
-from coordinator.utilities.card import Card
+from coordinator.utilities.card_atlas import CardImageAtlas
+from coordinator.utilities.card_pool import CardImagePool
 from proto.game import game_pb2
 from django.conf import settings
 from enum import Enum
+from typing import Optional, Tuple
 
 class GameCoordinatorService(Service):
-    coordinators = {}
-    lock         = threading.RLock()
+    coordinators = KuhnCoordinatorRegistry(num_shards = settings.COORDINATOR_REGISTRY_SHARDS)
+    matchmaker   = KuhnMatchmaker()
     logger       = logging.getLogger('service.coordinator')
 
-    # Run remove_closed_coordinator continuosly in a timer loop
-    def __remove_closed_coordinator_daemon():
-        while True:
-            time.sleep(settings.COORDINATOR_REMOVE_CLOSED_COORDINATORS_INTERVAL)
-            GameCoordinatorService.remove_closed_coordinators()
-
-    _rcc_daemon = threading.Thread(target = __remove_closed_coordinator_daemon)
-    _rcc_daemon.daemon = True
-    _rcc_daemon.start()
-
     # noinspection PyPep8Naming,PyMethodMayBeStatic
     def Rename(self, request, context):
-        player = Player.objects.get(token = request.token)
+        player = GameCoordinatorService.resolve_player(context, request.token)
 
         if player.is_disabled:
             raise Exception(f'User is disabled')
@@ -43,12 +39,13 @@ class GameCoordinatorService(Service):
             return game_pb2.PlayerRenameResponse(response = 'New name must not exceed 128 characters.')
         
         Player.objects.filter(token = request.token).update(name = request.name)
+        PlayerIdentityCache.invalidate(request.token)
 
         return game_pb2.PlayerRenameResponse(response = 'Updated successfully.')
 
     # noinspection PyPep8Naming,PyMethodMayBeStatic
     def Create(self, request, context):
-        player = Player.objects.get(token = request.token)
+        player = GameCoordinatorService.resolve_player(context, request.token)
 
         if player.is_disabled:
             raise Exception(f'User is disabled')
@@ -68,33 +65,20 @@ class GameCoordinatorService(Service):
 
     # noinspection PyPep8Naming,PyMethodMayBeStatic
     def Play(self, request, context):
-        
-        # First check method's metadata and extract player's secret token
-        metadata  = dict(context.invocation_metadata())
-        token     = metadata['token']
-
-        player = Player.objects.get(token = token)
-
-        if player.is_disabled:
-            raise Exception(f'User is disabled')
 
-        game_type      = resolve_kuhn_type(metadata['game_type'])
-        coordinator    = GameCoordinatorService.find_coordinator_instance(player, metadata['coordinator_id'], game_type)
-        coordinator_id = coordinator.id
+        # First check method's metadata and extract player's secret token
+        metadata, token, player = GameCoordinatorService.resolve_play_request(context)
 
-        GameCoordinatorService.logger.info(f'Player { token } is trying to connect to the coordinator with id = { coordinator_id }')
+        game_type   = resolve_kuhn_type(metadata['game_type'])
+        coordinator = GameCoordinatorService.find_coordinator_instance(player, metadata['coordinator_id'], game_type, context)
 
-        if coordinator.is_closed():
-            GameCoordinatorService.logger.warning(f'Attempt to connect to a closed coordinator { coordinator_id }')
-            raise Exception('Coordinator has been closed already')
+        GameCoordinatorService.check_play_coordinator(coordinator, token)
 
         callback_active = True
 
         def GRPCConnectionTerminationCallback():
             if callback_active:
-                if coordinator.waiting_room.is_player_registered(token) and not coordinator.is_closed():
-                    coordinator.waiting_room.mark_as_disconnected(token)
-                    coordinator.channel.put(KuhnGameLobbyPlayerMessage(token, CoordinatorActions.Disconnected))
+                GameCoordinatorService.on_player_disconnected(coordinator, token)
 
         context.add_callback(GRPCConnectionTerminationCallback)
 
@@ -118,31 +102,15 @@ class GameCoordinatorService(Service):
         #     - in non-tournament mode players always receive `Close` event at this stage
         try:
 
-            if metadata['coordinator_id'] == 'random' or metadata['coordinator_id'] == 'bot':
-                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.UpdateCoordinatorId, coordinator_id = str(coordinator_id))
+            if GameCoordinatorService.is_coordinator_id_requested(metadata):
+                yield GameCoordinatorService.create_coordinator_id_response(coordinator)
 
             # Each player should register themself in the game coordinator lobby
             coordinator.waiting_room.register_player(token)
 
-            is_ready = coordinator.wait_ready()
-
-            # We do not expect for this branch to be executed, but we do check it just in case
-            if not is_ready:
-                yield game_pb2.PlayGameResponse(
-                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, 
-                    error = 'Timeout in coordinator. Coordinator is not ready. Please report.'
-                )
-                coordinator.close(error = 'Coordinator is not ready.')
-                GameCoordinatorService.logger.error('Timeout in coordinator. Coordinator is not ready.')
-                GameCoordinatorService.remove_coordinator(coordinator)
-                return
-
-            # We do not expect coordinator to be closed here without any error
-            if coordinator.is_closed():
-                yield game_pb2.PlayGameResponse(
-                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, 
-                    error = coordinator.error
-                )
+            error = GameCoordinatorService.on_coordinator_ready(coordinator, coordinator.wait_ready())
+            if error is not None:
+                yield error
                 return
 
             # Each player has its unique channel to communicate with the game coordinator lobby
@@ -151,133 +119,35 @@ class GameCoordinatorService(Service):
             # We run this inner loop until we have some messages from connected player
             for message in request:
 
-                # In case if lobby has been finished, but player requests a list of available actions just 
-                # send a `Close` disconnect event and break out of the loop since we do not expect any other message after that
-                if message.action == CoordinatorActions.AvailableActions and coordinator.is_closed():
-                    coordinator.logger.info(f'Sending disconnect event to the player { token }')
-                    yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Close)
+                close = GameCoordinatorService.handle_play_request(coordinator, token, message)
+                if close is not None:
+                    yield close
                     break
 
-                # Check against utility messages: 'CONNECT' and 'WAIT'
-                # In principle this messages do nothing, but can be used to initiate a new game or to wait for another player action
-                if message.action != CoordinatorActions.Connect and message.action != CoordinatorActions.Wait:
-                    coordinator.channel.put(KuhnGameLobbyPlayerMessage(token, message.action))
-
                 # Waiting for a response from the game coordinator about another player's decision and available actions
                 response = None
-                while (not coordinator.is_closed() and response is None) or not player_channel.empty():
+                while GameCoordinatorService.is_waiting_for_response(coordinator, player_channel, response):
                     try:
                         response = player_channel.get(timeout = settings.COORDINATOR_WAITING_TIMEOUT)
                         self.logger.debug(f'Processing message { response } for player { token }')
-                        if isinstance(response, KuhnCoordinatorMessage):
-                            if response.event == KuhnCoordinatorEventTypes.GameStart:
-                                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.GameStart)
-                            # If response is a `CardDeal` we generate a new card based on its rank 
-                            # and send the corresponding turn order, card rank (if enabled in server settings) and the image itself in a form of raw bytes
-                            # Note that depending on the turn order the list of available actions may be different
-                            # First player in order gets a list of possible moves
-                            # Second player in order gets an only one command to wait for a move from the first player
-                            # In case of a `CardDeal` event we expect lobby to send
-                            # - turn_order
-                            # - card
-                            # - actions 
-                            elif response.event == KuhnCoordinatorEventTypes.CardDeal:
-                                turn_order = response.data['turn_order']
-                                card_rank  = response.data['card'] if settings.COORDINATOR_REVEAL_CARDS else '?'
-                                actions    = response.data['actions']
-                                card_image = Card(response.data['card']).get_image().tobytes('raw')
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.CardDeal, 
-                                    available_actions = actions, 
-                                    turn_order = turn_order,
-                                    card_rank  = card_rank,
-                                    card_image = card_image
-                                )
-                            # In case of `InvalidAction` or `OpponentInvalidAction` or `OpponentDisconnected` events we expect lobby to send
-                            # - actions
-                            elif response.event == KuhnCoordinatorEventTypes.InvalidAction:
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.InvalidAction,
-                                    available_actions = response.data['actions']
-                                )
-                            elif response.event == KuhnCoordinatorEventTypes.OpponentInvalidAction:
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.OpponentInvalidAction,
-                                    available_actions = response.data['actions']
-                                )
-                            elif response.event == KuhnCoordinatorEventTypes.OpponentDisconnected:
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.OpponentDisconnected,
-                                    available_actions = response.data['actions']
-                                )
-                            # In case of a `NextAction` event we expect lobby to send
-                            # - inf_set
-                            # - actions
-                            elif response.event == KuhnCoordinatorEventTypes.NextAction:                                
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.NextAction,
-                                    inf_set           = response.data['inf_set'],
-                                    available_actions = response.data['actions'] 
-                                )
-                            # In case of a `RoundResult` event we expect lobby to send
-                            # - evaluation
-                            # - inf_set
-                            elif response.event == KuhnCoordinatorEventTypes.RoundResult:
-                                yield game_pb2.PlayGameResponse(
-                                    event = game_pb2.PlayGameResponse.PlayGameResponseEvent.RoundResult,
-                                    round_evaluation = response.data['evaluation'],
-                                    inf_set          = response.data['inf_set']
-                                )
-                            # In case of a `GameResult` event we expect lobby to send
-                            # - game_result
-                            elif response.event == KuhnCoordinatorEventTypes.GameResult:
-                                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.GameResult, game_result = response.data['game_result'])
-                            # In case of a `GameResult` event we expect lobby to send
-                            # - error
-                            elif response.event == KuhnCoordinatorEventTypes.Close:
-                                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Close)
-                                coordinator.close()
-                            elif response.event == KuhnCoordinatorEventTypes.Error:
-                                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = response.data['error'])
-                                coordinator.close(error = response.data['error'])
-                            else:
-                                raise Exception(f'Unexpected event type from lobby response: { response }')
-                        else:
-                            raise Exception(f'Unexpected response type from lobby: { response }')
-
-                        player_channel.task_done()    
+                        yield GameCoordinatorService.create_play_response(response)
+                        GameCoordinatorService.on_play_response_sent(coordinator, response)
+                        player_channel.ack()
                     except queue.Empty:
-                        if coordinator.is_closed() and player_channel.empty():
-                            coordinator.logger.error(f'Coordinator has been finished while waiting for response from player.')
-                            if coordinator.error != None:
-                                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = coordinator.error)
-                                return          
+                        error = GameCoordinatorService.on_response_timeout(coordinator, player_channel)
+                        if error is not None:
+                            yield error
+                            return
 
             callback_active = False
 
-            if coordinator.waiting_room.is_player_registered(token):
-                GameCoordinatorService.remove_coordinator(coordinator)
-
-        except KuhnCoordinator.CoordinatorWaitingRoomCreationFailed:
-            GameCoordinatorService.logger.error(f'Connection error. Failed to create a waiting room.')
-            yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = 'Failed to create a waiting room.')
-        except KuhnWaitingRoom.WaitingRoomIsFull:
-            GameCoordinatorService.logger.error(f'Connection error. Coordinator waiting room is full.')
-            yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = 'Coordinator waiting room is full.')
-        except KuhnWaitingRoom.WaitingRoomIsClosed:
-            GameCoordinatorService.logger.error(f'Connection error. Coordinator waiting room is closed.')
-            yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = 'Coordinator waiting room is closed.')
-        except KuhnWaitingRoom.PlayerDoubleRegistration:
-            GameCoordinatorService.logger.error(f'Connection error. Player with the same id has been registered already exist in this waiting room.')
-            yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = 'Player with the same id has been registered already exist in this waiting room.')
+            GameCoordinatorService.on_play_finished(coordinator, token)
+
         except Exception as e:
-            if len(str(e)) != 0:
-                GameCoordinatorService.logger.error(f'Connection error. Unhandled exception: { e }.\n')
-                traceback.print_exc()
-                yield game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = f'Unexpected error on server side: { e }. Please report.\n')
-                if coordinator != None and coordinator.waiting_room != None and coordinator.waiting_room.is_player_registered(token):
-                    coordinator.close(error = str(e))
-                    GameCoordinatorService.remove_coordinator(coordinator)
+            error = GameCoordinatorService.create_play_error_response(e)
+            if error is not None:
+                yield error
+            GameCoordinatorService.on_play_failed(coordinator, token, e)
 
         callback_active = False
     
@@ -313,12 +183,10 @@ class GameCoordinatorService(Service):
                 instance = Tournament.objects.get(id = request.id)
                 # Check if tournament has been update with `is_started` = True
                 if instance.is_started == True:
-                    with GameCoordinatorService.lock:
-                        if instance.coordinator != None and str(instance.coordinator.id) in GameCoordinatorService.coordinators:
-                            coordinator = GameCoordinatorService.coordinators[ str(instance.coordinator.id) ]
-                            if not coordinator.is_ready():
-                                coordinator.waiting_room.mark_as_ready()
-                                GameCoordinatorService.logger.info(f'Tournament { instance.id } has been started.')
+                    coordinator = GameCoordinatorService.coordinators.get(instance.coordinator_id) if instance.coordinator_id != None else None
+                    if coordinator != None and not coordinator.is_ready():
+                        coordinator.waiting_room.mark_as_ready()
+                        GameCoordinatorService.logger.info(f'Tournament { instance.id } has been started.')
             else:
                 GameCoordinatorService.logger.warning(f'Unexpected request type in `Tournament` gRPC call: { request }')
             
@@ -327,99 +195,448 @@ class GameCoordinatorService(Service):
             GameCoordinatorService.logger.error(f'Unexpected error in `Tournament` gRPC call: { e }')
             return game_pb2.TournamentResponse(error = f'Unexpected error: { e }')
 
+    # `PlayerIdentityInterceptor` resolves player in advance and passes it in `context.player`
+    # If interceptor is not configured (or could not resolve the token) we resolve player here, through the same identity cache
+    @staticmethod
+    def resolve_player(context, token: str) -> Player:
+        player = getattr(context, 'player', None)
+        if player is not None and str(player.token) == str(token):
+            return player
+        return PlayerIdentityCache.get(token)
+
+    # Errors that may happen during player's connection to a coordinator and corresponding messages for the client
+    ConnectionErrorMessages = {
+        KuhnCoordinator.CoordinatorWaitingRoomCreationFailed: 'Failed to create a waiting room.',
+        KuhnWaitingRoom.WaitingRoomIsFull: 'Coordinator waiting room is full.',
+        KuhnWaitingRoom.WaitingRoomIsClosed: 'Coordinator waiting room is closed.',
+        KuhnWaitingRoom.PlayerDoubleRegistration: 'Player with the same id has been registered already exist in this waiting room.',
+    }
+
+    ConnectionErrors = tuple(ConnectionErrorMessages.keys())
+
+    @staticmethod
+    def connection_error_message(error: Exception) -> str:
+        return GameCoordinatorService.ConnectionErrorMessages[type(error)]
+
+    # Steps of a `Play` stream which are shared by `GameCoordinatorService` and `AsyncGameCoordinatorService`
+    # Entry points differ only in how they wait (threads or `await`), blocking helpers are offloaded with `sync_to_async` in async mode
+
+    # Extracts player's secret token from method's metadata and resolves the player, disabled players are not allowed to play
+    @staticmethod
+    def resolve_play_request(context) -> Tuple[dict, str, Player]:
+        metadata = dict(context.invocation_metadata())
+        token    = metadata['token']
+
+        player = GameCoordinatorService.resolve_player(context, token)
+
+        if player.is_disabled:
+            raise Exception(f'User is disabled')
+
+        return metadata, token, player
+
+    @staticmethod
+    def check_play_coordinator(coordinator: KuhnCoordinator, token: str):
+        GameCoordinatorService.logger.info(f'Player { token } is trying to connect to the coordinator with id = { coordinator.id }')
+
+        if coordinator.is_closed():
+            GameCoordinatorService.logger.warning(f'Attempt to connect to a closed coordinator { coordinator.id }')
+            raise Exception('Coordinator has been closed already')
+
+    # Called by gRPC once player's stream has been terminated (unless the stream has been finished normally)
+    @staticmethod
+    def on_player_disconnected(coordinator: KuhnCoordinator, token: str):
+        if coordinator.waiting_room.is_player_registered(token) and not coordinator.is_closed():
+            coordinator.waiting_room.mark_as_disconnected(token)
+            coordinator.post(KuhnGameLobbyPlayerMessage(token, CoordinatorActions.Disconnected))
+
+    # Random and bot games create (or find) a coordinator on the server side, so its id is sent back to the player
+    @staticmethod
+    def is_coordinator_id_requested(metadata: dict) -> bool:
+        return metadata['coordinator_id'] == 'random' or metadata['coordinator_id'] == 'bot'
+
+    @staticmethod
+    def create_coordinator_id_response(coordinator: KuhnCoordinator) -> game_pb2.PlayGameResponse:
+        return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.UpdateCoordinatorId, coordinator_id = str(coordinator.id))
+
+    @staticmethod
+    def create_error_response(error: str) -> game_pb2.PlayGameResponse:
+        return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = error)
+
+    # Returns an error response if the player cannot start playing after waiting for the coordinator to be ready
+    @staticmethod
+    def on_coordinator_ready(coordinator: KuhnCoordinator, is_ready: bool) -> Optional[game_pb2.PlayGameResponse]:
+        # We do not expect for this branch to be executed, but we do check it just in case
+        if not is_ready:
+            coordinator.close(error = 'Coordinator is not ready.')
+            GameCoordinatorService.logger.error('Timeout in coordinator. Coordinator is not ready.')
+            GameCoordinatorService.remove_coordinator(coordinator)
+            return GameCoordinatorService.create_error_response('Timeout in coordinator. Coordinator is not ready. Please report.')
+        # We do not expect coordinator to be closed here without any error
+        if coordinator.is_closed():
+            return GameCoordinatorService.create_error_response(coordinator.error)
+        return None
+
+    # Posts player's action to the coordinator, returns a `Close` response if the stream should be finished instead
+    @staticmethod
+    def handle_play_request(coordinator: KuhnCoordinator, token: str, message) -> Optional[game_pb2.PlayGameResponse]:
+        # In case if lobby has been finished, but player requests a list of available actions just 
+        # send a `Close` disconnect event and break out of the loop since we do not expect any other message after that
+        if message.action == CoordinatorActions.AvailableActions and coordinator.is_closed():
+            coordinator.logger.info(f'Sending disconnect event to the player { token }')
+            return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Close)
+
+        # Check against utility messages: 'CONNECT' and 'WAIT'
+        # In principle this messages do nothing, but can be used to initiate a new game or to wait for another player action
+        if message.action != CoordinatorActions.Connect and message.action != CoordinatorActions.Wait:
+            coordinator.post(KuhnGameLobbyPlayerMessage(token, message.action))
+        return None
+
+    # Client sends exactly one request per received message, so we send one message per request and leave the rest in the channel
+    # Game does not wait for messages to be delivered, so the next message might be already in the channel, it belongs to the next request
+    # Once coordinator has been closed we send all remaining messages
+    @staticmethod
+    def is_waiting_for_response(coordinator: KuhnCoordinator, player_channel, response: Optional[KuhnCoordinatorMessage]) -> bool:
+        if coordinator.is_closed():
+            return not player_channel.empty()
+        return response is None
+
+    # Returns an error response if the coordinator has been closed with an error while we were waiting for a response
+    @staticmethod
+    def on_response_timeout(coordinator: KuhnCoordinator, player_channel) -> Optional[game_pb2.PlayGameResponse]:
+        if coordinator.is_closed() and player_channel.empty():
+            coordinator.logger.error(f'Coordinator has been finished while waiting for response from player.')
+            if coordinator.error != None:
+                return GameCoordinatorService.create_error_response(coordinator.error)
+        return None
+
+    @staticmethod
+    def on_play_finished(coordinator: KuhnCoordinator, token: str):
+        if coordinator.waiting_room.is_player_registered(token):
+            GameCoordinatorService.remove_coordinator(coordinator)
+
+    # Exceptions without a message are not reported to the player
+    @staticmethod
+    def create_play_error_response(error: Exception) -> Optional[game_pb2.PlayGameResponse]:
+        if isinstance(error, GameCoordinatorService.ConnectionErrors):
+            message = GameCoordinatorService.connection_error_message(error)
+            GameCoordinatorService.logger.error(f'Connection error. { message }')
+            return GameCoordinatorService.create_error_response(message)
+        if len(str(error)) != 0:
+            GameCoordinatorService.logger.error(f'Connection error. Unhandled exception: { error }.\n')
+            traceback.print_exception(type(error), error, error.__traceback__)
+            return GameCoordinatorService.create_error_response(f'Unexpected error on server side: { error }. Please report.\n')
+        return None
+
+    # Unexpected errors close the coordinator the player has been registered in, connection errors leave it for other players
+    @staticmethod
+    def on_play_failed(coordinator: KuhnCoordinator, token: str, error: Exception):
+        if isinstance(error, GameCoordinatorService.ConnectionErrors) or len(str(error)) == 0:
+            return
+        if coordinator != None and coordinator.waiting_room != None and coordinator.waiting_room.is_player_registered(token):
+            coordinator.close(error = str(error))
+            GameCoordinatorService.remove_coordinator(coordinator)
+
+    # Card images are served from a shared memory-mapped atlas if it is configured, otherwise from in-process pool of pre-rendered images
+    # Protobuf `bytes` fields accept only `bytes`, so an atlas image is copied once here, straight from the map into the response
+    @staticmethod
+    def get_card_image(rank: str) -> bytes:
+        atlas = CardImageAtlas.default()
+        if atlas is not None and atlas.has(rank):
+            return bytes(atlas.pop(rank))
+        return CardImagePool.default().pop(rank)
+
+    @staticmethod
+    def create_play_response(response: KuhnCoordinatorMessage) -> game_pb2.PlayGameResponse:
+        if not isinstance(response, KuhnCoordinatorMessage):
+            raise Exception(f'Unexpected response type from lobby: { response }')
+
+        if response.event == KuhnCoordinatorEventTypes.GameStart:
+            return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.GameStart)
+        # If response is a `CardDeal` we generate a new card based on its rank 
+        # and send the corresponding turn order, card rank (if enabled in server settings) and the image itself in a form of raw bytes
+        # Note that depending on the turn order the list of available actions may be different
+        # First player in order gets a list of possible moves
+        # Second player in order gets an only one command to wait for a move from the first player
+        # In case of a `CardDeal` event we expect lobby to send
+        # - turn_order
+        # - card
+        # - actions 
+        elif response.event == KuhnCoordinatorEventTypes.CardDeal:
+            turn_order = response.data['turn_order']
+            card_rank  = response.data['card'] if settings.COORDINATOR_REVEAL_CARDS else '?'
+            actions    = response.data['actions']
+            card_image = GameCoordinatorService.get_card_image(response.data['card'])
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.CardDeal, 
+                available_actions = actions, 
+                turn_order = turn_order,
+                card_rank  = card_rank,
+                card_image = card_image
+            )
+        # In case of `InvalidAction` or `OpponentInvalidAction` or `OpponentDisconnected` events we expect lobby to send
+        # - actions
+        elif response.event == KuhnCoordinatorEventTypes.InvalidAction:
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.InvalidAction,
+                available_actions = response.data['actions']
+            )
+        elif response.event == KuhnCoordinatorEventTypes.OpponentInvalidAction:
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.OpponentInvalidAction,
+                available_actions = response.data['actions']
+            )
+        elif response.event == KuhnCoordinatorEventTypes.OpponentDisconnected:
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.OpponentDisconnected,
+                available_actions = response.data['actions']
+            )
+        # In case of a `NextAction` event we expect lobby to send
+        # - inf_set
+        # - actions
+        elif response.event == KuhnCoordinatorEventTypes.NextAction:                                
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.NextAction,
+                inf_set           = response.data['inf_set'],
+                available_actions = response.data['actions'] 
+            )
+        # In case of a `RoundResult` event we expect lobby to send
+        # - evaluation
+        # - inf_set
+        elif response.event == KuhnCoordinatorEventTypes.RoundResult:
+            return game_pb2.PlayGameResponse(
+                event = game_pb2.PlayGameResponse.PlayGameResponseEvent.RoundResult,
+                round_evaluation = response.data['evaluation'],
+                inf_set          = response.data['inf_set']
+            )
+        # In case of a `GameResult` event we expect lobby to send
+        # - game_result
+        elif response.event == KuhnCoordinatorEventTypes.GameResult:
+            return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.GameResult, game_result = response.data['game_result'])
+        elif response.event == KuhnCoordinatorEventTypes.Close:
+            return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Close)
+        # In case of a `Error` event we expect lobby to send
+        # - error
+        elif response.event == KuhnCoordinatorEventTypes.Error:
+            return game_pb2.PlayGameResponse(event = game_pb2.PlayGameResponse.PlayGameResponseEvent.Error, error = response.data['error'])
+        else:
+            raise Exception(f'Unexpected event type from lobby response: { response }')
+
+    # `Close` and `Error` events close the coordinator, but only after the corresponding response has been sent to the player
+    ClosingEvents = (KuhnCoordinatorEventTypes.Close, KuhnCoordinatorEventTypes.Error)
+
+    @staticmethod
+    def on_play_response_sent(coordinator: KuhnCoordinator, response: KuhnCoordinatorMessage):
+        if response.event == KuhnCoordinatorEventTypes.Close:
+            coordinator.close()
+        elif response.event == KuhnCoordinatorEventTypes.Error:
+            coordinator.close(error = response.data['error'])
+
     @staticmethod
     def add_coordinator(coordinator: KuhnCoordinator) -> KuhnCoordinator:
-        with GameCoordinatorService.lock:
-            if not coordinator.id in GameCoordinatorService.coordinators:
-                GameCoordinatorService.coordinators[coordinator.id] = coordinator
+        # Coordinator's lock guarantees that it cannot be closed before we subscribe to its `Closed` state
+        with coordinator.lock:
+            if GameCoordinatorService.coordinators.add(coordinator):
+                coordinator.state_listeners.append(GameCoordinatorService.on_coordinator_state_changed)
                 GameCoordinatorService.logger.info(f'Added game coordinator { coordinator.id }')
                 coordinator.mark_as_registered()
             else:
                 GameCoordinatorService.logger.warning(f'Trying to add the same game coordinator { coordinator.id }')
+        if coordinator.is_closed():
+            GameCoordinatorService.remove_coordinator(coordinator)
         return coordinator
 
     @staticmethod
     def remove_coordinator(coordinator: KuhnCoordinator) -> KuhnCoordinator:
-        with GameCoordinatorService.lock:
-            if coordinator.id in GameCoordinatorService.coordinators:
-                GameCoordinatorService.coordinators.pop(coordinator.id)
-                GameCoordinatorService.logger.info(f'Removed game coordinator { coordinator.id }')
+        with coordinator.lock:
+            if GameCoordinatorService.on_coordinator_state_changed in coordinator.state_listeners:
+                coordinator.state_listeners.remove(GameCoordinatorService.on_coordinator_state_changed)
+        if GameCoordinatorService.coordinators.remove(coordinator):
+            GameCoordinatorService.logger.info(f'Removed game coordinator { coordinator.id }')
         return coordinator
 
-    @staticmethod 
-    def remove_closed_coordinators():
-        with GameCoordinatorService.lock:
-            to_be_removed = []
-            for id, coordinator in GameCoordinatorService.coordinators.items():
-                if coordinator.is_closed():
-                    to_be_removed.append(id)
-            if len(to_be_removed) != 0:
-                GameCoordinatorService.logger.info(f'Removing finished coordinators: { to_be_removed }')
-                for to_remove in to_be_removed:
-                    # It might be removed in parallel
-                    if to_remove in GameCoordinatorService.coordinators:
-                        GameCoordinatorService.coordinators.pop(to_remove)
+    # Closed coordinators are removed from the registry as soon as they are closed, so they do not hold their games and channels in memory
+    # Listener is called by `KuhnCoordinator.close` under coordinator's lock, `remove` does nothing if coordinator has been removed already
+    @staticmethod
+    def on_coordinator_state_changed(coordinator: KuhnCoordinator, previous: KuhnCoordinatorStates, state: KuhnCoordinatorStates):
+        if state == KuhnCoordinatorStates.Closed:
+            GameCoordinatorService.remove_coordinator(coordinator)
+
+    # Random games can be played only with real players, but Kuhn type game should match
+    # Players are paired in memory by `KuhnMatchmaker`, database is involved only once a pair has been formed and a new coordinator is created
+    @staticmethod
+    def create_random_coordinator(game_type: int) -> KuhnCoordinator:
+        return GameCoordinatorService.add_coordinator(KuhnCoordinator(
+            coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER,
+            game_type        = game_type,
+            capacity         = 2,
+            timeout          = settings.COORDINATOR_CONNECTION_TIMEOUT,
+            is_private       = False
+        ))
+
+    @staticmethod
+    def find_random_coordinator_instance(player: Player, game_type: int, context = None) -> KuhnCoordinator:
+        if player.is_bot:
+            raise Exception('Bots cannot play random games')
+        return GameCoordinatorService.matchmaker.match(
+            game_type          = game_type, 
+            player_token       = str(player.token), 
+            create_coordinator = lambda: GameCoordinatorService.create_random_coordinator(game_type), 
+            timeout            = settings.COORDINATOR_CONNECTION_TIMEOUT,
+            is_active          = context.is_active if context is not None else None
+        )
+
+    @staticmethod
+    async def find_random_coordinator_instance_async(player: Player, game_type: int) -> KuhnCoordinator:
+        if player.is_bot:
+            raise Exception('Bots cannot play random games')
+        return await GameCoordinatorService.matchmaker.match_async(
+            game_type          = game_type, 
+            player_token       = str(player.token), 
+            create_coordinator = lambda: GameCoordinatorService.create_random_coordinator(game_type), 
+            timeout            = settings.COORDINATOR_CONNECTION_TIMEOUT
+        )
 
     @staticmethod 
-    def find_coordinator_instance(player: Player, coordinator_id: str, game_type: int) -> KuhnCoordinator:
-        with GameCoordinatorService.lock:
-            GameCoordinatorService.logger.debug(f'Available coordinator ids: { GameCoordinatorService.coordinators }')
-            # Behaviour depends on provided `token`. 
-            # Real players attemt to find `PLAYER_PLAYER` games only
-            # Bot players attempt to find `PLAYER_BOT` games only
-            # First we check if requested game is a game against a bot
-            # In this case we always create a new private game and will add a bot to it later on
-            if coordinator_id == 'bot':
-                if player.is_bot:
-                    raise Exception('Bots cannot play agains bots')
-                return GameCoordinatorService.add_coordinator(KuhnCoordinator(
-                    coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_BOT, 
-                    game_type        = game_type, 
-                    capacity         = 2,
-                    timeout          = settings.COORDINATOR_CONNECTION_TIMEOUT,
-                    is_private       = True
-                ))
-            # Second we check if requested game was a random game
-            # In this case we check if there are some public pending games available and do nothing if not
-            # Random games can be played only with real players, but Kuhn type game should match
-            elif coordinator_id == 'random':
-                if player.is_bot:
-                    raise Exception('Bots cannot play random games')
-                # If we can find a public unfinished game we simply return it
-                # This procedure assumes there are no concurrent connection, however 
-                # in case of concurrent connections one of the connection should not have enough time to connect
-                public_coordinators = GameCoordinator.objects.filter(
-                    coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER, 
-                    game_type        = game_type, 
-                    is_started       = False,
-                    is_failed        = False, 
-                    is_finished      = False, 
-                    is_private       = False
-                )
-                if len(public_coordinators) != 0:
-                    coordinator = public_coordinators[0] # We pick first available public coordinator
-                    return GameCoordinatorService.coordinators[ str(coordinator.id) ] # Coordinator must exist in service internal dict
-                else:
-                    # In case if coordinator id was set to `random` and there were no games available at the moment we create a new one
-                    return GameCoordinatorService.add_coordinator(KuhnCoordinator(
-                        coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER,
-                        game_type        = game_type,
-                        capacity         = 2,
-                        timeout          = settings.COORDINATOR_CONNECTION_TIMEOUT,
-                        is_private       = False
-                    ))
-            else:
-                # Last case should be a valid coordinator id otherwise we return an error
-                candidates = GameCoordinator.objects.filter(id = coordinator_id, game_type = game_type)
-                if len(candidates) != 0:
-                    db_coordinator = candidates[0]
-                    if (db_coordinator.is_finished) or (db_coordinator.is_failed):
-                        raise Exception(f'Coordinator instance with UUID { coordinator_id } has been finished.')
-                    elif db_coordinator.is_started:
-                        raise Exception(f'Coordinator instance with UUID { coordinator_id } has been started and does not allow new connections.')
-                    strid = str(db_coordinator.id)
-                    if strid in GameCoordinatorService.coordinators:
-                        return GameCoordinatorService.coordinators[ strid ]
-                    else:
-                        raise Exception(f'Coordinator instance with UUID { coordinator_id } exists in database, but has not corresponding game instance controller.')
-                raise Exception(f'Coordinator instance with UUID { coordinator_id } has not been found or it has a different game type.') 
\ No newline at end of file
+    def find_coordinator_instance(player: Player, coordinator_id: str, game_type: int, context = None) -> KuhnCoordinator:
+        # Random games are paired by the matchmaker
+        if coordinator_id == 'random':
+            return GameCoordinatorService.find_random_coordinator_instance(player, game_type, context)
+        # Behaviour depends on provided `token`. 
+        # Real players attemt to find `PLAYER_PLAYER` games only
+        # Bot players attempt to find `PLAYER_BOT` games only
+        # First we check if requested game is a game against a bot
+        # In this case we always create a new private game and will add a bot to it later on
+        if coordinator_id == 'bot':
+            if player.is_bot:
+                raise Exception('Bots cannot play agains bots')
+            return GameCoordinatorService.add_coordinator(KuhnCoordinator(
+                coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_BOT, 
+                game_type        = game_type, 
+                capacity         = 2,
+                timeout          = settings.COORDINATOR_CONNECTION_TIMEOUT,
+                is_private       = True
+            ))
+        # Last case should be a valid coordinator id otherwise we return an error
+        # Active coordinators are looked up in the registry without any locks, database is queried only to explain an error
+        coordinator = GameCoordinatorService.coordinators.get(coordinator_id)
+        if coordinator != None and coordinator.game_type == game_type:
+            if coordinator.is_closed():
+                raise Exception(f'Coordinator instance with UUID { coordinator_id } has been finished.')
+            elif coordinator.is_ready():
+                raise Exception(f'Coordinator instance with UUID { coordinator_id } has been started and does not allow new connections.')
+            return coordinator
+        candidates = GameCoordinator.objects.filter(id = coordinator_id, game_type = game_type)
+        if len(candidates) != 0:
+            db_coordinator = candidates[0]
+            if (db_coordinator.is_finished) or (db_coordinator.is_failed):
+                raise Exception(f'Coordinator instance with UUID { coordinator_id } has been finished.')
+            elif db_coordinator.is_started:
+                raise Exception(f'Coordinator instance with UUID { coordinator_id } has been started and does not allow new connections.')
+            raise Exception(f'Coordinator instance with UUID { coordinator_id } exists in database, but has not corresponding game instance controller.')
+        raise Exception(f'Coordinator instance with UUID { coordinator_id } has not been found or it has a different game type.') 
+
+# `AsyncGameCoordinatorService` is used when gRPC server runs in `grpc.aio` mode (see `GRPC_USE_ASYNCIO` setting)
+# In this mode `Play` is an async generator, so a connected player does not reserve a worker thread for the whole stream
+# Instead it awaits on its player channel, the number of concurrent players is therefore limited by memory and not by `GRPC_MAX_WORKERS`
+# All database operations are still synchronous and are offloaded to a thread pool with `sync_to_async`
+# Other (unary) methods are inherited and executed in gRPC server's migration thread pool
+class AsyncGameCoordinatorService(GameCoordinatorService):
+
+    @classmethod
+    def as_servicer(cls, **initkwargs):
+        servicer = super().as_servicer(**initkwargs)
+
+        # Default servicer wraps every handler in a synchronous function, which `grpc.aio` would run in a thread pool
+        # We override `Play` with a native async generator function
+        async def Play(request, context):
+            service = cls(**initkwargs)
+            service.request = request
+            service.context = context
+            service.action  = 'Play'
+            async for response in service.Play(request, context):
+                yield response
+
+        servicer.Play = Play
+        return servicer
+
+    # noinspection PyPep8Naming,PyMethodMayBeStatic
+    async def Play(self, request, context):
+
+        # First check method's metadata and extract player's secret token
+        metadata, token, player = await sync_to_async(GameCoordinatorService.resolve_play_request, thread_sensitive = False)(context)
+
+        game_type = resolve_kuhn_type(metadata['game_type'])
+
+        if metadata['coordinator_id'] == 'random':
+            coordinator = await GameCoordinatorService.find_random_coordinator_instance_async(player, game_type)
+        else:
+            coordinator = await sync_to_async(GameCoordinatorService.find_coordinator_instance, thread_sensitive = False)(player, metadata['coordinator_id'], game_type)
+
+        GameCoordinatorService.check_play_coordinator(coordinator, token)
+
+        callback_active = True
+
+        def GRPCConnectionTerminationCallback(_context):
+            if callback_active:
+                GameCoordinatorService.on_player_disconnected(coordinator, token)
+
+        context.add_done_callback(GRPCConnectionTerminationCallback)
+
+        # Event flow and the steps are exactly the same as in `GameCoordinatorService.Play`, only blocking steps are awaited
+        try:
+
+            if GameCoordinatorService.is_coordinator_id_requested(metadata):
+                yield GameCoordinatorService.create_coordinator_id_response(coordinator)
+
+            # Each player should register themself in the game coordinator lobby
+            await sync_to_async(coordinator.waiting_room.register_player, thread_sensitive = False)(token)
+
+            is_ready = await coordinator.wait_ready_async()
+            error    = await sync_to_async(GameCoordinatorService.on_coordinator_ready, thread_sensitive = False)(coordinator, is_ready)
+            if error is not None:
+                yield error
+                return
+
+            # Each player has its unique channel to communicate with the game coordinator lobby
+            player_channel = coordinator.waiting_room.get_player_channel(token)
+
+            # We run this inner loop until we have some messages from connected player
+            async for message in request:
+
+                close = GameCoordinatorService.handle_play_request(coordinator, token, message)
+                if close is not None:
+                    yield close
+                    break
+
+                # Waiting for a response from the game coordinator about another player's decision and available actions
+                response = None
+                while GameCoordinatorService.is_waiting_for_response(coordinator, player_channel, response):
+                    try:
+                        response = await player_channel.get_async(timeout = settings.COORDINATOR_WAITING_TIMEOUT)
+                        self.logger.debug(f'Processing message { response } for player { token }')
+                        # Card image may be rendered on a pool miss (and takes the pool's lock), so card deals are prepared off the event loop
+                        if response.event == KuhnCoordinatorEventTypes.CardDeal:
+                            yield await sync_to_async(GameCoordinatorService.create_play_response, thread_sensitive = False)(response)
+                        else:
+                            yield GameCoordinatorService.create_play_response(response)
+                        # Closing a coordinator writes to the database, other responses are sent without leaving the event loop
+                        if response.event in GameCoordinatorService.ClosingEvents:
+                            await sync_to_async(GameCoordinatorService.on_play_response_sent, thread_sensitive = False)(coordinator, response)
+                        player_channel.ack()
+                    except queue.Empty:
+                        error = GameCoordinatorService.on_response_timeout(coordinator, player_channel)
+                        if error is not None:
+                            yield error
+                            return
+
+            callback_active = False
+
+            await sync_to_async(GameCoordinatorService.on_play_finished, thread_sensitive = False)(coordinator, token)
+
+        except Exception as e:
+            error = GameCoordinatorService.create_play_error_response(e)
+            if error is not None:
+                yield error
+            await sync_to_async(GameCoordinatorService.on_play_failed, thread_sensitive = False)(coordinator, token, e)
+
+        callback_active = False
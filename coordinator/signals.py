@@ -6,7 +6,8 @@ import time
 from django.db.models.signals import post_save
 from django.conf import settings
 from django.dispatch import receiver
-from coordinator.models import Tournament
+from coordinator.interceptors import PlayerIdentityCache
+from coordinator.models import Player, Tournament
 from proto.game import game_pb2
 from proto.game import game_pb2_grpc
 
@@ -45,4 +46,8 @@ def on_tournament_create(sender, instance, created, raw, using, update_fields, *
 
     deffered = threading.Thread(target = __on_tournament_create)
     deffered.start()
-    
+
+@receiver(post_save, sender = Player, dispatch_uid = "on_player_save")
+def on_player_save(sender, instance, created, raw, using, update_fields, **kwargs):
+    # Players might be renamed or disabled (e.g. in admin panel), cached identity should not be used anymore
+    PlayerIdentityCache.invalidate(instance.token)
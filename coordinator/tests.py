@@ -1,3 +1,173 @@
+import io
+import queue
+import threading
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from coordinator.kuhn.kuhn_constants import CARD3, CoordinatorActions, KuhnCoordinatorEventTypes, KuhnCoordinatorMessage
+from coordinator.kuhn.kuhn_game import KuhnGame
+from coordinator.kuhn.kuhn_player import KuhnGameLobbyPlayer, KuhnGameLobbyPlayerMessage
+from coordinator.kuhn.kuhn_writer import KuhnGameWriter
+from coordinator.models import Game, GameCoordinator, GameCoordinatorTypes, GameRound, Player, PlayerStats, RoomRegistration, Tournament, WaitingRoom
+
+# Creates an empty game between two new players
+def create_game(coordinator: GameCoordinator) -> Game:
+    return Game.objects.create(created_by = coordinator, player1 = Player.objects.create(), player2 = Player.objects.create(), game_type = CARD3)
+
+class KuhnGameWriterTestCase(TestCase):
+
+    def setUp(self):
+        self.coordinator = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER, game_type = CARD3, is_private = False)
+        # Writer thread is not started, batches are written synchronously in the test thread
+        self.writer      = KuhnGameWriter(batch_size = 256, flush_interval = 0.1, retries = 1, retry_delay = 0.0)
+
+    def test_bad_event_does_not_lose_other_games(self):
+        good, bad = create_game(self.coordinator), create_game(self.coordinator)
+
+        dbround = GameRound(game_id = good.id, first_id = good.player1_id, second_id = good.player2_id, index = 1, cards = 'JQ')
+        self.writer.create_round(dbround)
+        self.writer.update_game(bad.id, no_such_field = True)
+        self.writer.update_round(good.id, dbround.id, evaluation = 1, inf_set = 'J.?.b.c')
+        self.writer.update_game(good.id, is_finished = True, winner_id = good.player1_id)
+
+        events = [ self.writer.events.get_nowait() for _ in range(4) ]
+        self.writer.write_events(events)
+
+        self.assertEqual(GameRound.objects.get(id = dbround.id).evaluation, 1)
+        self.assertTrue(Game.objects.get(id = good.id).is_finished)
+        self.assertEqual(self.writer.failed_games, { str(bad.id) })
+        self.assertEqual(self.writer.failed_events, 1)
+
+class StubWriter(object):
+
+    def create_round(self, dbround):
+        pass
+
+    def update_round(self, game_id, round_id, **fields):
+        pass
+
+    def update_game(self, game_id, **fields):
+        pass
+
+    def flush(self, timeout = None, game_id = None):
+        return True
+
+class StubWaitingRoom(object):
+
+    def is_disconnected(self, player_token):
+        return False
+
+class StubCoordinator(object):
+
+    def __init__(self, id):
+        self.id           = id
+        self.waiting_room = StubWaitingRoom()
+
+# Game is played in a background thread, the test plays both clients by posting their messages and reading their mailboxes
+class KuhnGameProtocolTestCase(TestCase):
+
+    def setUp(self):
+        coordinator  = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER, game_type = CARD3, is_private = False)
+        dbgame       = create_game(coordinator)
+        self.stubs   = [ mock.patch.object(KuhnGame, 'get_writer', lambda: StubWriter()), mock.patch.object(PlayerStats, 'record_game', lambda *args: None) ]
+        for stub in self.stubs:
+            stub.start()
+        self.channel = queue.Queue()
+        self.players = { token: KuhnGameLobbyPlayer(token, KuhnGame.InitialBank, queue.Queue()) for token in [ str(dbgame.player1_id), str(dbgame.player2_id) ] }
+        for player in self.players.values():
+            player.channel.post = player.channel.put_nowait
+        player1, player2 = self.players.values()
+        self.game   = KuhnGame(StubCoordinator(coordinator.id), player1, player2, CARD3, self.channel)
+        self.thread = threading.Thread(target = self.game.play)
+        self.thread.start()
+
+    def tearDown(self):
+        self.game.finish(error = 'Test has finished')
+        for token in self.players:
+            self.send(token, CoordinatorActions.ConfirmEndGame)
+        self.thread.join(timeout = 5)
+        for stub in self.stubs:
+            stub.stop()
+
+    def send(self, token, action):
+        self.channel.put(KuhnGameLobbyPlayerMessage(token, action))
+
+    def receive(self, token, event) -> KuhnCoordinatorMessage:
+        while True:
+            message = self.players[token].channel.get(timeout = 5)
+            if message.event == event:
+                return message
+
+    def assertNoMessage(self, token, event):
+        while not self.players[token].channel.empty():
+            self.assertNotEqual(self.players[token].channel.get_nowait().event, event)
+
+    # Starts the first round and returns tokens of the first and the second player
+    def start_round(self):
+        for token in self.players:
+            self.receive(token, KuhnCoordinatorEventTypes.GameStart)
+            self.send(token, CoordinatorActions.NewRound)
+        first = next(token for token in self.players if self.receive(token, KuhnCoordinatorEventTypes.CardDeal).data['turn_order'] == 1)
+        return first, next(token for token in self.players if token != first)
+
+    def test_late_available_actions_request_is_answered_with_wait(self):
+        first, second = self.start_round()
+
+        self.send(first, CoordinatorActions.AvailableActions)
+        self.send(first, self.receive(first, KuhnCoordinatorEventTypes.NextAction).data['actions'][0])
+        self.assertNotEqual(self.receive(second, KuhnCoordinatorEventTypes.NextAction).data['actions'], [ CoordinatorActions.Wait ])
+
+        # Second player has already been sent their actions, a late request must not send them again
+        self.send(second, CoordinatorActions.AvailableActions)
+        self.assertEqual(self.receive(second, KuhnCoordinatorEventTypes.NextAction).data['actions'], [ CoordinatorActions.Wait ])
+
+    def test_actions_after_game_finish_are_ignored(self):
+        first, second = self.start_round()
+
+        self.send(first, CoordinatorActions.AvailableActions)
+        actions = self.receive(first, KuhnCoordinatorEventTypes.NextAction).data['actions']
+
+        # An invalid action finishes the game, a valid action after that must not be played
+        self.send(first, 'INVALID')
+        self.receive(first, KuhnCoordinatorEventTypes.GameResult)
+        self.send(first, actions[0])
+        for token in self.players:
+            self.send(token, CoordinatorActions.ConfirmEndGame)
+        self.thread.join(timeout = 5)
+
+        self.assertTrue(self.game.is_finished())
+        self.assertEqual(len(self.game.rounds[0].stage.public_inf_set()), 0)
+        self.assertNoMessage(second, KuhnCoordinatorEventTypes.NextAction)
+
+class PlayerStatsTestCase(TestCase):
+
+    def get_stats(self):
+        return set(PlayerStats.objects.values_list('player_id', 'games_total', 'games_won', 'tournaments_participated', 'tournaments_won'))
+
+    # Records games and a tournament incrementally as coordinators do and checks that a full rebuild gives the same statistics
+    def test_incremental_stats_match_rebuild(self):
+        coordinator = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.TOURNAMENT_PLAYERS, game_type = CARD3, is_private = False)
+        players     = [ Player.objects.create() for _ in range(4) ]
+        Player.objects.create() # Player who has never played
+
+        for player1, player2, winner, is_failed in [ (0, 1, 0, False), (2, 3, 3, False), (0, 3, 3, False), (1, 2, None, True), (0, 1, 1, False) ]:
+            winner_id = players[winner].token if winner is not None else None
+            Game.objects.create(created_by = coordinator, player1 = players[player1], player2 = players[player2], winner_id = winner_id, game_type = CARD3, is_finished = True, is_failed = is_failed)
+            PlayerStats.record_game([ players[player1].token, players[player2].token ], winner_id)
+        # Games in progress are not counted
+        Game.objects.create(created_by = coordinator, player1 = players[0], player2 = players[2], game_type = CARD3)
+
+        room = WaitingRoom.objects.create(coordinator = coordinator, capacity = 4, timeout = 60)
+        for player in players:
+            RoomRegistration.objects.create(room = room, player = player)
+        # `bulk_create` does not send `post_save`, which would otherwise ask the gRPC server to create a coordinator for the tournament
+        Tournament.objects.bulk_create([ Tournament(coordinator = coordinator, timeout = 60, capacity = 4, game_type = CARD3, place1 = players[3]) ])
+        PlayerStats.record_tournament([ player.token for player in players ], players[3].token)
+
+        incremental = self.get_stats()
+        call_command('rebuild_player_stats', stdout = io.StringIO())
+
+        self.assertEqual(incremental, self.get_stats())
+        self.assertEqual(PlayerStats.objects.get(player = players[3]).games_won, 2)
@@ -0,0 +1,89 @@
+import asyncio
+import queue
+import threading
+
+# Coordinator, waiting room and game threads communicate with blocking primitives from `threading` and `queue` modules
+# `grpc.aio` handlers, however, run inside an event loop and must not block it (nor reserve a worker thread while waiting)
+# `AwaitableEvent` and `AwaitableQueue` keep the blocking API intact and additionally expose awaitable counterparts
+# Each async waiter registers an `asyncio.Event` together with its loop, producer threads wake it up with `call_soon_threadsafe`
+
+def _wakeup(waiters):
+    for loop, waiter in waiters:
+        try:
+            loop.call_soon_threadsafe(waiter.set)
+        except RuntimeError:
+            # Event loop has been closed already, nobody waits for this event anymore
+            pass
+
+
+class AwaitableEvent(threading.Event):
+
+    def __init__(self):
+        super().__init__()
+        self._waiters      = []
+        self._waiters_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+        with self._waiters_lock:
+            _wakeup(self._waiters)
+
+    async def wait_async(self, timeout = None) -> bool:
+        if self.is_set():
+            return True
+
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+
+        try:
+            # Event might have been set between the first check and waiter registration
+            if not self.is_set():
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.is_set()
+        finally:
+            with self._waiters_lock:
+                self._waiters.remove(waiter)
+
+
+class AwaitableQueue(queue.Queue):
+
+    def __init__(self, maxsize = 0):
+        super().__init__(maxsize)
+        self._waiters = []
+
+    # `_put` is always called with `self.mutex` being held, so `self._waiters` is guarded by the same mutex
+    def _put(self, item):
+        super()._put(item)
+        _wakeup(self._waiters)
+
+    async def get_async(self, timeout = None):
+        loop     = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+
+            waiter = (loop, asyncio.Event())
+
+            with self.mutex:
+                self._waiters.append(waiter)
+                is_empty = self._qsize() == 0
+
+            try:
+                if is_empty:
+                    remaining = None if deadline is None else deadline - loop.time()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Empty
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+            finally:
+                with self.mutex:
+                    self._waiters.remove(waiter)
@@ -1,26 +1,70 @@
+import math
 import random
+import threading
 
-from matplotlib import font_manager
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+
+from PIL import Image, ImageDraw
 from django.conf import settings
 
+from coordinator.utilities.fonts import get_font, resolve_font_paths
+
 class Card:
 
-    FONTS = [
-        font_manager.findfont(font_manager.FontProperties(family = 'sans-serif', style = 'normal', weight = 'normal')),
-        font_manager.findfont(font_manager.FontProperties(family = 'sans-serif', style = 'italic', weight = 'normal')),
-        font_manager.findfont(font_manager.FontProperties(family = 'sans-serif', style = 'normal', weight = 'medium')),
-        font_manager.findfont(font_manager.FontProperties(family = 'serif', style = 'normal', weight = 'normal')),
-        font_manager.findfont(font_manager.FontProperties(family = 'serif', style = 'italic', weight = 'normal')),
-        font_manager.findfont(font_manager.FontProperties(family = 'serif', style = 'normal', weight = 'medium')),
-    ]
+    FONTS = resolve_font_paths()
     IMG_SIZE = settings.CARD_GENERATED_IMAGE_SIZE
     NOISE_LEVEL = settings.CARD_GENERATED_IMAGE_NOISE_LEVEL
     ROTATE_MAX_ANGLE = settings.CARD_GENERATED_IMAGE_ROTATE_MAX_ANGLE
 
+    # Rendered (not rotated and noiseless) rank glyphs, see `Card.get_glyph`
+    GLYPHS      = {}
+    GLYPHS_LOCK = threading.Lock()
+
+    # Pixel centers of an output image, used to compute inverse rotation mapping in `Card.get_image_bytes`
+    PIXEL_CENTERS = np.indices((IMG_SIZE, IMG_SIZE), dtype = np.float64) + 0.5
+
+    Generator = np.random.default_rng()
+
     def __init__(self, rank):
         self.rank = rank
 
+    @staticmethod
+    def render_glyph(text, font) -> Image.Image:
+        img = Image.new('L', (Card.IMG_SIZE, Card.IMG_SIZE), color = 255)
+        draw = ImageDraw.Draw(img)
+        (text_width, text_height) = draw.textsize(text, font = font)  # Extract text size
+        draw.text(((Card.IMG_SIZE - text_width) / 2, (Card.IMG_SIZE - text_height) / 2 - 4), text, fill = 0, font = font)
+        return img
+
+    @staticmethod
+    def get_glyph(text, font_path) -> np.ndarray:
+        # Glyph only depends on the rank and on the font, so we render it once and reuse it for all subsequent images
+        key = (text, font_path)
+        glyph = Card.GLYPHS.get(key)
+        if glyph is None:
+            with Card.GLYPHS_LOCK:
+                glyph = Card.GLYPHS.get(key)
+                if glyph is None:
+                    glyph = np.asarray(Card.render_glyph(text, get_font(font_path, Card.IMG_SIZE - 6)), dtype = np.uint8)
+                    Card.GLYPHS[key] = glyph
+        return glyph
+
+    @staticmethod
+    def rotate(pixels: np.ndarray, angle: float) -> np.ndarray:
+        # Same transformation as `PIL.Image.rotate(angle, expand = False, fillcolor = '#FFFFFF')` with default (nearest) resampling:
+        # for each output pixel center we find its source pixel by rotating it around the image center in the opposite direction
+        height, width = pixels.shape
+        theta = -math.radians(angle)
+        cos, sin = math.cos(theta), math.sin(theta)
+        cx, cy = width / 2.0, height / 2.0
+        ys, xs = Card.PIXEL_CENTERS[0] - cy, Card.PIXEL_CENTERS[1] - cx
+        sx = np.floor(cos * xs + sin * ys + cx).astype(np.intp)
+        sy = np.floor(-sin * xs + cos * ys + cy).astype(np.intp)
+        inside = (sx >= 0) & (sx < width) & (sy >= 0) & (sy < height)
+        rotated = np.full_like(pixels, 255)
+        rotated[inside] = pixels[sy[inside], sx[inside]]
+        return rotated
+
     def get_image(self, noise_level = None):
         if noise_level is None:
             noise_level = Card.NOISE_LEVEL
@@ -29,11 +73,8 @@ class Card:
 
         # Create rank image from text
         text = self.rank[0]  # Extract letter to write
-        font = ImageFont.truetype(random.choice(self.FONTS), size = Card.IMG_SIZE - 6)  # Pick a random font
-        img = Image.new('L', (Card.IMG_SIZE, Card.IMG_SIZE), color = 255)
-        draw = ImageDraw.Draw(img)
-        (text_width, text_height) = draw.textsize(text, font = font)  # Extract text size
-        draw.text(((Card.IMG_SIZE - text_width) / 2, (Card.IMG_SIZE - text_height) / 2 - 4), text, fill = 0, font = font)
+        font = get_font(random.choice(self.FONTS), Card.IMG_SIZE - 6)  # Pick a random font
+        img = Card.render_glyph(text, font)
 
         # Random rotate transformation
         img = img.rotate(random.uniform(-Card.ROTATE_MAX_ANGLE, Card.ROTATE_MAX_ANGLE), expand = False, fillcolor = '#FFFFFF')
@@ -49,3 +90,20 @@ class Card:
         noisy_img.putdata(pixels)
 
         return noisy_img
+
+    # Vectorized version of `get_image`, returns raw bytes of an 8-bit grayscale image, same as `get_image().tobytes('raw')`
+    # Pixels are processed as `uint8` numpy array, PIL is used only once per (rank, font) pair to render the glyph
+    def get_image_bytes(self, noise_level = None) -> bytes:
+        if noise_level is None:
+            noise_level = Card.NOISE_LEVEL
+        if not 0 <= noise_level <= 1:
+            raise ValueError(f"Invalid noise level: {noise_level}, value must be between zero and one")
+
+        glyph  = Card.get_glyph(self.rank[0], Card.FONTS[Card.Generator.integers(len(Card.FONTS))])
+        pixels = Card.rotate(glyph, Card.Generator.uniform(-Card.ROTATE_MAX_ANGLE, Card.ROTATE_MAX_ANGLE))
+
+        # Introduce random noise, each pixel is replaced with a random intensity with `noise_level` probability
+        mask = Card.Generator.random(pixels.shape) <= noise_level
+        pixels[mask] = Card.Generator.integers(0, 256, size = int(np.count_nonzero(mask)), dtype = np.uint8)
+
+        return pixels.tobytes()
@@ -0,0 +1,95 @@
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from django.conf import settings
+
+# `CardImageAtlas` serves card images from a pre-generated atlas (see `generate_card_atlas` management command)
+# Atlas consists of two files:
+#   - binary file with raw images of a fixed stride, images of the same rank are stored contiguously
+#   - small JSON index with a name of the binary file, stride and a (first image, number of images) section for each rank
+# Binary file is memory-mapped in read-only mode, so several server processes on the same host share the same page cache
+# Atlas can be regenerated while server is running, the command writes a new binary file and atomically replaces the index,
+# server checks index modification time every `CARD_IMAGE_ATLAS_RELOAD_INTERVAL` seconds and switches to the new atlas
+# `pop` returns a zero-copy `memoryview` into the map, a view keeps its map alive, so a reload never unmaps images which are still in use
+class CardImageAtlas(object):
+    _current     = None
+    _current_key = None
+    _checked_at  = None
+    _lock        = threading.Lock()
+    logger       = logging.getLogger('service.cards')
+
+    def __init__(self, index_path: str):
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+
+        self.index_path = index_path
+        self.atlas_path = os.path.join(os.path.dirname(os.path.abspath(index_path)), index['atlas'])
+        self.stride     = int(index['stride'])
+        self.sections   = { rank: (int(first), int(count)) for rank, (first, count) in index['ranks'].items() }
+        self.lock       = threading.Lock()
+        self.generator  = np.random.default_rng()
+        self.cursors    = {}
+
+        with open(self.atlas_path, 'rb') as atlas_file:
+            self.mmap = mmap.mmap(atlas_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+        expected_size = self.stride * sum(count for _, count in self.sections.values())
+        if len(self.mmap) < expected_size:
+            self.mmap.close()
+            raise ValueError(f'Card image atlas { self.atlas_path } is truncated: { len(self.mmap) } < { expected_size } bytes')
+
+        # Map is never closed explicitly (see `reload`), so it can be exported to views for the whole lifetime of the atlas
+        self.view = memoryview(self.mmap)
+
+    @staticmethod
+    def default():
+        index_path = settings.CARD_IMAGE_ATLAS
+        if index_path is None:
+            return None
+
+        with CardImageAtlas._lock:
+            now = time.monotonic()
+            if CardImageAtlas._checked_at is None or now - CardImageAtlas._checked_at >= settings.CARD_IMAGE_ATLAS_RELOAD_INTERVAL:
+                CardImageAtlas._checked_at = now
+                try:
+                    stat = os.stat(index_path)
+                    key  = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    key  = None
+                if key != CardImageAtlas._current_key:
+                    CardImageAtlas.reload(index_path, key)
+            return CardImageAtlas._current
+
+    # Previous atlas is not closed explicitly, other threads may still hold a reference to it or to views returned by its `pop`,
+    # its memory map is released as soon as the last reference is gone
+    @staticmethod
+    def reload(index_path: str, key):
+        try:
+            CardImageAtlas._current = CardImageAtlas(index_path) if key is not None else None
+            CardImageAtlas._current_key = key
+            CardImageAtlas.logger.info(f'Card image atlas has been loaded from { index_path }' if key is not None else f'Card image atlas { index_path } has been removed')
+        except Exception as e:
+            # We keep serving the previous atlas in case if the new one is broken or is being written at the moment
+            CardImageAtlas.logger.error(f'Failed to load card image atlas from { index_path }: { e }')
+
+    def has(self, rank) -> bool:
+        section = self.sections.get(rank)
+        return section is not None and section[1] > 0
+
+    def pop(self, rank) -> memoryview:
+        with self.lock:
+            first, count = self.sections[rank]
+            # Each process walks over a random permutation of images of a particular rank,
+            # so an image is never repeated until all other images of the same rank have been served
+            order, position = self.cursors.get(rank, (None, count))
+            if position >= count:
+                order, position = self.generator.permutation(count), 0
+            self.cursors[rank] = (order, position + 1)
+            offset = (first + int(order[position])) * self.stride
+            return self.view[offset:offset + self.stride]
@@ -0,0 +1,102 @@
+import collections
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from coordinator.kuhn.kuhn_constants import POSSIBLE_CARDS, CARD4
+from coordinator.utilities.card import Card
+
+# `CardImagePool` keeps a bounded number of ready-to-send card images for each rank
+# Images are produced in a background thread, so a `CardDeal` event only pops a buffer from the pool
+# Each image is handed out exactly once and is discarded afterwards, so images are never reused (neither within a game nor across games)
+# If the pool for a particular rank is empty we count a miss and generate an image synchronously
+class CardImagePool(object):
+    _default      = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, ranks, capacity: int, generator = None, report_interval: int = 60):
+        self.capacity        = capacity
+        self.generator       = generator if generator is not None else (lambda rank: Card(rank).get_image_bytes())
+        self.report_interval = report_interval
+        self.pools           = { rank: collections.deque() for rank in ranks }
+        self.condition       = threading.Condition()
+        self.hits            = 0
+        self.misses          = 0
+        self.refills         = 0
+        self.refill_latency  = 0.0 # Total time of all refills, see `stats()`
+        self.refill_max      = 0.0
+        self.depleted_at     = None
+        self.logger          = logging.getLogger('service.cards')
+        self.producer        = threading.Thread(target = self.produce, name = 'card-image-pool-producer')
+        self.producer.daemon = True
+
+    @staticmethod
+    def default() -> 'CardImagePool':
+        with CardImagePool._default_lock:
+            if CardImagePool._default is None:
+                CardImagePool._default = CardImagePool(
+                    ranks           = POSSIBLE_CARDS[CARD4],
+                    capacity        = settings.CARD_IMAGE_POOL_SIZE,
+                    report_interval = settings.CARD_IMAGE_POOL_REPORT_INTERVAL
+                )
+                CardImagePool._default.start()
+            return CardImagePool._default
+
+    def start(self):
+        self.producer.start()
+
+    def pop(self, rank) -> bytes:
+        with self.condition:
+            pool = self.pools.get(rank)
+            if self.depleted_at is None:
+                self.depleted_at = time.perf_counter()
+            if pool:
+                self.hits = self.hits + 1
+                self.condition.notify()
+                return pool.popleft()
+            self.misses = self.misses + 1
+            self.condition.notify()
+        return self.generator(rank)
+
+    def is_full(self) -> bool:
+        with self.condition:
+            return all(len(pool) >= self.capacity for pool in self.pools.values())
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'refills': self.refills,
+                'refill_latency_avg': self.refill_latency / self.refills if self.refills != 0 else 0.0,
+                'refill_latency_max': self.refill_max,
+                'available': { rank: len(pool) for rank, pool in self.pools.items() }
+            }
+
+    def produce(self):
+        while True:
+            with self.condition:
+                while self.is_full():
+                    if not self.condition.wait(timeout = self.report_interval):
+                        self.logger.info(f'Card image pool stats: { self.stats() }')
+                # We always refill the most depleted rank first
+                rank = min(self.pools.keys(), key = lambda r: len(self.pools[r]))
+
+            try:
+                image = self.generator(rank)
+            except Exception as e:
+                self.logger.error(f'Card image pool failed to generate an image for rank { rank }: { e }')
+                time.sleep(1)
+                continue
+
+            with self.condition:
+                self.pools[rank].append(image)
+                # Refill latency is the time between the first pop from a full pool and the moment all pools are full again
+                if self.is_full() and self.depleted_at is not None:
+                    latency = time.perf_counter() - self.depleted_at
+                    self.refills        = self.refills + 1
+                    self.refill_latency = self.refill_latency + latency
+                    self.refill_max     = max(self.refill_max, latency)
+                    self.depleted_at    = None
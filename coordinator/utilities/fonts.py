@@ -0,0 +1,65 @@
+import functools
+import json
+import logging
+import os
+
+from PIL import ImageFont
+from django.conf import settings
+
+# Fonts used to render card images, each font is described with (family, style, weight) properties
+FONT_PROPERTIES = [
+    ('sans-serif', 'normal', 'normal'),
+    ('sans-serif', 'italic', 'normal'),
+    ('sans-serif', 'normal', 'medium'),
+    ('serif', 'normal', 'normal'),
+    ('serif', 'italic', 'normal'),
+    ('serif', 'normal', 'medium'),
+]
+
+logger = logging.getLogger('service.cards')
+
+# Font paths resolution with `matplotlib.font_manager` is slow (and importing matplotlib itself is slow)
+# Resolved paths are stored in a small JSON file (see `CARD_FONTS_CACHE` setting) and reused on subsequent server starts
+# Cache is invalidated if the list of font properties changes or if any of the cached font files does not exist anymore
+def resolve_font_paths(cache_path = None, use_cache = True):
+    if cache_path is None:
+        cache_path = settings.CARD_FONTS_CACHE
+
+    if use_cache and cache_path is not None:
+        paths = load_font_paths(cache_path)
+        if paths is not None:
+            return paths
+
+    # We import matplotlib only if there is no valid cache
+    from matplotlib import font_manager
+
+    paths = [
+        font_manager.findfont(font_manager.FontProperties(family = family, style = style, weight = weight)) for (family, style, weight) in FONT_PROPERTIES
+    ]
+
+    if cache_path is not None:
+        try:
+            with open(cache_path, 'w') as cache_file:
+                json.dump({ 'fonts': [ [ *properties, path ] for (properties, path) in zip(FONT_PROPERTIES, paths) ] }, cache_file)
+        except OSError as e:
+            logger.warning(f'Could not save resolved font paths to { cache_path }: { e }')
+
+    return paths
+
+def load_font_paths(cache_path):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            fonts = json.load(cache_file)['fonts']
+        if [ tuple(font[0:3]) for font in fonts ] != FONT_PROPERTIES:
+            return None
+        paths = [ font[3] for font in fonts ]
+        if not all(os.path.isfile(path) for path in paths):
+            return None
+        return paths
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        return None
+
+# Parsing a TTF file is relatively expensive, so each (font, size) pair is loaded only once
+@functools.lru_cache(maxsize = None)
+def get_font(path, size) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size = size)
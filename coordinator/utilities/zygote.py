@@ -0,0 +1,118 @@
+# Zygote process for out-of-process bots, see `KuhnBotZygote` in `coordinator/kuhn/kuhn_zygote.py`
+# This file is executed as a standalone script and must not import Django or any server module
+#
+# Usage: python zygote.py <path to bot's main.py> <pool size>
+#
+# The zygote imports bot's `main.py` (and thereby `grpc`, `PIL` and bot's `client` package) once and keeps `pool size` forked children ready
+# Each ready child waits for its command line arguments on a pipe and runs `main.py` as `__main__` (as `python main.py` would),
+# so a bot starts without interpreter startup and its imports are already loaded
+# Protocol with the server is line-delimited JSON:
+#   - stdin:  { "id": <request id>, "argv": [ <arguments of main.py> ], "output": <path to a FIFO for bot's stdout and stderr or null> }
+#   - stdout: { "id": <request id>, "pid": <child pid> } once the request has been passed to a child
+#             { "id": <request id>, "returncode": <exit code> } once the child has exited
+# Zygote exits (and kills its idle children) as soon as its stdin is closed
+import contextlib
+import json
+import os
+import runpy
+import select
+import signal
+import sys
+import traceback
+
+def fork_child(bot_exec: str, idle):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid != 0:
+        os.close(read_fd)
+        return pid, write_fd
+
+    # Child process: bot's output goes to a FIFO opened by the server (see `KuhnBotOutput`) or is discarded
+    # Pipes of other idle children are inherited from the zygote, child does not need them
+    os.close(write_fd)
+    for _, fd in idle:
+        os.close(fd)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    code = 1
+    try:
+        with os.fdopen(read_fd, 'r') as pipe:
+            data = pipe.readline()
+        if len(data) != 0:
+            request = json.loads(data)
+            if request['output'] is not None:
+                output = os.open(request['output'], os.O_WRONLY)
+                os.dup2(output, 1)
+                os.dup2(output, 2)
+                os.close(output)
+                sys.stdout.reconfigure(line_buffering = True)
+            sys.argv = [ bot_exec ] + request['argv']
+            runpy.run_path(bot_exec, run_name = '__main__')
+            code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(code)
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+def serve(bot_exec: str, pool_size: int):
+    bot_folder = os.path.dirname(os.path.abspath(bot_exec))
+    sys.path.insert(0, bot_folder)
+
+    # gRPC must be initialised with fork support before any channel is created in children
+    os.environ.setdefault('GRPC_ENABLE_FORK_SUPPORT', '1')
+    # Bot's `main.py` is imported under another name only to load its dependencies, its `if __name__ == '__main__'` block does not run here
+    # Anything it prints while being imported must not get into the protocol on stdout
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('__bot_main__', bot_exec)
+    with contextlib.redirect_stdout(sys.stderr):
+        spec.loader.exec_module(importlib.util.module_from_spec(spec))
+
+    idle    = []
+    for _ in range(pool_size):
+        idle.append(fork_child(bot_exec, idle))
+    running = {} # child pid -> request id
+    stdin   = sys.stdin.fileno()
+    buffer  = b''
+
+    while True:
+        readable, _, _ = select.select([ stdin ], [], [], 0.05)
+
+        # Reap finished children and report their exit codes
+        while len(running) != 0:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            if pid in running:
+                send({ 'id': running.pop(pid), 'returncode': os.waitstatus_to_exitcode(status) })
+
+        if len(readable) == 0:
+            continue
+
+        chunk = os.read(stdin, 65536)
+        if len(chunk) == 0:
+            break
+        buffer = buffer + chunk
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            request = json.loads(line)
+            pid, write_fd = idle.pop(0) if len(idle) != 0 else fork_child(bot_exec, idle)
+            with os.fdopen(write_fd, 'w') as pipe:
+                pipe.write(json.dumps({ 'argv': request['argv'], 'output': request.get('output', None) }) + '\n')
+            running[pid] = request['id']
+            send({ 'id': request['id'], 'pid': pid })
+            # Pool is refilled right away, so the next request finds a ready child
+            idle.append(fork_child(bot_exec, idle))
+
+    for pid, write_fd in idle:
+        os.close(write_fd)
+        os.kill(pid, signal.SIGTERM)
+
+if __name__ == '__main__':
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -1,6 +1,44 @@
 from django.http.response import JsonResponse
 
+from coordinator.kuhn.kuhn_mailbox import KuhnPlayerMailbox
 from coordinator.models import Game
+from pages.game_browser import GameBrowserError, load_games_page, parse_game_filters
 
 def game_counter(request, *args, **kwargs):
-    return JsonResponse({ 'counter': Game.objects.count() })
\ No newline at end of file
+    return JsonResponse({ 'counter': Game.objects.count() })
+
+# Delivery stats of player messages since server start (see `KuhnPlayerMailbox`), gRPC server runs in the same process as the web server
+# Latencies are in seconds between posting a message to a player's mailbox and sending it to the client
+def message_delivery(request, *args, **kwargs):
+    totals = KuhnPlayerMailbox.get_totals()
+    return JsonResponse({
+        'delivered':   totals['delivered'],
+        'overflows':   totals['overflows'],
+        'latency_avg': totals['latency_avg'],
+        'latency_max': totals['latency_max']
+    })
+
+def player_json(player):
+    return { 'name': player.name, 'public_token': str(player.public_token) } if player is not None else None
+
+# JSON counterpart of the game browser, accepts the same query parameters as `/games/` (see `pages/game_browser.py`)
+# `next` is a cursor of the next page or `null` for the last page
+def games(request, *args, **kwargs):
+    try:
+        page, cursor = load_games_page(parse_game_filters(request.GET))
+    except GameBrowserError as e:
+        return JsonResponse({ 'error': str(e) }, status = 400)
+    return JsonResponse({
+        'games': [ {
+            'id':          str(game.id),
+            'created_at':  game.created_at.isoformat(),
+            'game_type':   game.game_type,
+            'is_started':  game.is_started,
+            'is_finished': game.is_finished,
+            'is_failed':   game.is_failed,
+            'player1':     player_json(game.player1),
+            'player2':     player_json(game.player2),
+            'winner':      player_json(game.winner)
+        } for game in page ],
+        'next': cursor
+    })
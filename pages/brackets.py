@@ -0,0 +1,20 @@
+from django.db.models import Prefetch
+
+from coordinator.models import Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
+
+# Loads a whole tournament tree in a constant number of queries (rounds, bracket items and games with their players), regardless of the number of players
+# Returns a ready-to-render list of rounds ordered by index, each with `brackets` ordered by position:
+#   [ { 'round': TournamentRound, 'brackets': [ { 'bracket_item': TournamentRoundBracketItem, 'game': TournamentRoundGame or None } ] } ]
+def load_tournament_bracket(tournament: Tournament):
+    games         = TournamentRoundGame.objects.select_related('game__player1', 'game__player2', 'game__winner')
+    bracket_items = TournamentRoundBracketItem.objects.order_by('position').prefetch_related(Prefetch('tournamentroundgame_set', queryset = games))
+    rounds        = TournamentRound.objects.filter(tournament__id = tournament.id).order_by('index').prefetch_related(Prefetch('tournamentroundbracketitem_set', queryset = bracket_items))
+
+    def round_data(round: TournamentRound):
+        brackets = []
+        for bracket_item in round.tournamentroundbracketitem_set.all():
+            round_games = bracket_item.tournamentroundgame_set.all()
+            brackets.append({ 'bracket_item': bracket_item, 'game': round_games[0] if len(round_games) != 0 else None })
+        return { 'round': round, 'brackets': brackets }
+
+    return list(map(round_data, rounds))
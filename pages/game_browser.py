@@ -0,0 +1,94 @@
+import base64
+import datetime
+import heapq
+import itertools
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+
+from coordinator.models import Game, GameTypes, Player
+
+# Game browser pages through games with keyset (cursor) pagination over `(created_at, id)`, newest games first
+# A cursor points to the last game of the previous page, so the next page is a range scan of a composite index (see `Game.Meta.indexes`)
+# and page N costs the same as page 1 regardless of the number of games, unlike an `OFFSET` based pagination
+# Games can be filtered by player (public token), game type and status, filters are passed in query parameters:
+#   ?player=<public token>&game_type=<game type>&status=<finished|failed|playing>&cursor=<cursor>&limit=<page size>
+GameStatuses = {
+    'finished': Q(is_finished = True, is_failed = False),
+    'failed':   Q(is_failed = True),
+    'playing':  Q(is_finished = False),
+}
+
+class GameBrowserError(Exception):
+    pass
+
+def encode_cursor(game: Game) -> str:
+    return base64.urlsafe_b64encode(f'{ game.created_at.isoformat() }|{ game.id }'.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(id)
+    except Exception:
+        raise GameBrowserError('Invalid cursor')
+
+# Parses filters from query parameters and returns a dictionary with `player`, `game_type`, `status`, `cursor` and `limit`
+def parse_game_filters(params) -> dict:
+    filters = {
+        'player':    params.get('player') or None,
+        'game_type': params.get('game_type') or None,
+        'status':    params.get('status') or None,
+        'cursor':    params.get('cursor') or None,
+        'limit':     settings.PAGES_GAMES_PAGE_SIZE
+    }
+    try:
+        if filters['player'] is not None:
+            filters['player'] = uuid.UUID(filters['player'])
+        if filters['game_type'] is not None:
+            filters['game_type'] = int(filters['game_type'])
+            if filters['game_type'] not in [ game_type.value for game_type in GameTypes ]:
+                raise ValueError()
+        if params.get('limit'):
+            filters['limit'] = min(max(int(params.get('limit')), 1), settings.PAGES_GAMES_MAX_PAGE_SIZE)
+    except ValueError:
+        raise GameBrowserError('Invalid filters')
+    if filters['status'] is not None and filters['status'] not in GameStatuses:
+        raise GameBrowserError('Invalid status filter')
+    return filters
+
+# Returns games matching all filters except the player one, ordered as pages are and starting right after the cursor
+def make_games_queryset(filters: dict):
+    queryset = Game.objects.select_related('player1', 'player2', 'winner')
+
+    if filters['game_type'] is not None:
+        queryset = queryset.filter(game_type = filters['game_type'])
+    if filters['status'] is not None:
+        queryset = queryset.filter(GameStatuses[filters['status']])
+    if filters['cursor'] is not None:
+        created_at, id = decode_cursor(filters['cursor'])
+        # Redundant `created_at <= cursor` bound lets the database seek the index to the cursor instead of scanning and filtering from the newest game
+        queryset = queryset.filter(Q(created_at__lte = created_at), Q(created_at__lt = created_at) | Q(id__lt = id))
+
+    return queryset.order_by('-created_at', '-id')
+
+# Returns a page of games and a cursor of the next page (`None` for the last page)
+def load_games_page(filters: dict):
+    limit    = filters['limit']
+    queryset = make_games_queryset(filters)
+
+    if filters['player'] is None:
+        games = list(queryset[:limit + 1])
+    else:
+        token = Player.objects.filter(public_token = filters['player']).values_list('token', flat = True).first()
+        if token is None:
+            return [], None
+        # A player may be either the first or the second player of a game, `OR` of two columns cannot use a single index range scan,
+        # so both sides are paged separately through their own indexes and merged in memory
+        player1 = queryset.filter(player1_id = token)[:limit + 1]
+        player2 = queryset.filter(player2_id = token)[:limit + 1]
+        games   = list(itertools.islice(heapq.merge(player1, player2, key = lambda game: (game.created_at, game.id), reverse = True), limit + 1))
+
+    if len(games) > limit:
+        return games[:limit], encode_cursor(games[limit - 1])
+    return games, None
@@ -0,0 +1,46 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Rendered pages of games and tournaments are cached by the requested id and a finished flag
+# Finished games and tournaments never change, so their pages are kept for `PAGES_CACHE_FINISHED_TTL` and repeat views do not touch the database at all
+# Pages of objects in progress are kept only for `PAGES_CACHE_LIVE_TTL`, so they are at most a few seconds behind
+# Each cached page has an ETag and a Last-Modified timestamp, so browsers revalidate it with a conditional GET and get `304 Not Modified` back
+def get_cache_key(kind: str, id: str, is_finished: bool) -> str:
+    return f'pages:{ kind }:{ id }:{ "finished" if is_finished else "live" }'
+
+def make_cached_response(request, entry: dict, is_finished: bool) -> HttpResponse:
+    response = HttpResponse(entry['content'], content_type = entry['content_type'])
+    response['ETag']          = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, max_age = settings.PAGES_CACHE_FINISHED_TTL if is_finished else settings.PAGES_CACHE_LIVE_TTL)
+    return get_conditional_response(request, etag = entry['etag'], last_modified = entry['last_modified'], response = response)
+
+# `render_page` returns a response and whether the page shows a finished object (`True`), an object in progress (`False`) or nothing (`None`)
+# Pages of objects that have not been found are not cached, they may appear later
+def cached_page(request, kind: str, id: str, render_page) -> HttpResponse:
+    cache = caches[settings.PAGES_CACHE]
+
+    for is_finished in (True, False):
+        entry = cache.get(get_cache_key(kind, id, is_finished))
+        if entry is not None:
+            return make_cached_response(request, entry, is_finished)
+
+    response, is_finished = render_page()
+    if is_finished is None or response.status_code != 200:
+        return response
+
+    entry = {
+        'content':       response.content,
+        'content_type':  response['Content-Type'],
+        'etag':          quote_etag(hashlib.md5(response.content).hexdigest()),
+        'last_modified': int(time.time())
+    }
+    cache.set(get_cache_key(kind, id, is_finished), entry, timeout = settings.PAGES_CACHE_FINISHED_TTL if is_finished else settings.PAGES_CACHE_LIVE_TTL)
+
+    return make_cached_response(request, entry, is_finished)
@@ -1,3 +1,152 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from coordinator.kuhn.kuhn_constants import CARD3
+from coordinator.models import Game, GameCoordinator, GameCoordinatorTypes, GameRound, Player, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
+from pages.brackets import load_tournament_bracket
+from pages.game_browser import GameStatuses, load_games_page, parse_game_filters
+
+# Creates a finished tournament of `num_players` players, the first player of each bracket item wins
+def create_tournament(num_players: int) -> Tournament:
+    coordinator = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.TOURNAMENT_PLAYERS, game_type = CARD3, is_private = False)
+    # `bulk_create` does not send `post_save`, which would otherwise ask the gRPC server to create a coordinator for the tournament
+    tournament  = Tournament.objects.bulk_create([ Tournament(coordinator = coordinator, timeout = 60, capacity = num_players, game_type = CARD3) ])[0]
+    players     = [ Player.objects.create() for _ in range(num_players) ]
+
+    index = 1
+    while len(players) != 1:
+        dbround = TournamentRound.objects.create(tournament = tournament, index = index)
+        winners = []
+        for position in range(1, len(players) // 2 + 1):
+            player1, player2 = players[2 * position - 2], players[2 * position - 1]
+            item = TournamentRoundBracketItem.objects.create(round = dbround, position = position, player1 = player1, player2 = player2)
+            game = Game.objects.create(created_by = coordinator, player1 = player1, player2 = player2, winner = player1, game_type = CARD3, is_started = True, is_finished = True)
+            TournamentRoundGame.objects.create(bracket_item = item, game = game)
+            winners.append(player1)
+        players = winners
+        index   = index + 1
+
+    Tournament.objects.filter(id = tournament.id).update(place1 = players[0])
+    return tournament
+
+class TournamentBracketQueriesTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.PAGES_CACHE].clear()
+
+    def count_queries(self, function) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        return len(queries)
+
+    def test_loader_queries_do_not_grow_with_players(self):
+        small, large = create_tournament(4), create_tournament(16)
+
+        small_queries = self.count_queries(lambda: load_tournament_bracket(small))
+        large_queries = self.count_queries(lambda: load_tournament_bracket(large))
+
+        self.assertEqual(small_queries, large_queries)
+
+        rounds = load_tournament_bracket(large)
+        self.assertEqual([ len(round['brackets']) for round in rounds ], [ 8, 4, 2, 1 ])
+        self.assertTrue(all(bracket['game'] is not None for round in rounds for bracket in round['brackets']))
+
+    def test_view_queries_do_not_grow_with_players(self):
+        small, large = create_tournament(4), create_tournament(16)
+
+        small_queries = self.count_queries(lambda: self.assertContains(self.client.get(f'/tournament/{ small.id }/'), 'Game 2 of Round 1'))
+        large_queries = self.count_queries(lambda: self.assertContains(self.client.get(f'/tournament/{ large.id }/'), 'Game 8 of Round 1'))
+
+        self.assertEqual(small_queries, large_queries)
+
+class GamePageCacheTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.PAGES_CACHE].clear()
+        self.coordinator = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER, game_type = CARD3, is_private = False)
+
+    # Creates a finished game with rounds of given indexes, all rounds are evaluated
+    def create_game(self, indexes) -> Game:
+        player1, player2 = Player.objects.create(), Player.objects.create()
+        game = Game.objects.create(created_by = self.coordinator, player1 = player1, player2 = player2, winner = player1, game_type = CARD3, is_started = True, is_finished = True)
+        for index in indexes:
+            GameRound.objects.create(game = game, first = player1, second = player2, index = index, cards = 'JQ', inf_set = '.JQ.BET.CALL', evaluation = -2)
+        return game
+
+    def test_complete_game_is_cached_as_finished(self):
+        game = self.create_game([ 1, 2, 3 ])
+        self.assertEqual(self.client.get(f'/game/{ game.id }/')['Cache-Control'], f'max-age={ settings.PAGES_CACHE_FINISHED_TTL }')
+
+    def test_game_with_missing_rounds_is_cached_as_live(self):
+        game = self.create_game([ 1, 3 ])
+        self.assertEqual(self.client.get(f'/game/{ game.id }/')['Cache-Control'], f'max-age={ settings.PAGES_CACHE_LIVE_TTL }')
+
+class GameBrowserTestCase(TestCase):
+
+    # Creates games of three players with only a few distinct creation times, so many games tie on `created_at`
+    def setUp(self):
+        coordinator  = GameCoordinator.objects.create(coordinator_type = GameCoordinatorTypes.DUEL_PLAYER_PLAYER, game_type = CARD3, is_private = False)
+        self.players = [ Player.objects.create() for _ in range(3) ]
+        created_at   = timezone.now()
+        for index in range(40):
+            player1, player2 = self.players[index % 3], self.players[(index + 1 + index // 3 % 2) % 3]
+            game = Game.objects.create(
+                created_by  = coordinator,
+                player1     = player1,
+                player2     = player2,
+                winner      = player1 if index % 4 == 0 else None,
+                game_type   = CARD3,
+                is_started  = True,
+                is_finished = index % 5 != 0,
+                is_failed   = index % 7 == 0
+            )
+            Game.objects.filter(id = game.id).update(created_at = created_at - datetime.timedelta(seconds = index // 6))
+
+    # Walks all pages of the browser and returns ids of all games in the order they have been shown
+    def walk(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            games, cursor = load_games_page(parse_game_filters({ **params, 'cursor': cursor, 'limit': '4' }))
+            ids, pages = ids + [ game.id for game in games ], pages + 1
+            if cursor is None:
+                return ids, pages
+
+    def expected(self, query = Q()):
+        return list(Game.objects.filter(query).order_by('-created_at', '-id').values_list('id', flat = True))
+
+    def test_pages_match_ordered_query(self):
+        ids, pages = self.walk()
+        self.assertEqual(ids, self.expected())
+        self.assertEqual(pages, 10)
+
+    def test_player_filter_merges_both_sides(self):
+        for player in self.players:
+            ids, _ = self.walk(player = str(player.public_token))
+            self.assertEqual(ids, self.expected(Q(player1 = player) | Q(player2 = player)))
+
+    def test_status_filters(self):
+        for status, query in GameStatuses.items():
+            ids, _ = self.walk(status = status)
+            self.assertEqual(ids, self.expected(query))
+
+    def test_player_and_status_filters(self):
+        player = self.players[1]
+        ids, _ = self.walk(player = str(player.public_token), status = 'finished')
+        self.assertEqual(ids, self.expected((Q(player1 = player) | Q(player2 = player)) & GameStatuses['finished']))
 
-# Create your tests here.
+    def test_api_pages(self):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get('/api/games', { 'limit': 7, **({ 'cursor': cursor } if cursor is not None else {}) }).json()
+            ids, cursor = ids + [ game['id'] for game in response['games'] ], response['next']
+            if cursor is None:
+                break
+        self.assertEqual(ids, [ str(id) for id in self.expected() ])
+        self.assertEqual(self.client.get('/api/games', { 'cursor': 'invalid' }).status_code, 400)
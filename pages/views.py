@@ -1,11 +1,13 @@
 
 from django.shortcuts import render
-from coordinator.models import Game, GameCoordinatorTypes, GameRound, Player, RoomRegistration, Tournament, TournamentRound, TournamentRoundBracketItem, TournamentRoundGame
-from django.db.models import Q
+from coordinator.models import Game, GameRound, GameTypes, Player, PlayerStats, Tournament
 from django.http import HttpResponseRedirect
 from django.conf import settings
 
+from pages.brackets import load_tournament_bracket
 from pages.forms import SearchGameForm, SearchTournamentForm
+from pages.game_browser import GameBrowserError, GameStatuses, load_games_page, parse_game_filters
+from pages.page_cache import cached_page
 from pages.models import Announcement
 
 def home_view(request, *args, **kwargs):
@@ -15,11 +17,27 @@ def home_view(request, *args, **kwargs):
         'client_github_url': settings.CLIENT_GITHUB_URL
     })
 
+# Games are paged with a cursor and can be filtered by player, game type and status, see `pages/game_browser.py`
 def games_view(request, *args, **kwargs):
-    return render(request, "games.html", {
-        'games': Game.objects.all().order_by('-created_at')[:50],
-        'form': kwargs['form'] if 'form' in kwargs else SearchGameForm()
-    })
+    context = {
+        'form': kwargs['form'] if 'form' in kwargs else SearchGameForm(),
+        'game_types': GameTypes.choices(),
+        'game_statuses': list(GameStatuses.keys()),
+        'filters': request.GET,
+        'games': [],
+        'next_url': None,
+        'error': None
+    }
+    try:
+        filters = parse_game_filters(request.GET)
+        context['games'], cursor = load_games_page(filters)
+        if cursor is not None:
+            params = request.GET.copy()
+            params['cursor'] = cursor
+            context['next_url'] = f'/games/?{ params.urlencode() }'
+    except GameBrowserError as e:
+        context['error'] = str(e)
+    return render(request, "games.html", context)
 
 def tournaments_view(request, *args, **kwargs):
     return render(request, "tournaments.html", {
@@ -48,52 +66,62 @@ def tournament_search_view(request, *args, **kwargs):
     return HttpResponseRedirect("/tournaments/")
     
 
+# Coordinator writes rounds of a game before its finished status (see `KuhnGameWriter` and `KuhnRoundJournal.update_game`)
+# A page is cached for long only if rounds also look complete: indexes have no gaps and all rounds but the last one are evaluated
+# Otherwise (e.g. some rounds could not be written) the page of a finished game is cached as a live one and is re-rendered soon
+def are_game_rounds_complete(rounds) -> bool:
+    indexes_ok   = all(dbround.index == index for index, dbround in enumerate(rounds, start = 1))
+    evaluated_ok = all(dbround.evaluation is not None for dbround in rounds[:-1])
+    return indexes_ok and evaluated_ok
+
+# Pages of finished games are served from cache without any database queries, see `cached_page`
 def game_view(request, *args, **kwargs):
     id = kwargs['game_id']
 
-    try:
-        context = {}
+    def render_game():
+        try:
+            context = {}
+
+            game  = None
+            games_by_id  = Game.objects.filter(id = id)
+            games_by_cid = Game.objects.filter(created_by__id = id)
+
+            if len(games_by_id) != 0:
+                game = games_by_id[0]
+            elif len(games_by_cid) != 0:
+                game = games_by_cid[0]
 
-        game  = None
-        games_by_id  = Game.objects.filter(id = id)
-        games_by_cid = Game.objects.filter(created_by__id = id)
+            if game == None:
+                raise ValueError() 
 
-        if len(games_by_id) != 0:
-            game = games_by_id[0]
-        elif len(games_by_cid) != 0:
-            game = games_by_cid[0]
+            rounds = list(GameRound.objects.filter(game__id = game.id).select_related('first', 'second').order_by('index'))
 
-        if game == None:
-            raise ValueError() 
+            context['is_game_found'] = True
+            context['game']          = game
+            context['rounds']        = rounds[:-1]
 
-        context['is_game_found'] = True
-        context['game']          = game
-        context['rounds']        = list(GameRound.objects.filter(game__id = game.id))[:-1]
+            return render(request, "game.html", context), game.is_finished and are_game_rounds_complete(rounds)
+        except Exception as e:
+            return render(request, "game.html", { 'is_game_found': False }), None
 
-        return render(request, "game.html", context)
-    except Exception as e:
-        return render(request, "game.html", { 'is_game_found': False })
+    return cached_page(request, 'game', id, render_game)
 
+# Statistics are materialized in `PlayerStats` by coordinators, so the leaderboard is a single query regardless of the number of games
+# Players without statistics (e.g. who have never played) are still listed, their `stats` relation is simply empty
+# Leaderboard is sorted once bots are aggregated into a single row, so players are not ordered in the query
 def leaderboard_view(request, *args, **kwargs):
     players = []
     bots    = []
-    for player in Player.objects.all():
-        games           = Game.objects.filter(Q(player1__token = player.token) | Q(player2__token = player.token))
-        games_won       = len(list(filter(lambda game: game.winner == player, games)))
-        
-        registrations            = list(RoomRegistration.objects.filter(player__token = player.token))
-        tournaments_participated = len(list(filter(lambda reg: reg.room.coordinator.coordinator_type == GameCoordinatorTypes.TOURNAMENT_PLAYERS or reg.room.coordinator.coordinator_type == GameCoordinatorTypes.TOURNAMENT_PLAYERS_WITH_BOTS, registrations))) # hello oneliners in python
-
-        tournaments_won = Tournament.objects.filter(place1__token = player.token).count()
-        games_lost = len(games) - games_won
+    for player in Player.objects.select_related('stats'):
+        player_stats = getattr(player, 'stats', None) or PlayerStats(player = player)
 
         stats = {
             'name': player.name,
-            'games_total': len(games),
-            'games_won': games_won,
-            'games_lost': games_lost,
-            'tournaments_participated': tournaments_participated,
-            'tournaments_won': tournaments_won
+            'games_total': player_stats.games_total,
+            'games_won': player_stats.games_won,
+            'games_lost': player_stats.games_lost(),
+            'tournaments_participated': player_stats.tournaments_participated,
+            'tournaments_won': player_stats.tournaments_won
         }
         if not player.is_bot:
             players.append(stats)
@@ -115,36 +143,32 @@ def leaderboard_view(request, *args, **kwargs):
     
     return render(request, "leaderboard.html", { 'leaderboard': leaderboard })
 
+# Pages of finished tournaments (with a winner) are served from cache without any database queries, see `cached_page`
 def tournament_view(request, *args, **kwargs):
-    try: 
-        id = kwargs['tournament_id']
+    id = kwargs['tournament_id']
 
-        tournament  = None
-        tournaments_by_id  = Tournament.objects.filter(id = id)
-        tournaments_by_cid = Tournament.objects.filter(coordinator__id = id)
+    def render_tournament():
+        try: 
+            tournament  = None
+            tournaments_by_id  = Tournament.objects.filter(id = id)
+            tournaments_by_cid = Tournament.objects.filter(coordinator__id = id)
         
-        if len(tournaments_by_id) != 0:
-            tournament = tournaments_by_id[0]
-        elif len(tournaments_by_cid) != 0:
-            tournament = tournaments_by_cid[0]
-
-        if tournament == None:
-            raise ValueError()            
-
-        rounds = sorted(list(TournamentRound.objects.filter(tournament__id = tournament.id)), key = lambda d: d.index)
-
-        def fetch_rounds_data(round):
-            bracket_items = sorted(list(TournamentRoundBracketItem.objects.filter(round__id = round.id)), key = lambda d: d.position)
-            games         = list(map(lambda bracket_item: next(iter(list(TournamentRoundGame.objects.filter(bracket_item__id = bracket_item.id))), None), bracket_items))
-            brackets      = list(map(lambda tuple: { 'bracket_item': tuple[0], 'game': tuple[1] }, zip(bracket_items, games)))
-            return { 'round': round, 'brackets': brackets }
-
-        rounds_data = list(map(fetch_rounds_data, rounds))
-
-        return render(request, "tournament.html", {
-            'tournament_found': True,
-            'tournament': tournament,
-            'rounds': rounds_data,
-        })
-    except Exception as e:
-        return render(request, "tournament.html", { 'tournament_found': False })
\ No newline at end of file
+            if len(tournaments_by_id) != 0:
+                tournament = tournaments_by_id[0]
+            elif len(tournaments_by_cid) != 0:
+                tournament = tournaments_by_cid[0]
+
+            if tournament == None:
+                raise ValueError()            
+
+            rounds_data = load_tournament_bracket(tournament)
+
+            return render(request, "tournament.html", {
+                'tournament_found': True,
+                'tournament': tournament,
+                'rounds': rounds_data,
+            }), tournament.place1_id is not None
+        except Exception as e:
+            return render(request, "tournament.html", { 'tournament_found': False }), None
+
+    return cached_page(request, 'tournament', id, render_tournament)